@@ -0,0 +1,33 @@
+import numpy as np
+import matrixutils
+
+from .common import SIZES, points
+
+
+class Rotations(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self, n):
+        self.XYZ = points(n, 3)
+        self.n0 = points(n, 3, seed=1) - 0.5
+        self.n1 = points(n, 3, seed=2) - 0.5
+
+    def time_rotationMatrixFromNormals(self, n):
+        matrixutils.rotationMatrixFromNormals(self.n0[0], self.n1[0])
+
+    def time_rotationMatricesFromNormals(self, n):
+        matrixutils.rotationMatricesFromNormals(self.n0, self.n1)
+
+    def peakmem_rotationMatricesFromNormals(self, n):
+        matrixutils.rotationMatricesFromNormals(self.n0, self.n1)
+
+    def time_rotatePointsFromNormals(self, n):
+        matrixutils.rotatePointsFromNormals(
+            self.XYZ, np.r_[0., 0., 1.], np.r_[1., 1., 1.], np.r_[1., 2., 3.]
+        )
+
+    def peakmem_rotatePointsFromNormals(self, n):
+        matrixutils.rotatePointsFromNormals(
+            self.XYZ, np.r_[0., 0., 1.], np.r_[1., 1., 1.], np.r_[1., 2., 3.]
+        )
@@ -0,0 +1,71 @@
+import numpy as np
+import matrixutils
+
+from .common import SIZES, curvilinear
+
+
+class IndexCube(object):
+    params = [SIZES, [2, 3]]
+    param_names = ['nC', 'dim']
+
+    def setup(self, nC, dim):
+        m = max(2, int(round(nC ** (1. / dim))))
+        self.gridSize = np.array([m + 1] * dim)
+        self.nodes = 'ABCD' if dim == 2 else 'ABCDEFGH'
+
+    def time_indexCube(self, nC, dim):
+        matrixutils.indexCube(self.nodes, self.gridSize)
+
+    def peakmem_indexCube(self, nC, dim):
+        matrixutils.indexCube(self.nodes, self.gridSize)
+
+    def time_indexCube_stacked(self, nC, dim):
+        matrixutils.curvutils._indexCubeCache.clear()
+        matrixutils.indexCube(self.nodes, self.gridSize, stacked=True)
+
+    def peakmem_indexCube_stacked(self, nC, dim):
+        matrixutils.curvutils._indexCubeCache.clear()
+        matrixutils.indexCube(self.nodes, self.gridSize, stacked=True)
+
+
+class CurvGeometry(object):
+    params = [SIZES]
+    param_names = ['nC']
+    timeout = 600
+
+    def setup(self, nC):
+        self.xyz, self.gridSize = curvilinear(nC)
+        self.A, self.B, self.C, self.D = matrixutils.indexCube(
+            'ABCD', self.gridSize
+        )
+        self.E = matrixutils.indexCube('E', self.gridSize)[0]
+        self.moved = np.random.randint(0, self.xyz.shape[0], 100)
+
+    def time_volTetra(self, nC):
+        matrixutils.volTetra(self.xyz, self.A, self.B, self.C, self.E)
+
+    def time_volHex(self, nC):
+        matrixutils.volHex(self.xyz, self.gridSize)
+
+    def peakmem_volHex(self, nC):
+        matrixutils.volHex(self.xyz, self.gridSize)
+
+    def time_faceInfo(self, nC):
+        matrixutils.faceInfo(self.xyz, self.A, self.B, self.C, self.D)
+
+    def peakmem_faceInfo(self, nC):
+        matrixutils.faceInfo(self.xyz, self.A, self.B, self.C, self.D)
+
+    def time_faceGeometry_stacked(self, nC):
+        matrixutils.faceGeometry(
+            self.xyz, self.A, self.B, self.C, self.D, average=False
+        )
+
+    def time_CurvilinearGeometry(self, nC):
+        geom = matrixutils.CurvilinearGeometry(self.xyz, self.gridSize)
+        geom.cellVolumes, geom.faceAreas, geom.edgeLengths
+
+    def time_CurvilinearGeometry_updateNodes(self, nC):
+        geom = matrixutils.CurvilinearGeometry(self.xyz.copy(), self.gridSize)
+        geom.cellVolumes, geom.faceAreas, geom.nodeCells, geom.nodeFaces
+        geom.updateNodes(self.moved, self.xyz[self.moved] + 1e-3)
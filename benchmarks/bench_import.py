@@ -0,0 +1,15 @@
+class Import(object):
+    """Start-up cost of the package, each timed in a fresh interpreter"""
+
+    def timeraw_import(self):
+        return "import matrixutils"
+
+    def timeraw_import_matutils(self):
+        return "import matrixutils; matrixutils.sdiag"
+
+    def timeraw_import_all(self):
+        return """
+import matrixutils
+for name in matrixutils.__all__:
+    getattr(matrixutils, name)
+"""
@@ -0,0 +1,74 @@
+import matrixutils
+
+from .common import SIZES, DIMS, tensors, points, curvilinear
+
+
+class Interpmat(object):
+    params = [SIZES, DIMS]
+    param_names = ['npts', 'dim']
+    timeout = 600
+
+    def setup(self, npts, dim):
+        self.x = tensors(10**5, dim)
+        self.locs = points(npts, dim)
+
+    def time_interpmat(self, npts, dim):
+        matrixutils.interpmat(self.locs, *self.x)
+
+    def peakmem_interpmat(self, npts, dim):
+        matrixutils.interpmat(self.locs, *self.x)
+
+
+class InterpmatWorkers(object):
+    params = [[10**5, 10**7], [1, 2, 4, 8]]
+    param_names = ['npts', 'workers']
+    timeout = 600
+
+    def setup(self, npts, workers):
+        self.x = tensors(10**5, 3)
+        self.locs = points(npts, 3)
+
+    def time_interpmat(self, npts, workers):
+        matrixutils.interpmat(self.locs, *self.x, workers=workers)
+
+
+class TensorBinner(object):
+    params = [SIZES, DIMS]
+    param_names = ['npts', 'dim']
+    timeout = 600
+
+    def setup(self, npts, dim):
+        self.x = tensors(10**5, dim)
+        self.locs = points(npts, dim)
+        self.values = points(npts, 1)
+
+    def time_bin(self, npts, dim):
+        binner = matrixutils.TensorBinner(*self.x)
+        binner.add(self.locs, self.values)
+
+    def peakmem_bin(self, npts, dim):
+        binner = matrixutils.TensorBinner(*self.x)
+        binner.add(self.locs, self.values)
+
+
+class InterpmatCurv(object):
+    params = [[10**3, 10**5]]
+    param_names = ['npts']
+    timeout = 600
+
+    def setup(self, npts):
+        self.xyz, self.gridSize = curvilinear(10**5)
+        self.locator = matrixutils.CellLocator(self.xyz, self.gridSize)
+        self.locs = 0.05 + 0.9 * points(npts, 3)
+
+    def time_CellLocator(self, npts):
+        matrixutils.CellLocator(self.xyz, self.gridSize)
+
+    def time_locate(self, npts):
+        self.locator.locate(self.locs)
+
+    def time_interpmatCurv(self, npts):
+        self.locator.interpmat(self.locs)
+
+    def peakmem_interpmatCurv(self, npts):
+        self.locator.interpmat(self.locs)
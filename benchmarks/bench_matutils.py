@@ -0,0 +1,170 @@
+import numpy as np
+import matrixutils
+
+from .common import SIZES, DIMS, gridShape, tensors
+
+
+class Vectors(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self, n):
+        self.x = np.random.rand(n)
+        self.X = self.x.reshape((-1, 1))
+        self.D = matrixutils.sdiag(self.x)
+        self.pts = np.random.rand(n // 3, 3)
+
+    def time_mkvc(self, n):
+        matrixutils.mkvc(self.X, 2)
+
+    def time_sdiag(self, n):
+        matrixutils.sdiag(self.x)
+
+    def peakmem_sdiag(self, n):
+        matrixutils.sdiag(self.x)
+
+    def time_sdInv(self, n):
+        matrixutils.sdInv(self.D)
+
+    def time_speye(self, n):
+        matrixutils.speye(n)
+
+    def time_spzeros(self, n):
+        matrixutils.spzeros(n, n)
+
+    def time_asArray_N_x_Dim(self, n):
+        matrixutils.asArray_N_x_Dim(self.pts, 3)
+
+
+class Stencils(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def time_ddx(self, n):
+        matrixutils.ddx(n)
+
+    def time_av(self, n):
+        matrixutils.av(n)
+
+    def time_av_extrap(self, n):
+        matrixutils.av_extrap(n)
+
+    def peakmem_av_extrap(self, n):
+        matrixutils.av_extrap(n)
+
+
+class Kron3(object):
+    params = [SIZES]
+    param_names = ['nC']
+
+    def setup(self, nC):
+        self.n = gridShape(nC, 3)
+
+    def time_kron3(self, nC):
+        n1, n2, n3 = self.n
+        matrixutils.kron3(
+            matrixutils.speye(n3), matrixutils.speye(n2), matrixutils.ddx(n1)
+        )
+
+    def peakmem_kron3(self, nC):
+        n1, n2, n3 = self.n
+        matrixutils.kron3(
+            matrixutils.speye(n3), matrixutils.speye(n2), matrixutils.ddx(n1)
+        )
+
+
+class ApplyStencils(object):
+    params = [SIZES, [0, 2]]
+    param_names = ['nC', 'axis']
+
+    def setup(self, nC, axis):
+        n1, n2, n3 = gridShape(nC, 3)
+        ops = [matrixutils.speye(n) for n in (n1, n2, n3)]
+        ops[axis] = matrixutils.ddx(ops[axis].shape[0])
+        self.D = matrixutils.kron3(ops[2], ops[1], ops[0])
+        shape = [n1, n2, n3]
+        shape[axis] += 1
+        self.F = np.random.rand(*shape)
+        self.f = matrixutils.mkvc(self.F)
+        self.axis = axis
+
+    def time_sparse(self, nC, axis):
+        self.D * self.f
+
+    def time_applyDdx(self, nC, axis):
+        matrixutils.applyDdx(self.F, self.axis)
+
+
+class Grids(object):
+    params = [SIZES, DIMS]
+    param_names = ['n', 'dim']
+
+    def setup(self, n, dim):
+        self.x = tensors(n, dim)
+        self.shape = tuple(x.size for x in self.x)
+        self.inds = np.random.randint(0, np.prod(self.shape), n)
+        self.subs = np.c_[matrixutils.ind2sub(self.shape, self.inds)]
+        self.indexer = matrixutils.GridIndexer(self.shape)
+        self.A = np.random.rand(*self.shape)
+        self.sub = [np.arange(0, s, 2) for s in self.shape]
+
+    def time_ndgrid(self, n, dim):
+        matrixutils.ndgrid(self.x)
+
+    def peakmem_ndgrid(self, n, dim):
+        matrixutils.ndgrid(self.x)
+
+    def time_sub2ind(self, n, dim):
+        matrixutils.sub2ind(self.shape, self.subs)
+
+    def time_ind2sub(self, n, dim):
+        matrixutils.ind2sub(self.shape, self.inds)
+
+    def time_GridIndexer_sub2ind(self, n, dim):
+        self.indexer.sub2ind(self.subs)
+
+    def time_GridIndexer_ind2sub(self, n, dim):
+        self.indexer.ind2sub(self.inds)
+
+    def time_getSubArray(self, n, dim):
+        if dim > 1:
+            matrixutils.getSubArray(self.A, self.sub)
+
+
+class BlockInverse(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self, n):
+        self.a = [np.random.rand(n) for _ in range(9)]
+        self.a[0] += 3
+        self.a[4] += 3
+        self.a[8] += 3
+
+    def time_inv2X2BlockDiagonal(self, n):
+        a = self.a
+        matrixutils.inv2X2BlockDiagonal(a[0], a[1], a[3], a[4])
+
+    def time_inv3X3BlockDiagonal(self, n):
+        matrixutils.inv3X3BlockDiagonal(*self.a)
+
+    def peakmem_inv3X3BlockDiagonal(self, n):
+        matrixutils.inv3X3BlockDiagonal(*self.a)
+
+    def time_inv3X3BlockDiagonal_arrays(self, n):
+        matrixutils.inv3X3BlockDiagonal(*self.a, returnMatrix=False)
+
+
+class ZeroIdentity(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self, n):
+        self.x = np.random.rand(n)
+        self.S = matrixutils.sdiag(self.x)
+
+    def time_zero(self, n):
+        self.S * matrixutils.Zero() + self.x
+
+    def time_identity(self, n):
+        self.S * matrixutils.Identity() + matrixutils.Identity()
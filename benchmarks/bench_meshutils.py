@@ -0,0 +1,27 @@
+import numpy as np
+import matrixutils
+
+from .common import SIZES
+
+
+class MeshTensor(object):
+    params = [SIZES]
+    param_names = ['nC']
+
+    def setup(self, nC):
+        core = nC - 40
+        self.value = [(10., 20, -1.3), (10., core), (10., 20, 1.3)]
+        self.spec = matrixutils.TensorSpec(self.value)
+        self.x = np.random.uniform(0, self.spec.length, 10**5)
+
+    def time_meshTensor(self, nC):
+        matrixutils.meshTensor(self.value)
+
+    def peakmem_meshTensor(self, nC):
+        matrixutils.meshTensor(self.value)
+
+    def time_TensorSpec_nodes(self, nC):
+        self.spec.nodes
+
+    def time_TensorSpec_locate(self, nC):
+        self.spec.locate(self.x)
@@ -0,0 +1,78 @@
+"""End-to-end pipelines built from several matrixutils functions"""
+import numpy as np
+import scipy.sparse as sp
+import matrixutils
+
+from .common import SIZES, gridShape, points
+
+
+def faceDivergence(n1, n2, n3):
+    """Face divergence of a unit tensor mesh"""
+    speye, ddx, kron3 = matrixutils.speye, matrixutils.ddx, matrixutils.kron3
+    return sp.hstack((
+        kron3(speye(n3), speye(n2), ddx(n1)),
+        kron3(speye(n3), ddx(n2), speye(n1)),
+        kron3(ddx(n3), speye(n2), speye(n1))
+    ), format="csr")
+
+
+def nodalAverage(n1, n2, n3):
+    """Average from nodes to cell centres of a tensor mesh"""
+    av, kron3 = matrixutils.av, matrixutils.kron3
+    return kron3(av(n3), av(n2), av(n1))
+
+
+class OperatorStack(object):
+    """3D operator stack plus an interpolation matrix"""
+    params = [SIZES]
+    param_names = ['nC']
+    timeout = 600
+
+    def setup(self, nC):
+        self.n = gridShape(nC, 3)
+        self.x = [np.linspace(0, 1, m + 1) for m in self.n]
+        self.locs = points(10**4, 3)
+
+    def build(self):
+        Div = faceDivergence(*self.n)
+        Av = nodalAverage(*self.n)
+        Q = matrixutils.interpmat(self.locs, *self.x)
+        return Div, Av, Q
+
+    def time_build(self, nC):
+        self.build()
+
+    def peakmem_build(self, nC):
+        self.build()
+
+
+class CurvilinearPipeline(object):
+    """Curvilinear geometry, rotated, then interpolated to receivers"""
+    params = [[10**3, 10**5]]
+    param_names = ['nC']
+    timeout = 600
+
+    def setup(self, nC):
+        m = gridShape(nC, 3)[0]
+        x = np.linspace(0, 1, m + 1)
+        self.xyz = matrixutils.ndgrid(x, x, x)
+        self.gridSize = np.array([m + 1] * 3)
+        self.locs = 0.1 + 0.8 * points(10**3, 3)
+
+    def run(self):
+        xyz = matrixutils.rotatePointsFromNormals(
+            self.xyz, np.r_[0., 0., 1.], np.r_[0.1, 0., 1.]
+        )
+        geom = matrixutils.CurvilinearGeometry(xyz, self.gridSize)
+        geom.cellVolumes, geom.faceAreas
+        return matrixutils.CellLocator(xyz, self.gridSize).interpmat(
+            matrixutils.rotatePointsFromNormals(
+                self.locs, np.r_[0., 0., 1.], np.r_[0.1, 0., 1.]
+            )
+        )
+
+    def time_run(self, nC):
+        self.run()
+
+    def peakmem_run(self, nC):
+        self.run()
@@ -0,0 +1,37 @@
+"""Shared problem builders for the benchmarks
+
+Every benchmark is parameterised over the problem size, the number of
+cells, points or entries, from 10^3 to 10^7, and where it makes sense
+over the dimension of the problem.
+"""
+import numpy as np
+
+SIZES = [10**3, 10**5, 10**7]
+DIMS = [1, 2, 3]
+
+
+def gridShape(n, dim):
+    """Shape of a grid of about n cells in dim dimensions"""
+    m = max(2, int(round(n ** (1. / dim))))
+    return (m, ) * dim
+
+
+def tensors(n, dim):
+    """Node tensors of a unit tensor mesh with about n cells"""
+    return [np.linspace(0, 1, m + 1) for m in gridShape(n, dim)]
+
+
+def curvilinear(n):
+    """Nodes and nodal grid size of a warped 3D mesh with about n cells"""
+    import matrixutils
+    x, y, z = tensors(n, 3)
+    xyz = matrixutils.ndgrid(x, y, z)
+    xyz[:, 0] += 0.05 * np.sin(3 * xyz[:, 1])
+    xyz[:, 1] += 0.1 * xyz[:, 0]**2
+    xyz[:, 2] += 0.05 * xyz[:, 0] * xyz[:, 1]
+    return xyz, np.array([x.size, y.size, z.size])
+
+
+def points(n, dim, seed=0):
+    """n random points in the unit cube"""
+    return np.random.RandomState(seed).rand(n, dim)
@@ -1,19 +1,84 @@
 from __future__ import print_function
+import importlib
+import os
 
-from .matutils import (
-    mkvc, sdiag, sdInv, speye, kron3, spzeros, ddx, av,
-    av_extrap, ndgrid, ind2sub, sub2ind, getSubArray,
-    inv3X3BlockDiagonal, inv2X2BlockDiagonal,
-    Zero, Identity
+# Submodules are imported on first access of one of their names (PEP 562)
+# so that `import matrixutils` stays cheap in short-lived processes.
+_exports = {
+    'matutils': [
+        'mkvc', 'sdiag', 'sdInv', 'speye', 'kron3', 'spmatmul', 'spzeros',
+        'ddx', 'av', 'av_extrap', 'ndgrid', 'ind2sub', 'sub2ind',
+        'getSubArray', 'GridIndexer', 'inv3X3BlockDiagonal',
+        'inv2X2BlockDiagonal', 'Zero', 'Identity', 'applyDdx', 'applyAv',
+        'applyAvExtrap',
+    ],
+    'configutils': [
+        'config', 'getConfig', 'setConfig', 'loadTuning', 'tuningPath',
+    ],
+    'tuneutils': ['autotune'],
+    'codeutils': [
+        'asArray_N_x_Dim', 'setTrusted', 'isTrusted', 'trustedMode',
+        'Workspace',
+    ],
+    'meshutils': ['meshTensor', 'TensorSpec'],
+    'curvutils': [
+        'volTetra', 'volHex', 'faceInfo', 'faceGeometry', 'indexCube',
+        'clearIndexCubeCache', 'CurvilinearGeometry',
+    ],
+    'interputils': ['interpmat', 'interpmatCurv', 'CellLocator'],
+    'binutils': ['TensorBinner'],
+    'coordutils': [
+        'rotatePointsFromNormals', 'rotationMatrixFromNormals',
+        'rotationMatricesFromNormals',
+    ],
+    'backendutils': [
+        'setBackend', 'getBackend', 'availableBackends', 'registerKernel',
+    ],
+    'ioutils': ['saveOperator', 'loadOperator'],
+    'sharedutils': ['shareOperator', 'SharedOperator'],
+    'futureutils': [
+        'BuildFuture', 'submitInterpmat', 'submitKron3',
+        'submitInv3X3BlockDiagonal', 'submitInv2X2BlockDiagonal',
+        'interpmatAsync', 'kron3Async', 'inv3X3BlockDiagonalAsync',
+        'inv2X2BlockDiagonalAsync',
+    ],
+    'profileutils': [
+        'profiling', 'enableProfiling', 'disableProfiling', 'getProfile',
+        'resetProfile', 'profileReport',
+    ],
+}
+_modules = dict(
+    (name, module) for module, names in _exports.items() for name in names
 )
-from .codeutils import asArray_N_x_Dim
-from .meshutils import meshTensor
-from .curvutils import volTetra, faceInfo, indexCube
-from .interputils import interpmat
-from .coordutils import rotatePointsFromNormals, rotationMatrixFromNormals
+
+__all__ = sorted(_modules)
+
+
+def __getattr__(name):
+    if name in _modules:
+        module = importlib.import_module('.' + _modules[name], __name__)
+    elif name in _exports:
+        module = importlib.import_module('.' + name, __name__)
+        globals()[name] = module
+        return module
+    else:
+        raise AttributeError(
+            "module {0!r} has no attribute {1!r}".format(__name__, name)
+        )
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_exports))
 
 
 __version__   = '0.0.3b0'
 __author__    = 'OpenGeophysics Team'
 __license__   = 'MIT'
 __copyright__ = '2013 - 2018, OpenGeophysics Developers, http://simpeg.xyz'
+
+if os.environ.get('MATRIXUTILS_PROFILE'):
+    from .profileutils import _enableFromEnvironment
+    _enableFromEnvironment()
@@ -0,0 +1,186 @@
+"""Registry of the compute backends of the hot kernels
+
+Every kernel (interpolation weights in 1, 2 and 3D, 2x2 and 3x3 block
+inverses, face geometry, tetrahedra volumes and tensor cell search) has
+a reference NumPy implementation and may have others registered for the
+'cython' and 'numba' backends.
+The implementations are imported on first use, and each kernel picks the
+first backend that loads, in the order cython, numpy, numba. Numba is
+only used when asked for, as compiling its kernels costs seconds in
+every new process.
+
+A backend is forced library-wide with :func:`setBackend` or the
+``MATRIXUTILS_BACKEND`` environment variable; kernels without an
+implementation for it keep their automatic choice::
+
+    matrixutils.setBackend('numba')
+    matrixutils.getBackend('faceGeometry')  # 'numba'
+    matrixutils.getBackend('volTetra')      # 'numba'
+"""
+from __future__ import print_function, division
+import importlib
+import os
+import warnings
+
+_backends = ('cython', 'numpy', 'numba')
+
+# kernel -> {backend: implementation, or 'module:name' imported on use}
+_kernels = dict(
+    ('interpmat{0:d}D'.format(dim), {
+        'cython': 'interputils_cython:_interpmat{0:d}D'.format(dim),
+        'numpy': 'interputils:_interpmatNumpy',
+        'numba': 'numbakernels:interpmat',
+    }) for dim in (1, 2, 3)
+)
+_kernels.update({
+    'inv2X2': {
+        'numpy': 'matutils:_inv2X2',
+        'numba': 'numbakernels:inv2X2',
+    },
+    'inv3X3': {
+        'numpy': 'matutils:_inv3X3',
+        'numba': 'numbakernels:inv3X3',
+    },
+    'faceGeometry': {
+        'numpy': 'curvutils:_faceGeometryNumpy',
+        'numba': 'numbakernels:faceGeometry',
+    },
+    'volTetra': {
+        'numpy': 'curvutils:_volTetra',
+        'numba': 'numbakernels:volTetra',
+    },
+    'cellSubs': {
+        'cython': 'interputils_cython:_cellSubs',
+        'numpy': 'binutils:_cellSubsNumpy',
+    },
+})
+
+_loaded = {}  # (kernel, backend) -> implementation or the ImportError
+_selected = {}  # kernel -> (backend, implementation)
+_forced = [os.environ.get('MATRIXUTILS_BACKEND') or None]
+
+
+def registerKernel(kernel, backend, implementation):
+    """Registers the implementation of a kernel for a backend
+
+    :param str kernel: name of the kernel, e.g. 'faceGeometry'
+    :param str backend: 'cython', 'numpy' or 'numba'
+    :param implementation: the function, or 'module:name' of a matrixutils
+        submodule to import it from on first use
+    """
+    _checkBackend(backend)
+    _kernels.setdefault(kernel, {})[backend] = implementation
+    _loaded.pop((kernel, backend), None)
+    _selected.pop(kernel, None)
+
+
+def setBackend(backend=None):
+    """Forces a backend for every kernel implementing it
+
+    :param str backend: 'cython', 'numpy', 'numba' or None for the
+        automatic choice
+    """
+    if backend is not None:
+        _checkBackend(backend)
+    _forced[0] = backend
+    _selected.clear()
+
+
+def getBackend(kernel):
+    """Name of the backend used by a kernel"""
+    return _select(kernel)[0]
+
+
+def availableBackends(kernel):
+    """Backends whose implementation of a kernel can be loaded"""
+    return [
+        backend for backend in _backends
+        if backend in _kernels[kernel] and
+        not isinstance(_load(kernel, backend), ImportError)
+    ]
+
+
+def getKernel(kernel, backend=None):
+    """The implementation of a kernel
+
+    :param str kernel: name of the kernel
+    :param str backend: a specific backend, the selected one by default
+    """
+    if backend is None:
+        selected = _selected.get(kernel)
+        if selected is None:
+            selected = _select(kernel)
+        return selected[1]
+    _checkBackend(backend)
+    if backend not in _kernels[kernel]:
+        raise ValueError(
+            'No {0!s} implementation of {1!s}'.format(backend, kernel)
+        )
+    implementation = _load(kernel, backend)
+    if isinstance(implementation, ImportError):
+        raise implementation
+    return implementation
+
+
+def _select(kernel):
+    if kernel in _selected:
+        return _selected[kernel]
+    if kernel not in _kernels:
+        raise KeyError('Unknown kernel {0!r}'.format(kernel))
+    forced = _forced[0]
+    if forced is not None:
+        _checkBackend(forced)
+    if forced in _kernels[kernel]:
+        selected = (forced, getKernel(kernel, forced))
+    else:
+        failed = []
+        for backend in _backends:
+            if backend == 'numba' or backend not in _kernels[kernel]:
+                continue
+            implementation = _load(kernel, backend)
+            if isinstance(implementation, ImportError):
+                failed += [(backend, implementation)]
+                continue
+            selected = (backend, implementation)
+            break
+        for backend, error in failed:
+            warnings.warn(
+                'The {0!s} backend of {1!s} is not available ({2!s}), '
+                'using {3!s}. Use setup.py to compile the cython:\n\n'
+                '    python setup.py install'.format(
+                    backend, kernel, error, selected[0]
+                ),
+                RuntimeWarning, stacklevel=4
+            )
+    _selected[kernel] = selected
+    return selected
+
+
+def _load(kernel, backend):
+    key = (kernel, backend)
+    if key not in _loaded:
+        implementation = _kernels[kernel][backend]
+        if isinstance(implementation, str):
+            module, name = implementation.split(':')
+            try:
+                module = importlib.import_module('.' + module, __package__)
+            except ImportError as error:
+                implementation = error
+            else:
+                # an extension compiled before the kernel was added
+                implementation = getattr(module, name, None) or ImportError(
+                    'cannot import name {0!r} from {1!r}'.format(
+                        name, module.__name__
+                    )
+                )
+        _loaded[key] = implementation
+    return _loaded[key]
+
+
+def _checkBackend(backend):
+    if backend not in _backends:
+        raise ValueError(
+            'Unknown backend {0!r}, use one of {1!s}'.format(
+                backend, ', '.join(_backends)
+            )
+        )
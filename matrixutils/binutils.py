@@ -0,0 +1,195 @@
+"""Binning of scattered points onto the cells of tensor meshes
+
+:class:`TensorBinner` accumulates the count, sum, mean and standard
+deviation of the values of the points falling in each cell. Points are
+added in as many batches as needed, so a stream of points too large for
+memory is binned one chunk at a time::
+
+    binner = TensorBinner(x, y, z)
+    for locs, values in chunks:
+        binner.add(locs, values)
+    decimated = binner.mean
+
+The cells are found with the search of :func:`matrixutils.interpmat`,
+one bisection per axis, and the statistics of each batch are merged into
+the running ones with the pairwise update of Chan et al., which stays
+accurate over billions of points.
+"""
+from __future__ import print_function, division
+import numpy as np
+
+from .backendutils import getKernel
+from .configutils import _chunkSize
+
+
+class TensorBinner(object):
+    """Running per-cell statistics of points on a 1, 2 or 3D tensor mesh
+
+    Cells are numbered with x fastest, as the cell centers of the mesh.
+    Points outside the mesh are ignored and counted in :attr:`nOutside`.
+    The statistics are accumulated in float64.
+
+    :param numpy.ndarray x: nodes along the 1st dimension, increasing
+    :param numpy.ndarray y: nodes along the 2nd dimension. None by default.
+    :param numpy.ndarray z: nodes along the 3rd dimension. None by default.
+    :param int chunkSize: number of points binned at a time
+    """
+
+    def __init__(self, x, y=None, z=None, chunkSize=None):
+        self.tensors = [
+            np.ascontiguousarray(t, dtype=float)
+            for t in (x, y, z) if t is not None
+        ]
+        for t in self.tensors:
+            assert t.ndim == 1 and t.size > 1 and np.all(np.diff(t) > 0), (
+                'tensors must be increasing vectors of at least 2 nodes'
+            )
+        self.dim = len(self.tensors)
+        self.shape = tuple(t.size - 1 for t in self.tensors)
+        if chunkSize is None:
+            chunkSize = _chunkSize('TensorBinner', 2**20)
+        self.chunkSize = chunkSize
+        self.reset()
+
+    @property
+    def nC(self):
+        """Number of cells"""
+        return int(np.prod(self.shape))
+
+    def reset(self):
+        """Forgets the points added"""
+        self._count = np.zeros(self.nC, dtype=np.int64)
+        self._sum = None
+        self._mean = None
+        self._m2 = None
+        self.nOutside = 0
+
+    def cellIndex(self, locs):
+        """Cell containing each point
+
+        :param numpy.ndarray locs: points, (npts, dim), or (npts, ) in 1D
+        :rtype: numpy.ndarray
+        :return: index of the cell of each point, -1 outside the mesh
+        """
+        locs = np.asarray(locs, dtype=float).reshape(-1, self.dim)
+        kernel = getKernel('cellSubs')
+        inds = np.zeros(locs.shape[0], dtype=np.int64)
+        outside = np.zeros(locs.shape[0], dtype=bool)
+        stride = 1
+        for d, t in enumerate(self.tensors):
+            subs = kernel(t, locs[:, d])
+            outside |= subs < 0
+            inds += stride * subs
+            stride *= t.size - 1
+        inds[outside] = -1
+        return inds
+
+    def add(self, locs, values=None):
+        """Bins a batch of points
+
+        :param numpy.ndarray locs: points, (npts, dim), or (npts, ) in 1D
+        :param numpy.ndarray values: values at the points, (npts, ) or
+            (npts, nV), or None to only count the points. Either every
+            batch has values, or none has.
+        """
+        locs = np.asarray(locs).reshape(-1, self.dim)
+        npts = locs.shape[0]
+        if values is not None:
+            values = np.asarray(values)
+            assert values.shape[0] == npts, (
+                'values must have one row per point'
+            )
+            values = values.reshape(npts, -1)
+            if self._sum is None and not self._count.any():
+                nV = values.shape[1]
+                self._sum = np.zeros((self.nC, nV))
+                self._mean = np.zeros((self.nC, nV))
+                self._m2 = np.zeros((self.nC, nV))
+            assert self._sum is not None and (
+                values.shape[1] == self._sum.shape[1]
+            ), 'values must have the shape of those already added'
+        else:
+            assert self._sum is None, 'values of the points missing'
+
+        for start in range(0, npts, self.chunkSize):
+            s = slice(start, start + self.chunkSize)
+            self._addChunk(locs[s], None if values is None else values[s])
+
+    def _addChunk(self, locs, values):
+        cells = self.cellIndex(locs)
+        inside = cells >= 0
+        self.nOutside += int(inside.size - inside.sum())
+        cells = cells[inside]
+        count = np.bincount(cells, minlength=self.nC)
+        if values is None:
+            self._count += count
+            return
+
+        values = values[inside]
+        hit = np.flatnonzero(count)
+        nA, nB = self._count[hit], count[hit]
+        n = nA + nB
+        for j in range(values.shape[1]):
+            v = values[:, j].astype(float)
+            sumB = np.bincount(cells, v, minlength=self.nC)
+            meanB = sumB / np.maximum(count, 1)
+            m2B = np.bincount(cells, (v - meanB[cells])**2, minlength=self.nC)
+
+            delta = meanB[hit] - self._mean[hit, j]
+            self._sum[hit, j] += sumB[hit]
+            self._mean[hit, j] += delta * nB / n
+            self._m2[hit, j] += m2B[hit] + delta**2 * nA * nB / n
+        self._count += count
+
+    @property
+    def count(self):
+        """Number of points in each cell, (nC, )"""
+        return self._count.copy()
+
+    @property
+    def sum(self):
+        """Sum of the values in each cell, (nC, ) or (nC, nV)"""
+        return self._stat(self._sum)
+
+    @property
+    def mean(self):
+        """Mean of the values in each cell, NaN in empty cells"""
+        mean = self._stat(self._mean)
+        mean[self._count == 0] = np.nan
+        return mean
+
+    def var(self, ddof=0):
+        """Variance of the values in each cell
+
+        :param int ddof: delta degrees of freedom, the divisor is
+            count - ddof
+        :return: NaN in cells with at most ddof points
+        """
+        dof = (self._count - ddof).astype(float)
+        dof[dof <= 0] = np.nan
+        var = self._stat(self._m2)
+        var /= dof if var.ndim == 1 else dof[:, np.newaxis]
+        return var
+
+    def std(self, ddof=0):
+        """Standard deviation of the values in each cell, see :meth:`var`"""
+        return np.sqrt(self.var(ddof=ddof))
+
+    def _stat(self, stat):
+        """Copy of an accumulator, (nC, ) for a single value per point"""
+        assert stat is not None, 'no values added'
+        if stat.shape[1] == 1:
+            return stat[:, 0].copy()
+        return stat.copy()
+
+
+def _cellSubsNumpy(x, xp):
+    """Cell of each coordinate along an axis, -1 outside [x[0], x[-1]]
+
+    Reference implementation of the cell search kernel: the cell i holds
+    x[i] <= xp < x[i + 1], the last one also holds x[-1].
+    """
+    subs = np.searchsorted(x, xp, side='right') - 1
+    subs[subs == x.size - 1] = x.size - 2
+    subs[~((xp >= x[0]) & (xp <= x[-1]))] = -1
+    return subs
@@ -1,18 +1,130 @@
 from __future__ import print_function, division
+from contextlib import contextmanager
 import numpy as np
+from .configutils import getConfig, setConfig, config
 
-def asArray_N_x_Dim(pts, dim):
-        if type(pts) == list:
-            pts = np.array(pts)
-        assert isinstance(pts, np.ndarray), "pts must be a numpy array"
+
+def setTrusted(trusted=True):
+    """Library-wide trusted mode
+
+    In trusted mode the inputs of the hot paths, e.g. asArray_N_x_Dim,
+    are not validated. Only use it for inputs known to be correct. This
+    is the 'trusted' setting of :func:`matrixutils.config`.
+    """
+    setConfig(trusted=trusted)
+
+
+def isTrusted():
+    """True if the library is in trusted mode"""
+    return getConfig('trusted')
+
+
+@contextmanager
+def trustedMode(trusted=True):
+    """Context manager for the library-wide trusted mode::
+
+        with trustedMode():
+            for pts in chunks:
+                pts = asArray_N_x_Dim(pts, 3)  # not validated
+    """
+    with config(trusted=trusted):
+        yield
+
+
+def asArray_N_x_Dim(pts, dim, dtype=None, contiguous=False):
+        """Returns pts as an array of shape (nPts, dim)
+
+        Arrays, numpy.memmap and anything exposing the buffer or
+        ``__array__`` protocol are viewed without copying. A copy is only
+        made when dtype or contiguous ask for one.
+
+        :param pts: points, (nPts, dim), or a single point if dim > 1
+        :param int dim: dimension of the points
+        :param numpy.dtype dtype: required dtype, None keeps the input's
+        :param bool contiguous: require a C-contiguous array
+        :rtype: numpy.ndarray
+        """
+        pts = np.asarray(pts, dtype=dtype)
+        if contiguous:
+            pts = np.ascontiguousarray(pts)
 
         if dim > 1:
-            pts = np.atleast_2d(pts)
-        elif len(pts.shape) == 1:
+            if pts.ndim < 2:
+                pts = pts.reshape((1, -1))
+        elif pts.ndim == 1:
             pts = pts[:, np.newaxis]
 
-        assert pts.shape[1] == dim, (
-            "pts must be a column vector of shape (nPts, {0:d}) not "
-            "({1:d}, {2:d})".format(*((dim,)+pts.shape))
-        )
+        if not isTrusted():
+            assert pts.ndim == 2 and pts.shape[1] == dim, (
+                "pts must be a column vector of shape (nPts, {0:d}) not "
+                "{1!s}".format(dim, pts.shape)
+            )
         return pts
+
+
+class Workspace(object):
+    """Scratch buffers reused across calls
+
+    The functions taking a ``workspace`` argument (faceInfo, faceGeometry,
+    volTetra, inv2X2BlockDiagonal, inv3X3BlockDiagonal and
+    rotatePointsFromNormals) take their temporaries from it instead of
+    allocating them on every call. Buffers only grow, so in a loop over
+    problems of the same size nothing is allocated after the first
+    iteration::
+
+        workspace = Workspace()
+        for it in range(nIter):
+            normals, area = faceInfo(xyz, A, B, C, D, workspace=workspace)
+        print(workspace.highWater)  # bytes
+
+    The arrays returned by the functions never live in the workspace. A
+    workspace must not be used by several threads at the same time.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self.highWater = 0
+        self.allocations = 0
+
+    def get(self, name, shape, dtype=float):
+        """Scratch array of the given shape and dtype, contents undefined
+
+        Arrays got under the same name share their memory.
+
+        :param str name: name of the buffer
+        :param tuple shape: shape of the array
+        :param numpy.dtype dtype: dtype of the array
+        :rtype: numpy.ndarray
+        """
+        dtype = np.dtype(dtype)
+        if isinstance(shape, (int, np.integer)):
+            shape = (int(shape), )
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.size < nbytes:
+            buffer = np.empty(nbytes, dtype=np.uint8)
+            self._buffers[name] = buffer
+            self.allocations += 1
+            self.highWater = max(self.highWater, self.nbytes)
+        return buffer[:nbytes].view(dtype).reshape(shape)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the buffers"""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def clear(self):
+        """Releases the buffers, the high-water mark is kept"""
+        self._buffers.clear()
+
+    def __repr__(self):
+        return 'Workspace({0:d} buffers, {1:d} bytes, highWater={2:d})'.format(
+            len(self._buffers), self.nbytes, self.highWater
+        )
+
+
+def _scratch(workspace, name, shape, dtype=float):
+    """Scratch array from the workspace, or a new one without workspace"""
+    if workspace is None:
+        return np.empty(shape, dtype=dtype)
+    return workspace.get(name, shape, dtype)
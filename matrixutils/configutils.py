@@ -0,0 +1,210 @@
+"""Library-wide performance settings
+
+============ ================================================== ========
+setting      meaning                                            default
+============ ================================================== ========
+floatDtype   dtype of the float arrays built by the library     None
+indexDtype   int32 or int64 indices of grids and operators      None
+workers      threads or processes of the parallel functions     None
+chunkSize    items processed at a time by the chunked kernels   None
+trusted      skip the validation of the inputs of the hot paths False
+sparseFormat format of the stencils, diagonal and kron3 results None
+============ ================================================== ========
+
+None keeps the behaviour of each function: float inputs keep their
+dtype (float64 otherwise), indices are int32 when they fit, every
+kernel uses its tuned chunk size and workers if this machine has a
+profile written by :func:`matrixutils.autotune`, its own defaults
+otherwise, and operators are built as CSR. An indexDtype of int32 is
+widened to int64 where the indices do not fit. :func:`matrixutils.interpmat`
+starts worker processes only when asked, with an explicit count or
+workers='auto' for the configured or tuned one.
+
+:func:`config` overrides settings for the current context only, so
+threads and asyncio tasks each see their own, while :func:`setConfig`
+changes the process-wide values::
+
+    with matrixutils.config(floatDtype=np.float32, chunkSize=2**14):
+        normals, area, edgeLengths = faceGeometry(xyz, A, B, C, D)
+"""
+from __future__ import print_function, division
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import os
+import platform
+
+import numpy as np
+
+_global = {
+    'floatDtype': None,
+    'indexDtype': None,
+    'workers': None,
+    'chunkSize': None,
+    'trusted': False,
+    'sparseFormat': None,
+}
+_sparseFormats = ('csr', 'csc', 'coo', 'dia')
+_overrides = ContextVar('matrixutils_config', default={})
+
+
+def getConfig(name=None):
+    """Current value of a setting, or a dict of all of them"""
+    overrides = _overrides.get()
+    if name is None:
+        settings = dict(_global)
+        settings.update(overrides)
+        return settings
+    if name in overrides:
+        return overrides[name]
+    return _global[name]
+
+
+def setConfig(**settings):
+    """Changes the process-wide value of settings
+
+    Values overridden by an enclosing :func:`config` block keep their
+    overrides until the block ends.
+    """
+    _global.update(_validate(settings))
+
+
+@contextmanager
+def config(**settings):
+    """Context manager overriding settings within its block::
+
+        with config(floatDtype=np.float32, workers=8):
+            ...
+    """
+    overrides = dict(_overrides.get())
+    overrides.update(_validate(settings))
+    token = _overrides.set(overrides)
+    try:
+        yield
+    finally:
+        _overrides.reset(token)
+
+
+def _validate(settings):
+    for name, value in settings.items():
+        if name not in _global:
+            raise ValueError('Unknown setting {0!r}, use one of {1!s}'.format(
+                name, ', '.join(sorted(_global))
+            ))
+        if value is None:
+            continue
+        if name == 'floatDtype':
+            value = np.dtype(value)
+            assert value.kind == 'f', 'floatDtype must be a float dtype'
+        elif name == 'indexDtype':
+            value = np.dtype(value)
+            assert value in (np.dtype(np.int32), np.dtype(np.int64)), (
+                'indexDtype must be int32 or int64'
+            )
+        elif name in ('workers', 'chunkSize'):
+            value = int(value)
+            assert value > 0, '{0!s} must be positive'.format(name)
+        elif name == 'trusted':
+            value = bool(value)
+        elif name == 'sparseFormat':
+            assert value in _sparseFormats, (
+                'sparseFormat must be one of {0!s}'.format(
+                    ', '.join(_sparseFormats)
+                )
+            )
+        settings[name] = value
+    return settings
+
+
+def _floatDtype(dtype=None):
+    """The configured float dtype, else dtype if float, else float64"""
+    configured = getConfig('floatDtype')
+    if configured is not None:
+        return configured
+    if dtype is not None and np.dtype(dtype).kind == 'f':
+        return np.dtype(dtype)
+    return np.dtype(float)
+
+
+def _indexDtype(maxValue):
+    """The configured index dtype, else the smallest holding maxValue
+
+    The configured dtype is widened to int64 when it cannot hold maxValue.
+    """
+    dtype = np.dtype(
+        np.int32 if maxValue <= np.iinfo(np.int32).max else np.int64
+    )
+    configured = getConfig('indexDtype')
+    if configured is not None:
+        dtype = np.promote_types(configured, dtype)
+    return dtype
+
+
+def _sparseFormat(format=None):
+    """format if given, else the configured sparse format, else 'csr'"""
+    if format is None:
+        format = getConfig('sparseFormat') or 'csr'
+    return format
+
+
+def _chunkSize(kernel, default):
+    """The configured chunk size, else the tuned or default one"""
+    chunkSize = getConfig('chunkSize')
+    if chunkSize is None:
+        chunkSize = _tuned(kernel).get('chunkSize', default)
+    return chunkSize
+
+
+def _workers(kernel):
+    """The configured number of workers, else the tuned one, else 1"""
+    workers = getConfig('workers')
+    if workers is None:
+        workers = _tuned(kernel).get('workers', 1)
+    return workers
+
+
+_tuning = [None]
+
+
+def tuningPath():
+    """File of the tuned profiles
+
+    $MATRIXUTILS_TUNING, or ~/.matrixutils/tuning.json by default
+    """
+    return os.environ.get('MATRIXUTILS_TUNING') or os.path.join(
+        os.path.expanduser('~'), '.matrixutils', 'tuning.json'
+    )
+
+
+def machine():
+    """Key of the profile of this machine in the tuning file"""
+    return '{0!s}-{1!s}-{2:d}cpu'.format(
+        platform.machine(), platform.processor() or platform.system(),
+        os.cpu_count() or 1
+    )
+
+
+def loadTuning(path=None):
+    """(Re)loads the tuned settings of this machine
+
+    Called on first use with the default path. A missing or unreadable
+    file means no tuning.
+
+    :param str path: tuning file, :func:`tuningPath` by default
+    :rtype: dict
+    :return: {kernel: {'chunkSize': ..., 'workers': ...}}
+    """
+    try:
+        with open(path or tuningPath()) as f:
+            profiles = json.load(f)
+        tuning = profiles.get(machine(), {})
+    except (IOError, OSError, ValueError):
+        tuning = {}
+    _tuning[0] = tuning
+    return tuning
+
+
+def _tuned(kernel):
+    if _tuning[0] is None:
+        loadTuning()
+    return _tuning[0].get(kernel, {})
@@ -1,5 +1,7 @@
 import numpy as np
 from .matutils import mkvc
+from .codeutils import _scratch
+from .configutils import _floatDtype, _chunkSize
 
 
 def rotationMatrixFromNormals(v0, v1, tol=1e-20):
@@ -42,15 +44,92 @@ def rotationMatrixFromNormals(v0, v1, tol=1e-20):
     return np.eye(3, dtype=float) + sinT*ux + (1.-cosT)*(ux.dot(ux))
 
 
-def rotatePointsFromNormals(XYZ, n0, n1, x0=np.r_[0., 0., 0.]):
+def rotationMatricesFromNormals(v0, v1, tol=1e-20, out=None):
+    """
+        Vectorized :func:`rotationMatrixFromNormals` for many pairs of vectors.
+        Either input can be a single vector, which is then paired with every vector of the other.
+        Pairs whose cross product is below tol are masked: parallel vectors give the identity,
+        and antiparallel vectors give a rotation of pi about an axis perpendicular to v0.
+
+        :param numpy.array v0: vectors, (n, 3) or (3, )
+        :param numpy.array v1: vectors, (n, 3) or (3, )
+        :param tol = 1e-20: tolerance on the norm of the cross product of each pair
+        :param numpy.array out: optional output array, (n, 3, 3)
+        :rtype: numpy.array, (n, 3, 3)
+        :return: rotation matrices which rotate each v0 so that it is aligned with v1
+
+    """
+    v0, v1 = np.atleast_2d(v0), np.atleast_2d(v1)
+    assert v0.shape[1] == 3, "v0 should be of shape (n, 3)"
+    assert v1.shape[1] == 3, "v1 should be of shape (n, 3)"
+    v0, v1 = np.broadcast_arrays(v0, v1)
+    n = v0.shape[0]
+
+    if out is None:
+        out = np.empty((n, 3, 3), dtype=float)
+    assert out.shape == (n, 3, 3), "out should be of shape ({0:d}, 3, 3)".format(n)
+
+    # ensure both are true normals
+    n0 = v0/np.sqrt((v0**2).sum(axis=1))[:, np.newaxis]
+    n1 = v1/np.sqrt((v1**2).sum(axis=1))[:, np.newaxis]
+
+    cosT = (n0*n1).sum(axis=1)
+    sinT = np.sqrt(np.clip(1.-cosT**2, 0., None))
+
+    # define the rotation axis, which is the cross product of the two vectors
+    rotAx = np.cross(n0, n1)
+    rotAxNorm = np.sqrt((rotAx**2).sum(axis=1))
+    parallel = rotAxNorm < tol
+    rotAx[~parallel] /= rotAxNorm[~parallel, np.newaxis]
+
+    # antiparallel: rotate by pi about any axis perpendicular to n0
+    anti = parallel & (cosT < 0)
+    if np.any(anti):
+        e = np.zeros((anti.sum(), 3))
+        e[np.arange(e.shape[0]), np.abs(n0[anti]).argmin(axis=1)] = 1.
+        perp = np.cross(n0[anti], e)
+        rotAx[anti] = perp/np.sqrt((perp**2).sum(axis=1))[:, np.newaxis]
+        cosT[anti], sinT[anti] = -1., 0.
+
+    # identity for parallel vectors
+    same = parallel & ~anti
+    rotAx[same] = 0.
+    cosT[same], sinT[same] = 1., 0.
+
+    # R = cosT I + sinT [k]x + (1 - cosT) k k^T
+    kx, ky, kz = rotAx[:, 0], rotAx[:, 1], rotAx[:, 2]
+    t = 1. - cosT
+    out[:, 0, 0] = cosT + t*kx*kx
+    out[:, 0, 1] = t*kx*ky - sinT*kz
+    out[:, 0, 2] = t*kx*kz + sinT*ky
+    out[:, 1, 0] = t*kx*ky + sinT*kz
+    out[:, 1, 1] = cosT + t*ky*ky
+    out[:, 1, 2] = t*ky*kz - sinT*kx
+    out[:, 2, 0] = t*kx*kz - sinT*ky
+    out[:, 2, 1] = t*ky*kz + sinT*kx
+    out[:, 2, 2] = cosT + t*kz*kz
+
+    return out
+
+
+def rotatePointsFromNormals(XYZ, n0, n1, x0=np.r_[0., 0., 0.], out=None, chunkSize=None,
+                            workspace=None):
     """
         rotates a grid so that the vector n0 is aligned with the vector n1
 
+        The points are processed in chunks with the rotation point broadcast, so apart from the output only
+        one chunk of scratch memory is used. XYZ and out can be numpy.memmap arrays, and passing out=XYZ
+        rotates the points in place.
+
+        :param numpy.array XYZ: points to rotate, (n, 3)
         :param numpy.array n0: vector of length 3, should have norm 1
         :param numpy.array n1: vector of length 3, should have norm 1
         :param numpy.array x0: vector of length 3, point about which we perform the rotation
-        :rtype: numpy.array, 3x3
-        :return: rotation matrix which rotates the frame so that n0 is aligned with n1
+        :param numpy.array out: optional output array, (n, 3), can be XYZ
+        :param int chunkSize: number of points rotated at a time
+        :param Workspace workspace: holds the chunk buffers, if given
+        :rtype: numpy.array, (n, 3)
+        :return: rotated points
     """
 
     R = rotationMatrixFromNormals(n0, n1)
@@ -58,6 +137,30 @@ def rotatePointsFromNormals(XYZ, n0, n1, x0=np.r_[0., 0., 0.]):
     assert XYZ.shape[1] == 3, "Grid XYZ should be 3 wide"
     assert len(x0) == 3, "x0 should have length 3"
 
-    X0 = np.ones([XYZ.shape[0], 1])*mkvc(x0)
-
-    return (XYZ - X0).dot(R.T) + X0 # equivalent to (R*(XYZ - X0)).T + X0
+    n = XYZ.shape[0]
+    if out is None:
+        dtype = _floatDtype(np.result_type(XYZ.dtype, float))
+        out = np.empty((n, 3), dtype=dtype)
+    assert out.shape == XYZ.shape, "out should be of shape ({0:d}, 3)".format(n)
+    if chunkSize is None:
+        chunkSize = _chunkSize('rotatePointsFromNormals', _rotateChunkSize)
+    chunkSize = max(1, min(int(chunkSize), n))
+
+    dtype = np.result_type(XYZ.dtype, out.dtype, float)
+    x0 = mkvc(np.asarray(x0, dtype=dtype))
+    RT = R.T.astype(dtype)
+    shifted = _scratch(workspace, 'rotate.shifted', (chunkSize, 3), dtype)
+    rotated = _scratch(workspace, 'rotate.rotated', (chunkSize, 3), dtype)
+
+    # equivalent to (R*(XYZ - X0)).T + X0
+    for start in range(0, n, chunkSize):
+        stop = min(start + chunkSize, n)
+        m = stop - start
+        np.subtract(XYZ[start:stop], x0, out=shifted[:m])
+        np.dot(shifted[:m], RT, out=rotated[:m])
+        np.add(rotated[:m], x0, out=out[start:stop], casting='unsafe')
+
+    return out
+
+
+_rotateChunkSize = 65536
@@ -1,14 +1,28 @@
 import numpy as np
 from scipy import sparse as sp
-from .matutils import mkvc, ndgrid, sub2ind, sdiag
+from concurrent.futures import ThreadPoolExecutor
+from .matutils import mkvc, ndgrid, sub2ind, sdiag, GridIndexer
+from .backendutils import getKernel
+from .codeutils import _scratch
+from .configutils import _floatDtype, _indexDtype, _chunkSize, _workers
 
 
-def volTetra(xyz, A, B, C, D):
+_nodeMap = {
+    'A': [0, 0, 0], 'B': [0, 1, 0], 'C': [1, 1, 0], 'D': [1, 0, 0],
+    'E': [0, 0, 1], 'F': [0, 1, 1], 'G': [1, 1, 1], 'H': [1, 0, 1]
+}
+
+_indexCubeCache = {}
+_indexCubeCacheSize = 8
+
+
+def volTetra(xyz, A, B, C, D, workspace=None):
     """
     Returns the volume for tetrahedras volume specified by the indexes A to D.
 
     :param numpy.ndarray xyz: X,Y,Z vertex vector
     :param numpy.ndarray A,B,C,D: vert index of the tetrahedra
+    :param Workspace workspace: holds the temporaries, if given
     :rtype: numpy.ndarray
     :return: V, volume of the tetrahedra
 
@@ -22,15 +36,139 @@ def volTetra(xyz, A, B, C, D):
 
     """
 
-    AD = xyz[A, :] - xyz[D, :]
-    BD = xyz[B, :] - xyz[D, :]
-    CD = xyz[C, :] - xyz[D, :]
+    if workspace is None:
+        AD = xyz[A, :] - xyz[D, :]
+        BD = xyz[B, :] - xyz[D, :]
+        CD = xyz[C, :] - xyz[D, :]
+    else:
+        shape = np.broadcast(*[np.asarray(X) for X in (A, B, C, D)]).shape
+        edges = []
+        for X, name in [(D, 'D'), (A, 'AD'), (B, 'BD'), (C, 'CD')]:
+            E = workspace.get('volTetra.' + name, shape + (3, ), xyz.dtype)
+            np.take(xyz, np.broadcast_to(X, shape), axis=0, out=E)
+            if edges:
+                E -= edges[0]
+            edges += [E]
+        AD, BD, CD = edges[1:]
+
+    return getKernel('volTetra')(AD, BD, CD, workspace=workspace)
+
+
+def _volTetra(AD, BD, CD, workspace=None):
+    """Signed tetrahedra volumes from edge vectors stored along the last axis"""
+    if workspace is None:
+        V = (BD[..., 0]*CD[..., 1] - BD[..., 1]*CD[..., 0])*AD[..., 2] - (BD[..., 0]*CD[..., 2] - BD[..., 2]*CD[..., 0])*AD[..., 1] + (BD[..., 1]*CD[..., 2] - BD[..., 2]*CD[..., 1])*AD[..., 0]
+        return V/6
+
+    # the same operations in the same order, with preallocated temporaries
+    shape = np.broadcast(AD, BD, CD).shape[:-1]
+    dtype = np.result_type(AD, BD, CD)
+    V = np.empty(shape, dtype=dtype)
+    t = workspace.get('volTetra.t', shape, dtype)
+    u = workspace.get('volTetra.u', shape, dtype)
+    for i, (j, k, l) in enumerate([(0, 1, 2), (0, 2, 1), (1, 2, 0)]):
+        p = V if i == 0 else t
+        # p = (BD_j*CD_k - BD_k*CD_j)*AD_l
+        np.multiply(BD[..., j], CD[..., k], out=p)
+        np.multiply(BD[..., k], CD[..., j], out=u)
+        p -= u
+        p *= AD[..., l]
+        if i == 1:
+            V -= t
+        elif i == 2:
+            V += t
+    V /= 6
+    return V
+
+
+# Two decompositions of the hexahedron ABCDEFGH into five tetrahedra, as
+# columns of indexCube('ABCDEFGH', ...). Averaging both removes the bias
+# of either diagonal choice on warped cells.
+_hexTetras = np.array([
+    [0, 1, 3, 4],  # A, B, D, E  cutted edge top
+    [1, 4, 5, 6],  # B, E, F, G  cutted edge top
+    [1, 3, 4, 6],  # B, D, E, G  middle
+    [1, 2, 3, 6],  # B, C, D, G  cutted edge bottom
+    [3, 4, 6, 7],  # D, E, G, H  cutted edge bottom
+    [0, 5, 1, 2],  # A, F, B, C
+    [0, 4, 5, 7],  # A, E, F, H
+    [0, 7, 5, 2],  # A, H, F, C
+    [2, 7, 3, 0],  # C, H, D, A
+    [2, 6, 7, 5],  # C, G, H, F
+])
+
+_hexChunkSize = 16384
+
+
+def volHex(xyz, gridSize, chunkSize=None, workers=None, out=None):
+    """
+    Returns the volume of every hexahedral cell of a curvilinear mesh.
+
+    Each cell is split into five tetrahedra in two different ways and
+    the two total volumes are averaged. The eight corners of a chunk of
+    cells are gathered once, and the volumes of all sub-tetrahedra of
+    the chunk are evaluated in one vectorized pass, so the memory used
+    does not grow with the size of the mesh.
+
+    :param numpy.ndarray xyz: X,Y,Z vertex vector, (nN, 3)
+    :param numpy.ndarray gridSize: size of the nodal grid, [nNx, nNy, nNz]
+    :param int chunkSize: number of cells processed at a time
+    :param int workers: split the chunks over a pool of this many threads
+    :param numpy.ndarray out: optional output array of length nC
+    :rtype: numpy.ndarray
+    :return: V, volume of the cells, ordered as indexCube
+    """
+    assert isinstance(gridSize, np.ndarray), "Number of nodes must be an ndarray"
+    if gridSize.size != 3:
+        raise Exception('Only 3 dimensions supported.')
+    assert xyz.shape == (np.prod(gridSize), 3), (
+        "xyz must be of shape ({0:d}, 3)".format(int(np.prod(gridSize)))
+    )
+    xyz = xyz.astype(_floatDtype(xyz.dtype), copy=False)
+
+    gridSize = tuple(int(g) for g in gridSize)
+    n = tuple(g - 1 for g in gridSize)
+    nC = int(np.prod(n))
+    if out is None:
+        out = np.empty(nC, dtype=xyz.dtype)
+    assert out.shape == (nC, ), 'out must be of shape ({0:d}, )'.format(nC)
+    if chunkSize is None:
+        chunkSize = _chunkSize('volHex', _hexChunkSize)
+    chunkSize = max(1, int(chunkSize))
+
+    def volChunk(start):
+        stop = min(start + chunkSize, nC)
+        cells = np.arange(start, stop)
+        _volHexCells(xyz, gridSize, n, cells, out[start:stop])
+
+    starts = range(0, nC, chunkSize)
+    if workers is None:
+        workers = _workers('volHex')
+    if workers is None or workers <= 1 or len(starts) <= 1:
+        for start in starts:
+            volChunk(start)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(volChunk, starts))
+    return out
+
 
-    V = (BD[:, 0]*CD[:, 1] - BD[:, 1]*CD[:, 0])*AD[:, 2] - (BD[:, 0]*CD[:, 2] - BD[:, 2]*CD[:, 0])*AD[:, 1] + (BD[:, 1]*CD[:, 2] - BD[:, 2]*CD[:, 1])*AD[:, 0]
-    return V/6
+def _volHexCells(xyz, gridSize, n, cells, out):
+    """Volume of the given cells of a curvilinear mesh into out"""
+    corners = _cubeCorners('ABCDEFGH', gridSize, n, cells)
+    P = np.take(xyz, corners, axis=0)  # (m, 8, 3)
+    D = P[:, _hexTetras[:, 3]]
+    V = getKernel('volTetra')(
+        P[:, _hexTetras[:, 0]] - D,
+        P[:, _hexTetras[:, 1]] - D,
+        P[:, _hexTetras[:, 2]] - D
+    )
+    np.add(V[:, :5].sum(axis=1), V[:, 5:].sum(axis=1), out=out)
+    out /= 2
+    return out
 
 
-def indexCube(nodes, gridSize, n=None):
+def indexCube(nodes, gridSize, n=None, stacked=False):
     """
     Returns the index of nodes on the mesh.
 
@@ -40,6 +178,15 @@ def indexCube(nodes, gridSize, n=None):
        gridSize  - size of the nodal grid
        n         - number of nodes each i,j,k direction: [ni,nj,nk]
 
+    Options:
+       stacked   - true/[false], return a single (ncells, len(nodes))
+                   array instead of a tuple. The indices are computed
+                   from the grid strides in one pass, stored as int32
+                   when the grid allows it, and cached per
+                   (gridSize, nodes, n, index dtype). The cached array
+                   is read-only, :func:`clearIndexCubeCache` frees the
+                   cache.
+
 
     Output:
        index  - index in the order asked e.g. 'ABCD' --> (A,B,C,D)
@@ -85,6 +232,13 @@ def indexCube(nodes, gridSize, n=None):
     if n is None:
         n = gridSize - 1
 
+    if stacked:
+        if dim not in (2, 3):
+            raise Exception('Only 2 and 3 dimensions supported.')
+        return _indexCubeStacked(
+            nodes, tuple(int(g) for g in gridSize), tuple(int(i) for i in n)
+        )
+
     if dim == 2:
         ij = ndgrid(np.arange(n[0]), np.arange(n[1]))
         i, j = ij[:, 0], ij[:, 1]
@@ -94,11 +248,9 @@ def indexCube(nodes, gridSize, n=None):
     else:
         raise Exception('Only 2 and 3 dimensions supported.')
 
-    nodeMap = {'A': [0, 0, 0], 'B': [0, 1, 0], 'C': [1, 1, 0], 'D': [1, 0, 0],
-               'E': [0, 0, 1], 'F': [0, 1, 1], 'G': [1, 1, 1], 'H': [1, 0, 1]}
     out = ()
     for node in nodes:
-        shift = nodeMap[node]
+        shift = _nodeMap[node]
         if dim == 2:
             out += (sub2ind(gridSize, np.c_[i+shift[0], j+shift[1]]).flatten(), )
         elif dim == 3:
@@ -107,7 +259,51 @@ def indexCube(nodes, gridSize, n=None):
     return out
 
 
-def faceInfo(xyz, A, B, C, D, average=True, normalizeNormals=True):
+def _indexCubeStacked(nodes, gridSize, n):
+    """Closed form of indexCube, every corner of every cell in one array"""
+    key = (nodes, gridSize, n, _indexDtype(int(np.prod(gridSize)) - 1))
+    if key in _indexCubeCache:
+        return _indexCubeCache[key]
+
+    out = _cubeCorners(nodes, gridSize, n)
+    out.setflags(write=False)
+
+    if len(_indexCubeCache) >= _indexCubeCacheSize:
+        _indexCubeCache.pop(next(iter(_indexCubeCache)))
+    _indexCubeCache[key] = out
+    return out
+
+
+def clearIndexCubeCache():
+    """Frees the arrays cached by indexCube(..., stacked=True)"""
+    _indexCubeCache.clear()
+
+
+def _cubeCorners(nodes, gridSize, n, cells=None):
+    """Node index of the corners of all cells, or of the given cells only"""
+    dim = len(gridSize)
+    G = GridIndexer(gridSize, check=False)
+
+    # index of the (i, j, k) node of each cell, i varying fastest
+    if cells is None:
+        base = np.arange(n[0], dtype=G.dtype)
+        for d in range(1, dim):
+            step = np.arange(n[d], dtype=G.dtype) * G.strides[d]
+            base = (step[:, np.newaxis] + base[np.newaxis, :]).ravel()
+    else:
+        subs = GridIndexer(n, check=False).ind2sub(cells, axis=0)
+        base = G.sub2ind(subs, axis=0)
+
+    shifts = np.array([_nodeMap[node][:dim] for node in nodes], dtype=G.dtype)
+    out = np.empty((base.size, len(nodes)), dtype=G.dtype)
+    np.add(base[:, np.newaxis], shifts.dot(G.strides)[np.newaxis, :], out=out)
+    return out
+
+
+def faceInfo(
+    xyz, A, B, C, D, average=True, normalizeNormals=True,
+    returnEdgeLengths=False, workspace=None
+):
     """
     function [N] = faceInfo(y,A,B,C,D)
 
@@ -122,13 +318,15 @@ def faceInfo(xyz, A, B, C, D, average=True, normalizeNormals=True):
 
     Options:
        average      - [true]/false, toggles returning all normals or the average
+       returnEdgeLengths - true/[false], also return the edge lengths
+       workspace    - Workspace holding the temporaries
 
     Output:
        N            - average face normal or {nA,nB,nC,nD} if average = false
        area         - average face area
        edgeLengths  - exact edge Lengths, 4 column vector [AB, BC, CD, DA]
 
-    see also testFaceNormal testFaceArea
+    see also testFaceNormal testFaceArea, faceGeometry
 
     @author Rowan Cockett
 
@@ -137,52 +335,484 @@ def faceInfo(xyz, A, B, C, D, average=True, normalizeNormals=True):
     """
     assert type(average) is bool, 'average must be a boolean'
     assert type(normalizeNormals) is bool, 'normalizeNormals must be a boolean'
-    # compute normal that is pointing away from you.
-    #
-    #    A -------A-B------- B
-    #    |                   |
-    #    |                   |
-    #   D-A       (X)       B-C
-    #    |                   |
-    #    |                   |
-    #    D -------C-D------- C
-
-    AB = xyz[B, :] - xyz[A, :]
-    BC = xyz[C, :] - xyz[B, :]
-    CD = xyz[D, :] - xyz[C, :]
-    DA = xyz[A, :] - xyz[D, :]
-
-    def cross(X, Y):
-        return np.c_[X[:, 1]*Y[:, 2] - X[:, 2]*Y[:, 1],
-                     X[:, 2]*Y[:, 0] - X[:, 0]*Y[:, 2],
-                     X[:, 0]*Y[:, 1] - X[:, 1]*Y[:, 0]]
-
-    nA = cross(AB, DA)
-    nB = cross(BC, AB)
-    nC = cross(CD, BC)
-    nD = cross(DA, CD)
-
-    length = lambda x: np.sqrt(x[:, 0]**2 + x[:, 1]**2 + x[:, 2]**2)
-    normalize = lambda x: x/np.kron(np.ones((1, x.shape[1])), mkvc(length(x), 2))
-    if average:
-        # average the normals at each vertex.
-        N = (nA + nB + nC + nD)/4  # this is intrinsically weighted by area
-        # normalize
-        N = normalize(N)
-    else:
-        if normalizeNormals:
-            N = [normalize(nA), normalize(nB), normalize(nC), normalize(nD)]
-        else:
-            N = [nA, nB, nC, nD]
-
-    # Area calculation
-    #
-    # Approximate by 4 different triangles, and divide by 2.
-    # Each triangle is one half of the length of the cross product
-    #
-    # So also could be viewed as the average parallelogram.
-    #
-    # TODO: This does not compute correctly for concave quadrilaterals
-    area = (length(nA)+length(nB)+length(nC)+length(nD))/4
 
+    N, area, edgeLengths = faceGeometry(
+        xyz, A, B, C, D, average=average, normalizeNormals=normalizeNormals,
+        workspace=workspace
+    )
+    if not average:
+        N = [N[:, 0, :], N[:, 1, :], N[:, 2, :], N[:, 3, :]]
+
+    if returnEdgeLengths:
+        return N, area, edgeLengths
     return N, area
+
+
+def faceGeometry(
+    xyz, A, B, C, D, average=True, normalizeNormals=True, chunkSize=None,
+    normals=None, area=None, edgeLengths=None, workspace=None
+):
+    """
+    Returns the normals, area and edge lengths of a set of faces.
+
+    This is the kernel behind :func:`faceInfo`. The faces are processed in
+    chunks, and every intermediate (corners, edges and corner normals) lives
+    in scratch buffers of one chunk, so the memory used on top of the
+    outputs does not grow with the number of faces. The outputs can be
+    preallocated and are filled in place.
+
+    :param numpy.ndarray xyz: X,Y,Z vertex vector
+    :param numpy.ndarray A,B,C,D: vert index of the face (counter clockwize)
+    :param bool average: average the four corner normals
+    :param bool normalizeNormals: normalize the corner normals when
+        average is False. The averaged normal is always normalized.
+    :param int chunkSize: number of faces processed at a time
+    :param numpy.ndarray normals: optional output, (nF, 3) if average else
+        (nF, 4, 3), the corner normals in the order A, B, C, D
+    :param numpy.ndarray area: optional output, (nF, )
+    :param numpy.ndarray edgeLengths: optional output, (nF, 4), the edge
+        lengths in the order AB, BC, CD, DA
+    :param Workspace workspace: holds the scratch buffers, if given
+    :rtype: tuple
+    :return: normals, area, edgeLengths
+    """
+    corners = [np.asarray(ind).ravel() for ind in (A, B, C, D)]
+    nF = corners[0].size
+    xyz = xyz.astype(_floatDtype(xyz.dtype), copy=False)
+    dtype = xyz.dtype
+    if chunkSize is None:
+        chunkSize = _chunkSize('faceGeometry', _faceChunkSize)
+    chunkSize = max(1, min(int(chunkSize), nF))
+
+    nShape = (nF, 3) if average else (nF, 4, 3)
+    if normals is None:
+        normals = np.empty(nShape, dtype=dtype)
+    if area is None:
+        area = np.empty(nF, dtype=dtype)
+    if edgeLengths is None:
+        edgeLengths = np.empty((nF, 4), dtype=dtype)
+    assert normals.shape == nShape, (
+        'normals must be of shape {0!s}'.format(nShape)
+    )
+    assert area.shape == (nF, ), 'area must be of shape ({0:d}, )'.format(nF)
+    assert edgeLengths.shape == (nF, 4), (
+        'edgeLengths must be of shape ({0:d}, 4)'.format(nF)
+    )
+
+    getKernel('faceGeometry')(
+        xyz, corners, average, normalizeNormals, chunkSize, normals, area,
+        edgeLengths, workspace
+    )
+    return normals, area, edgeLengths
+
+
+def _faceGeometryNumpy(
+    xyz, corners, average, normalizeNormals, chunkSize, normals, area,
+    edgeLengths, workspace=None
+):
+    """Fills the outputs of faceGeometry, one chunk of faces at a time"""
+    nF = corners[0].size
+    dtype = xyz.dtype
+
+    # scratch buffers, one chunk long
+    ws = workspace
+    P = _scratch(ws, 'faceGeometry.P', (4, chunkSize, 3), dtype)  # corners
+    # edges AB, BC, CD, DA and normals nA, nB, nC, nD
+    E = _scratch(ws, 'faceGeometry.E', (4, chunkSize, 3), dtype)
+    Nc = _scratch(ws, 'faceGeometry.Nc', (4, chunkSize, 3), dtype)
+    L = _scratch(ws, 'faceGeometry.L', (4, chunkSize), dtype)
+    tmp = _scratch(ws, 'faceGeometry.tmp', chunkSize, dtype)
+
+    for start in range(0, nF, chunkSize):
+        stop = min(start + chunkSize, nF)
+        m = stop - start
+        p, e, nc, l, t = P[:, :m], E[:, :m], Nc[:, :m], L[:, :m], tmp[:m]
+
+        for c in range(4):
+            np.take(xyz, corners[c][start:stop], axis=0, out=p[c])
+
+        # compute normal that is pointing away from you.
+        #
+        #    A -------A-B------- B
+        #    |                   |
+        #    |                   |
+        #   D-A       (X)       B-C
+        #    |                   |
+        #    |                   |
+        #    D -------C-D------- C
+        for c in range(4):
+            np.subtract(p[(c + 1) % 4], p[c], out=e[c])
+            _length(e[c], edgeLengths[start:stop, c], t)
+
+        # nA = AB x DA, nB = BC x AB, nC = CD x BC, nD = DA x CD
+        for c in range(4):
+            _cross(e[c], e[c - 1], nc[c], t)
+            _length(nc[c], l[c], t)
+
+        # Area calculation
+        #
+        # Approximate by 4 different triangles, and divide by 2.
+        # Each triangle is one half of the length of the cross product
+        #
+        # So also could be viewed as the average parallelogram.
+        #
+        # TODO: This does not compute correctly for concave quadrilaterals
+        a = area[start:stop]
+        np.add(l[0], l[1], out=a)
+        a += l[2]
+        a += l[3]
+        a /= 4
+
+        if average:
+            # average the normals at each vertex.
+            # this is intrinsically weighted by area
+            N = normals[start:stop]
+            np.add(nc[0], nc[1], out=N)
+            N += nc[2]
+            N += nc[3]
+            N /= 4
+            # normalize
+            _length(N, l[0], t)
+            N /= l[0][:, np.newaxis]
+        else:
+            for c in range(4):
+                N = normals[start:stop, c]
+                if normalizeNormals:
+                    np.divide(nc[c], l[c][:, np.newaxis], out=N)
+                else:
+                    N[...] = nc[c]
+
+
+_faceChunkSize = 65536
+
+
+def _cross(X, Y, out, tmp):
+    """Row-wise cross product of two (n, 3) arrays into out"""
+    for i in range(3):
+        j, k = (i + 1) % 3, (i + 2) % 3
+        np.multiply(X[:, j], Y[:, k], out=out[:, i])
+        np.multiply(X[:, k], Y[:, j], out=tmp)
+        out[:, i] -= tmp
+
+
+def _length(X, out, tmp):
+    """Row-wise euclidean length of an (n, 3) array into out"""
+    np.multiply(X[:, 0], X[:, 0], out=tmp)
+    np.multiply(X[:, 1], X[:, 1], out=out)
+    tmp += out
+    np.multiply(X[:, 2], X[:, 2], out=out)
+    np.add(tmp, out, out=out)
+    np.sqrt(out, out=out)
+
+
+class CurvilinearGeometry(object):
+    """
+    Lazily computed and memoized geometry of a 3D curvilinear mesh.
+
+    The geometry is built around a node array and the size of the nodal
+    grid. Cell volumes, face areas and normals, edge lengths and the
+    corner indices of cells, faces and edges are computed on first access
+    and kept until the nodes change::
+
+        geom = CurvilinearGeometry(xyz, np.array([nNx, nNy, nNz]))
+        geom.cellVolumes  # computed
+        geom.cellVolumes  # cached
+        geom.xyz = xyz2   # new node version, node dependent values dropped
+
+    Faces are ordered x, y then z faces, and edges x, y then z edges, each
+    block ordered as indexCube. For a regular mesh the face normals point
+    in the positive x, y and z directions.
+
+    The cache cannot see changes made to the node array in place. After
+    modifying ``xyz`` in place call :meth:`touch`, or, when only a few
+    nodes move, use :meth:`updateNodes` to recompute only the cells,
+    faces and edges that touch them.
+
+    :param numpy.ndarray xyz: X,Y,Z vertex vector, (nN, 3)
+    :param numpy.ndarray gridSize: size of the nodal grid, [nNx, nNy, nNz]
+    """
+
+    def __init__(self, xyz, gridSize):
+        gridSize = np.asarray(gridSize)
+        if gridSize.size != 3:
+            raise Exception('Only 3 dimensions supported.')
+        self.gridSize = gridSize.astype(int)
+        self._cache = {}
+        self._version = 0
+        self.xyz = xyz
+
+    @property
+    def xyz(self):
+        """The node array, (nN, 3)"""
+        return self._xyz
+
+    @xyz.setter
+    def xyz(self, value):
+        value = np.asarray(value)
+        if value.dtype.kind != 'f':
+            value = value.astype(float)
+        assert value.shape == (self.nN, 3), (
+            "xyz must be of shape ({0:d}, 3)".format(self.nN)
+        )
+        self._xyz = value
+        self.touch()
+
+    @property
+    def version(self):
+        """Version of the node array, incremented every time it changes"""
+        return self._version
+
+    def touch(self):
+        """Marks the nodes as changed, dropping node dependent values"""
+        self._version += 1
+        for name in list(self._cache):
+            if self._cache[name][0] is not None:
+                del self._cache[name]
+
+    def updateNodes(self, inds, xyz):
+        """Moves a subset of the nodes and updates the cached geometry
+
+        The node array is modified in place. The cells, faces and edges
+        touching the moved nodes are found through the node adjacency
+        matrices, and only their entries are recomputed in the cached
+        volume, area, normal and length arrays, so the cost scales with
+        the number of nodes moved rather than with the mesh size.
+
+        :param numpy.ndarray inds: index of the moved nodes
+        :param numpy.ndarray xyz: new location of the moved nodes, (n, 3)
+        """
+        inds = np.asarray(inds).ravel()
+        xyz = np.asarray(xyz).reshape((inds.size, 3))
+
+        # node dependent values that are up to date, before the move
+        current = dict(
+            (name, value) for name, (version, value) in self._cache.items()
+            if version == self._version
+        )
+        self._xyz[inds] = xyz
+        self.touch()
+
+        if 'cellVolumes' in current:
+            vol = current['cellVolumes']
+            cells = _adjacent(self.nodeCells, inds)
+            vol[cells] = _volHexCells(
+                self.xyz, tuple(self.gridSize), tuple(self.gridSize - 1),
+                cells, np.empty(cells.size, dtype=vol.dtype)
+            )
+            self._store('cellVolumes', vol)
+
+        if 'faceAreas' in current or 'faceNormals' in current:
+            faces = _adjacent(self.nodeFaces, inds)
+            F = self.faceIndex[faces]
+            normals, area, _ = faceGeometry(
+                self.xyz, F[:, 0], F[:, 1], F[:, 2], F[:, 3]
+            )
+            for name, value in [('faceNormals', normals), ('faceAreas', area)]:
+                if name in current:
+                    current[name][faces] = value
+                    self._store(name, current[name])
+
+        if 'edgeLengths' in current:
+            lengths = current['edgeLengths']
+            edges = _adjacent(self.nodeEdges, inds)
+            E = self.edgeIndex[edges]
+            d = np.take(self.xyz, E[:, 1], axis=0)
+            d -= np.take(self.xyz, E[:, 0], axis=0)
+            new = np.empty(edges.size, dtype=d.dtype)
+            _length(d, new, np.empty_like(new))
+            lengths[edges] = new
+            self._store('edgeLengths', lengths)
+
+    @property
+    def nodeCells(self):
+        """Node to cell adjacency, sparse (nN, nC)"""
+        return self._get('nodeCells', lambda: self._computeAdjacency(
+            'nodeCells', self.cornerIndex
+        ))
+
+    @property
+    def nodeFaces(self):
+        """Node to face adjacency, sparse (nN, nF)"""
+        return self._get('nodeFaces', lambda: self._computeAdjacency(
+            'nodeFaces', self.faceIndex
+        ))
+
+    @property
+    def nodeEdges(self):
+        """Node to edge adjacency, sparse (nN, nE)"""
+        return self._get('nodeEdges', lambda: self._computeAdjacency(
+            'nodeEdges', self.edgeIndex
+        ))
+
+    @property
+    def nN(self):
+        """Number of nodes"""
+        return int(np.prod(self.gridSize))
+
+    @property
+    def nC(self):
+        """Number of cells"""
+        return int(np.prod(self.gridSize - 1))
+
+    @property
+    def vnF(self):
+        """Number of x, y and z faces"""
+        nN, nC = self.gridSize, self.gridSize - 1
+        return np.array([
+            nN[0] * nC[1] * nC[2],
+            nC[0] * nN[1] * nC[2],
+            nC[0] * nC[1] * nN[2]
+        ])
+
+    @property
+    def nF(self):
+        """Number of faces"""
+        return int(self.vnF.sum())
+
+    @property
+    def vnE(self):
+        """Number of x, y and z edges"""
+        nN, nC = self.gridSize, self.gridSize - 1
+        return np.array([
+            nC[0] * nN[1] * nN[2],
+            nN[0] * nC[1] * nN[2],
+            nN[0] * nN[1] * nC[2]
+        ])
+
+    @property
+    def nE(self):
+        """Number of edges"""
+        return int(self.vnE.sum())
+
+    @property
+    def cornerIndex(self):
+        """Node index of the corners of every cell, (nC, 8) as 'ABCDEFGH'"""
+        return self._get('cornerIndex', self._computeCornerIndex)
+
+    @property
+    def faceIndex(self):
+        """Node index of the corners of every face, (nF, 4)"""
+        return self._get('faceIndex', self._computeFaceIndex)
+
+    @property
+    def edgeIndex(self):
+        """Node index of the ends of every edge, (nE, 2)"""
+        return self._get('edgeIndex', self._computeEdgeIndex)
+
+    @property
+    def cellVolumes(self):
+        """Volume of every cell, (nC, )"""
+        return self._get('cellVolumes', self._computeCellVolumes)
+
+    @property
+    def faceAreas(self):
+        """Area of every face, (nF, )"""
+        return self._get('faceAreas', self._computeFaces)
+
+    @property
+    def faceNormals(self):
+        """Unit normal of every face, (nF, 3)"""
+        return self._get('faceNormals', self._computeFaces)
+
+    @property
+    def edgeLengths(self):
+        """Length of every edge, (nE, )"""
+        return self._get('edgeLengths', self._computeEdgeLengths)
+
+    def memoryUsage(self):
+        """Bytes held by each cached property
+
+        :rtype: dict
+        :return: {property name: bytes}
+        """
+        return dict(
+            (name, _nbytes(value)) for name, (_, value) in self._cache.items()
+        )
+
+    @property
+    def nbytes(self):
+        """Total bytes held by the cached properties"""
+        return sum(self.memoryUsage().values())
+
+    def clearCache(self):
+        """Drops every cached property"""
+        self._cache.clear()
+
+    def _get(self, name, compute):
+        entry = self._cache.get(name)
+        if entry is None or entry[0] not in (None, self._version):
+            compute()
+        return self._cache[name][1]
+
+    def _store(self, name, value, static=False):
+        self._cache[name] = (None if static else self._version, value)
+
+    # the index arrays are built outside the indexCube cache, which would
+    # keep them alive after clearCache
+    def _computeCornerIndex(self):
+        self._store('cornerIndex', _cubeCorners(
+            'ABCDEFGH', tuple(self.gridSize), tuple(self.gridSize - 1)
+        ), static=True)
+
+    def _computeFaceIndex(self):
+        nN, nC = tuple(self.gridSize), tuple(self.gridSize - 1)
+        self._store('faceIndex', np.vstack([
+            _cubeCorners('AEFB', nN, (nN[0], nC[1], nC[2])),
+            _cubeCorners('ADHE', nN, (nC[0], nN[1], nC[2])),
+            _cubeCorners('ABCD', nN, (nC[0], nC[1], nN[2])),
+        ]), static=True)
+
+    def _computeEdgeIndex(self):
+        nN, nC = tuple(self.gridSize), tuple(self.gridSize - 1)
+        self._store('edgeIndex', np.vstack([
+            _cubeCorners('AD', nN, (nC[0], nN[1], nN[2])),
+            _cubeCorners('AB', nN, (nN[0], nC[1], nN[2])),
+            _cubeCorners('AE', nN, (nN[0], nN[1], nC[2])),
+        ]), static=True)
+
+    def _computeAdjacency(self, name, index):
+        n, k = index.shape
+        adjacency = sp.csc_matrix(
+            (
+                np.ones(n * k, dtype=bool),
+                index.ravel(),
+                np.arange(0, n * k + 1, k)
+            ),
+            shape=(self.nN, n)
+        ).tocsr()
+        self._store(name, adjacency, static=True)
+
+    def _computeCellVolumes(self):
+        self._store('cellVolumes', volHex(self.xyz, self.gridSize))
+
+    def _computeFaces(self):
+        F = self.faceIndex
+        normals, area, _ = faceGeometry(
+            self.xyz, F[:, 0], F[:, 1], F[:, 2], F[:, 3]
+        )
+        self._store('faceNormals', normals)
+        self._store('faceAreas', area)
+
+    def _computeEdgeLengths(self):
+        E = self.edgeIndex
+        edges = np.take(self.xyz, E[:, 1], axis=0)
+        edges -= np.take(self.xyz, E[:, 0], axis=0)
+        lengths = np.empty(edges.shape[0], dtype=edges.dtype)
+        _length(edges, lengths, np.empty_like(lengths))
+        self._store('edgeLengths', lengths)
+
+
+def _adjacent(adjacency, inds):
+    """Unique columns of the given rows of a sparse adjacency matrix"""
+    return np.unique(adjacency[inds].indices)
+
+
+def _nbytes(value):
+    """Bytes held by an array or a sparse matrix"""
+    if sp.issparse(value):
+        return sum(
+            getattr(value, name).nbytes for name in
+            ('data', 'indices', 'indptr', 'offsets', 'row', 'col')
+            if hasattr(value, name)
+        )
+    return np.asarray(value).nbytes
@@ -0,0 +1,256 @@
+"""Building large operators in the background
+
+The ``submit*`` functions start building an operator in a thread pool and
+return a :class:`BuildFuture` at once. The build proceeds in chunks;
+between chunks it reports its progress and checks whether it was
+cancelled, so a running build can be stopped. The ``*Async`` functions
+wrap the same builds as awaitables for asyncio, where cancelling the
+task cancels the build::
+
+    future = submitInterpmat(locs, x, y, z, callback=print)
+    data = load()  # overlaps with the build
+    P = future.result()
+
+    P = await interpmatAsync(locs, x, y, z)
+
+The NumPy and SciPy parts of a build release the GIL, but the Cython
+interpolation loops hold it, so the event loop and the other threads
+only run between those loops and are slowed down during a build.
+"""
+from __future__ import print_function, division
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+from .configutils import _chunkSize, _sparseFormat
+from .matutils import mkvc, sdiag, _asFloat, _banded
+from .backendutils import getKernel
+from .interputils import _interpmatBlock, _stitchCSR
+
+_pool = []
+_poolLock = threading.Lock()
+
+
+class BuildFuture(Future):
+    """Future of an operator built in chunks
+
+    Unlike a plain Future it can be cancelled while running, in which
+    case the build stops at the end of the current chunk and
+    :meth:`result` raises CancelledError.
+    """
+
+    def __init__(self):
+        super(BuildFuture, self).__init__()
+        self.doneChunks = 0
+        self.totalChunks = 0
+        self._stop = threading.Event()
+
+    @property
+    def progress(self):
+        """Fraction of the chunks built"""
+        if self.totalChunks == 0:
+            return 1. if self.done() else 0.
+        return self.doneChunks / self.totalChunks
+
+    def cancel(self):
+        """Cancels a pending build, or stops a running one"""
+        if super(BuildFuture, self).cancel():
+            return True
+        if self.running():
+            self._stop.set()
+            return True
+        return False
+
+    def cancelled(self):
+        return super(BuildFuture, self).cancelled() or (
+            self._stop.is_set() and self.done()
+        )
+
+
+def _submit(build, total, executor, callback):
+    """Runs build(step) in the executor, step() being called per chunk"""
+    future = BuildFuture()
+    future.totalChunks = total
+
+    def step():
+        future.doneChunks += 1
+        if callback is not None:
+            callback(future.doneChunks, total)
+        if future._stop.is_set():
+            raise CancelledError('Build cancelled')
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = build(step)
+        except BaseException as error:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    if executor is None:
+        executor = _executor()
+    executor.submit(run)
+    return future
+
+
+def _executor():
+    """The managed thread pool of the builds"""
+    with _poolLock:
+        if not _pool:
+            _pool.append(ThreadPoolExecutor(
+                thread_name_prefix='matrixutils-build'
+            ))
+        return _pool[0]
+
+
+def _chunks(n, chunkSize):
+    chunkSize = max(1, int(chunkSize))
+    return [(start, min(start + chunkSize, n))
+            for start in range(0, max(n, 1), chunkSize)]
+
+
+def submitInterpmat(locs, x, y=None, z=None, chunkSize=None, executor=None,
+                    callback=None):
+    """Starts building :func:`matrixutils.interpmat` in the background
+
+    :param int chunkSize: number of points per chunk
+    :param concurrent.futures.Executor executor: thread pool running the
+        build, a managed one by default
+    :param callable callback: called as callback(done, total) after
+        every chunk
+    :rtype: BuildFuture
+    """
+    npts = locs.shape[0]
+    tensors = [t for t in (x, y, z) if t is not None]
+    chunks = _chunks(npts, _chunkSize('interpmat', 65536) if chunkSize is None
+                     else chunkSize)
+
+    def build(step):
+        blocks = []
+        for start, stop in chunks:
+            blocks += [_interpmatBlock(locs[start:stop], *tensors)]
+            step()
+        shape = (npts, int(np.prod([t.size for t in tensors])))
+        return _stitchCSR(blocks, shape)
+
+    return _submit(build, len(chunks), executor, callback)
+
+
+def submitKron3(A, B, C, format=None, chunkSize=None, executor=None,
+                callback=None):
+    """Starts building :func:`matrixutils.kron3` in the background
+
+    The rows of A are processed in chunks.
+
+    :param str format: format of the product, the configured one by default
+    :param int chunkSize: number of rows of A per chunk
+    :rtype: BuildFuture
+    """
+    A = sp.csr_matrix(A)
+    nA = A.shape[0]
+    format = _sparseFormat(format)
+    dtype = np.result_type(A.dtype, B.dtype, C.dtype)
+    if chunkSize is None:
+        chunkSize = max(1, _chunkSize('kron3', 2**20) // max(
+            1, B.shape[0] * C.shape[0]
+        ))
+    chunks = _chunks(nA, chunkSize)
+
+    def build(step):
+        blocks = []
+        for start, stop in chunks:
+            block = sp.kron(sp.kron(A[start:stop], B), C, format='csr')
+            block.sum_duplicates()
+            # scipy gives empty products a float dtype
+            blocks += [(block.indptr, block.indices,
+                        block.data.astype(dtype, copy=False))]
+            step()
+        K = _stitchCSR(blocks, (
+            nA * B.shape[0] * C.shape[0], A.shape[1] * B.shape[1] * C.shape[1]
+        ))
+        return _banded(K) if format == 'dia' else K.asformat(format)
+
+    return _submit(build, len(chunks), executor, callback)
+
+
+def submitInv3X3BlockDiagonal(
+    a11, a12, a13, a21, a22, a23, a31, a32, a33, returnMatrix=True,
+    chunkSize=None, executor=None, callback=None
+):
+    """Starts :func:`matrixutils.inv3X3BlockDiagonal` in the background
+
+    :param int chunkSize: number of blocks per chunk
+    :rtype: BuildFuture
+    """
+    return _submitInverse(
+        'inv3X3', [a11, a12, a13, a21, a22, a23, a31, a32, a33],
+        returnMatrix, chunkSize, executor, callback
+    )
+
+
+def submitInv2X2BlockDiagonal(
+    a11, a12, a21, a22, returnMatrix=True, chunkSize=None, executor=None,
+    callback=None
+):
+    """Starts :func:`matrixutils.inv2X2BlockDiagonal` in the background
+
+    :param int chunkSize: number of blocks per chunk
+    :rtype: BuildFuture
+    """
+    return _submitInverse(
+        'inv2X2', [a11, a12, a21, a22], returnMatrix, chunkSize, executor,
+        callback
+    )
+
+
+def _submitInverse(kernel, a, returnMatrix, chunkSize, executor, callback):
+    a = np.broadcast_arrays(*_asFloat(*[mkvc(v) for v in a]))
+    n = a[0].size
+    chunks = _chunks(n, _chunkSize(kernel, 2**18) if chunkSize is None
+                     else chunkSize)
+
+    def build(step):
+        b = [np.empty(n, dtype=a[0].dtype) for _ in a]
+        for start, stop in chunks:
+            out = getKernel(kernel)(*[v[start:stop] for v in a])
+            for bi, oi in zip(b, out):
+                bi[start:stop] = oi
+            step()
+        if not returnMatrix:
+            return tuple(b)
+        m = int(round(len(b) ** 0.5))
+        return sp.vstack([
+            sp.hstack([sdiag(b[i * m + j]) for j in range(m)])
+            for i in range(m)
+        ])
+
+    return _submit(build, len(chunks), executor, callback)
+
+
+def interpmatAsync(*args, **kwargs):
+    """Awaitable :func:`submitInterpmat`, call within a running loop"""
+    return _wrap(submitInterpmat(*args, **kwargs))
+
+
+def kron3Async(*args, **kwargs):
+    """Awaitable :func:`submitKron3`, call within a running loop"""
+    return _wrap(submitKron3(*args, **kwargs))
+
+
+def inv3X3BlockDiagonalAsync(*args, **kwargs):
+    """Awaitable :func:`submitInv3X3BlockDiagonal`"""
+    return _wrap(submitInv3X3BlockDiagonal(*args, **kwargs))
+
+
+def inv2X2BlockDiagonalAsync(*args, **kwargs):
+    """Awaitable :func:`submitInv2X2BlockDiagonal`"""
+    return _wrap(submitInv2X2BlockDiagonal(*args, **kwargs))
+
+
+def _wrap(future):
+    import asyncio
+    return asyncio.wrap_future(future)
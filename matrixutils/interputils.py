@@ -1,29 +1,27 @@
 from __future__ import print_function
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import scipy.sparse as sp
-from .matutils import mkvc, sub2ind
+from .matutils import (
+    mkvc, sub2ind, GridIndexer, inv2X2BlockDiagonal, inv3X3BlockDiagonal
+)
+from .curvutils import indexCube
+from .backendutils import getKernel
+from .configutils import _floatDtype, _indexDtype, _chunkSize, _workers
 
-try:
-    from . import interputils_cython as pyx
-    _interp_point_1D = pyx._interp_point_1D
-    _interpmat1D = pyx._interpmat1D
-    _interpmat2D = pyx._interpmat2D
-    _interpmat3D = pyx._interpmat3D
-    _interpCython = True
-except ImportError:
-    print("""Interpolation will not work, use setup.py to compile the cython:
 
-        python setup.py install""")
-    _interpCython = False
-
-
-def interpmat(locs, x, y=None, z=None):
+def interpmat(locs, x, y=None, z=None, workers=None, executor=None):
     """Local interpolation computed for each receiver point in turn
 
     :param numpy.ndarray loc: Location of points to interpolate to
     :param numpy.ndarray x: Tensor of 1st dimension of grid.
     :param numpy.ndarray y: Tensor of 2nd dimension of grid. None by default.
     :param numpy.ndarray z: Tensor of 3rd dimension of grid. None by default.
+    :param int workers: split the points in this many contiguous blocks
+        built in parallel, in a pool of processes unless an executor is
+        given. 'auto' takes the configured or tuned count, see
+        :mod:`matrixutils.configutils`. Serial by default.
+    :param concurrent.futures.Executor executor: pool building the blocks
     :rtype: scipy.sparse.csr_matrix
     :return: Interpolation matrix
 
@@ -46,23 +44,380 @@ def interpmat(locs, x, y=None, z=None):
     """
 
     npts = locs.shape[0]
-    locs = locs.astype(float)
-    x = x.astype(float)
-    if y is None and z is None:
-        shape = [x.size]
-        inds, vals = _interpmat1D(mkvc(locs), x)
-    elif z is None:
-        y = y.astype(float)
-        shape = [x.size, y.size]
-        inds, vals = _interpmat2D(locs, x, y)
+    tensors = [t for t in (x, y, z) if t is not None]
+    if workers == 'auto':
+        workers = _workers('interpmat')
+    if executor is None and (workers is None or workers <= 1):
+        blocks = [_interpmatBlock(locs, *tensors)]
     else:
-        y = y.astype(float)
-        z = z.astype(float)
-        shape = [x.size, y.size, z.size]
-        inds, vals = _interpmat3D(locs, x, y, z)
-
-    I = np.repeat(range(npts), 2**len(shape))
-    J = sub2ind(shape, inds)
-    Q = sp.csr_matrix((vals, (I, J)),
-                      shape=(npts, np.prod(shape)))
+        if workers is None:
+            workers = getattr(executor, '_max_workers', None) or 1
+        bounds = np.linspace(0, npts, max(int(workers), 1) + 1).astype(int)
+        parts = [locs[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        if executor is None:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                blocks = list(pool.map(_interpmatBlock, parts, *[
+                    [t] * len(parts) for t in tensors
+                ]))
+        else:
+            blocks = [
+                executor.submit(_interpmatBlock, part, *tensors)
+                for part in parts
+            ]
+            blocks = [block.result() for block in blocks]
+
+    shape = (npts, int(np.prod([t.size for t in tensors])))
+    return _stitchCSR(blocks, shape)
+
+
+def _interpmatBlock(locs, x, y=None, z=None):
+    """Canonical CSR components of the interpolation from a block of points
+
+    The rows are built directly from the 2**dim corner weights of each
+    point: the columns of a row are sorted and repeated corners summed.
+
+    :rtype: tuple
+    :return: indptr, indices, data
+    """
+    npts = locs.shape[0]
+    locs = locs.astype(float)
+    tensors = [t.astype(float) for t in (x, y, z) if t is not None]
+    shape = [t.size for t in tensors]
+    if len(tensors) == 1:
+        locs = mkvc(locs)
+    kernel = getKernel('interpmat{0:d}D'.format(len(tensors)))
+    inds, vals = kernel(locs, *tensors)
+
+    k = 2**len(shape)
+    J = sub2ind(shape, inds).reshape(npts, k)
+    order = np.argsort(J, axis=1, kind='stable')
+    J = np.take_along_axis(J, order, axis=1)
+    V = np.take_along_axis(np.asarray(vals).reshape(npts, k), order, axis=1)
+
+    # first entry of each run of equal columns within a row
+    first = np.ones((npts, k), dtype=bool)
+    np.not_equal(J[:, 1:], J[:, :-1], out=first[:, 1:])
+    first = first.ravel()
+    starts = np.flatnonzero(first)
+    data = np.add.reduceat(V.ravel(), starts) if starts.size else V.ravel()
+    indices = J.ravel()[first]
+    indptr = np.zeros(npts + 1, dtype=np.int64)
+    np.cumsum(first.reshape(npts, k).sum(axis=1), out=indptr[1:])
+    return indptr, indices, data
+
+
+# Bit of each axis in the corner number c = 0 .. 2**dim - 1 of the
+# interpolation kernels: the corner uses the upper node along an axis
+# when its bit is set.
+_interpBits = {1: [0], 2: [1, 0], 3: [1, 0, 2]}
+
+
+def _interpmatNumpy(locs, *tensors):
+    """Corner subscripts and weights of the points in a tensor mesh
+
+    Reference implementation of the interpolation kernels, matching the
+    compiled ones bit for bit.
+
+    :param numpy.ndarray locs: points, (npts, dim), or (npts, ) in 1D
+    :param numpy.ndarray tensors: node tensors of each dimension
+    :rtype: tuple
+    :return: inds, (npts * 2**dim, dim) or (npts * 2, ) in 1D, and vals
+    """
+    dim = len(tensors)
+    npts = locs.shape[0]
+    k = 2**dim
+    locs = locs.reshape(npts, dim)
+    inds = np.empty((npts * k, dim), dtype=np.int64)
+    vals = np.ones(npts * k)
+    for d, x in enumerate(tensors):
+        xp = locs[:, d]
+        i2 = np.searchsorted(x, xp, side='right')
+        i1 = np.clip(i2 - 1, 0, x.size - 1)
+        np.clip(i2, 0, x.size - 1, out=i2)
+        same = i1 == i2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w1 = (x[i2] - xp) / (x[i2] - x[i1])
+        w1[same] = 0.5
+        w2 = 1 - w1
+        for c in range(k):
+            upper = (c >> _interpBits[dim][d]) & 1
+            inds[c::k, d] = i2 if upper else i1
+            vals[c::k] *= w2 if upper else w1
+    if dim == 1:
+        inds = inds[:, 0]
+    return inds, vals
+
+
+def _stitchCSR(blocks, shape):
+    """CSR matrix from the canonical components of consecutive row blocks"""
+    nnz = np.cumsum([0] + [block[0][-1] for block in blocks])
+    indexDtype = _indexDtype(max(nnz[-1], shape[1] - 1))
+    indptr = np.empty(shape[0] + 1, dtype=indexDtype)
+    indptr[0] = 0
+    row = 0
+    for (ptr, _, _), offset in zip(blocks, nnz):
+        n = ptr.size - 1
+        np.add(ptr[1:], offset, out=indptr[row + 1:row + n + 1])
+        row += n
+    indices = np.concatenate(
+        [block[1] for block in blocks]
+    ).astype(indexDtype, copy=False)
+    data = np.concatenate([block[2] for block in blocks])
+    if data.dtype.kind == 'f':
+        data = data.astype(_floatDtype(data.dtype), copy=False)
+    Q = sp.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+    # scipy may downcast the indices, keep the configured dtype
+    Q.indices, Q.indptr = indices, indptr
+    Q.has_canonical_format = True
     return Q
+
+
+# Corners of a cell in the order of the bits of (i, j, k), so that corner c
+# sits at the local coordinate ((c >> 0) & 1, (c >> 1) & 1, (c >> 2) & 1).
+_isoCorners = {2: 'ADBC', 3: 'ADBCEHFG'}
+
+
+class CellLocator(object):
+    """Point location on a 2D or 3D curvilinear mesh
+
+    The bounding boxes of the cells are registered in a uniform grid of
+    buckets with about one cell per bucket. A point is only tested
+    against the cells of its bucket, so locating a point costs O(1) on
+    average instead of O(nC). The exact inside-cell test inverts the
+    bilinear/trilinear map of each candidate cell with Newton's method.
+
+    .. code::
+
+        locator = CellLocator(xyz, np.array([nNx, nNy, nNz]))
+        cells, xi = locator.locate(points)
+        Q = locator.interpmat(points)
+
+    :param numpy.ndarray xyz: node locations, (nN, dim)
+    :param numpy.ndarray gridSize: size of the nodal grid
+    :param float tol: tolerance on the local coordinates of the inside test
+    :param int chunkSize: number of cells or points processed at a time
+    """
+
+    maxIterations = 20
+
+    def __init__(self, xyz, gridSize, tol=1e-6, chunkSize=None):
+        gridSize = np.asarray(gridSize)
+        dim = gridSize.size
+        if dim not in _isoCorners:
+            raise Exception('Only 2 and 3 dimensions supported.')
+        assert xyz.shape == (np.prod(gridSize), dim), (
+            "xyz must be of shape ({0:d}, {1:d})".format(
+                int(np.prod(gridSize)), dim
+            )
+        )
+        self.xyz = xyz.astype(float, copy=False)
+        self.gridSize = gridSize
+        self.dim = dim
+        self.tol = tol
+        if chunkSize is None:
+            chunkSize = _chunkSize('CellLocator', 65536)
+        self.chunkSize = chunkSize
+        self.corners = indexCube(_isoCorners[dim], gridSize, stacked=True)
+        self._bits = (
+            np.arange(2**dim)[:, np.newaxis] >> np.arange(dim) & 1
+        ).astype(bool)
+        self._buildBuckets()
+
+    @property
+    def nC(self):
+        """Number of cells"""
+        return self.corners.shape[0]
+
+    def _buildBuckets(self):
+        nC, dim = self.nC, self.dim
+        lo = np.empty((nC, dim))
+        hi = np.empty((nC, dim))
+        for start in range(0, nC, self.chunkSize):
+            s = slice(start, start + self.chunkSize)
+            P = np.take(self.xyz, self.corners[s], axis=0)
+            P.min(axis=1, out=lo[s])
+            P.max(axis=1, out=hi[s])
+
+        self.origin = lo.min(axis=0)
+        self.top = hi.max(axis=0)
+        extent = self.top - self.origin
+        flat = extent <= 0
+        extent[flat] = 1.
+        # about one cell per bucket, buckets as square as possible
+        scale = (nC / np.prod(extent[~flat])) ** (1. / max((~flat).sum(), 1))
+        self.nBuckets = np.where(
+            flat, 1, np.maximum(1, np.round(extent * scale))
+        ).astype(int)
+        self.bucketWidth = extent / self.nBuckets
+        self._buckets = GridIndexer(self.nBuckets, check=False)
+
+        cells, subs = _expandBoxes(self._bucketSubs(lo), self._bucketSubs(hi))
+        buckets = self._buckets.sub2ind(subs)
+        order = np.argsort(buckets, kind='stable')
+        self._bucketCells = cells[order].astype(self.corners.dtype)
+        self._bucketPtr = np.r_[0, np.cumsum(
+            np.bincount(buckets, minlength=self._buckets.size)
+        )]
+
+    def _bucketSubs(self, locs):
+        subs = np.floor((locs - self.origin) / self.bucketWidth).astype(int)
+        return np.clip(subs, 0, self.nBuckets - 1)
+
+    def locate(self, locs):
+        """Finds the cell containing each point
+
+        :param numpy.ndarray locs: points, (npts, dim)
+        :rtype: tuple
+        :return: cells, the index of the containing cell or -1 for points
+            outside the mesh, and xi, the local coordinates of the points
+            in their cell, (npts, dim)
+        """
+        locs = np.atleast_2d(np.asarray(locs, dtype=float))
+        assert locs.shape[1] == self.dim, (
+            "locs must be of shape (npts, {0:d})".format(self.dim)
+        )
+        npts = locs.shape[0]
+        cells = -np.ones(npts, dtype=np.int64)
+        xi = np.zeros((npts, self.dim))
+        for start in range(0, npts, self.chunkSize):
+            s = slice(start, start + self.chunkSize)
+            cells[s], xi[s] = self._locateChunk(locs[s])
+        return cells, xi
+
+    def _locateChunk(self, locs):
+        npts = locs.shape[0]
+        cells = -np.ones(npts, dtype=np.int64)
+        xi = np.zeros((npts, self.dim))
+
+        inside = np.all((locs >= self.origin) & (locs <= self.top), axis=1)
+        pts = np.nonzero(inside)[0]
+        buckets = self._buckets.sub2ind(self._bucketSubs(locs[pts]))
+        first = self._bucketPtr[buckets]
+        counts = self._bucketPtr[buckets + 1] - first
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pairPts = np.repeat(pts, counts)
+        pairCells = self._bucketCells[np.repeat(first, counts) + local]
+
+        # cheap bounding box test before the exact one
+        X = np.take(self.xyz, self.corners[pairCells], axis=0)
+        pairLocs = locs[pairPts]
+        lo, hi = X[:, 0].copy(), X[:, 0].copy()
+        for c in range(1, X.shape[1]):
+            np.minimum(lo, X[:, c], out=lo)
+            np.maximum(hi, X[:, c], out=hi)
+        pad = self.tol * (hi - lo)
+        inBox = np.all((pairLocs >= lo - pad) & (pairLocs <= hi + pad), axis=1)
+        pairPts, pairCells = pairPts[inBox], pairCells[inBox]
+        pairXi = self._inverseMap(X[inBox], pairLocs[inBox])
+        found = np.all(
+            (pairXi >= -self.tol) & (pairXi <= 1 + self.tol), axis=1
+        )
+        # the first cell found wins for points on shared faces
+        hits, firstHit = np.unique(pairPts[found], return_index=True)
+        cells[hits] = pairCells[found][firstHit]
+        xi[hits] = np.clip(pairXi[found][firstHit], 0, 1)
+        return cells, xi
+
+    def _shape(self, xi):
+        """Shape functions and their derivatives at the local coordinates"""
+        # 1D shape functions and their derivatives, (m, 2**dim) per axis
+        F = [np.where(self._bits[:, d], xi[:, d:d+1], 1 - xi[:, d:d+1])
+             for d in range(self.dim)]
+        dF = [np.where(self._bits[:, d], 1., -1.) for d in range(self.dim)]
+        N = np.prod(F, axis=0)
+        dN = np.empty(N.shape + (self.dim, ))
+        for d in range(self.dim):
+            dN[:, :, d] = dF[d]
+            for e in range(self.dim):
+                if e != d:
+                    dN[:, :, d] *= F[e]
+        return N, dN
+
+    def _inverseMap(self, X, locs):
+        """Local coordinates of locs in the cells with corners X
+
+        Newton's method on the bilinear/trilinear map. Pairs stop iterating
+        once converged or once clearly outside of their cell.
+        """
+        xi = 0.5 * np.ones(locs.shape)
+        active = np.arange(locs.shape[0])
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for _ in range(self.maxIterations):
+                if active.size == 0:
+                    break
+                Xa = X[active]
+                N, dN = self._shape(xi[active])
+                r = np.einsum('mk,mka->ma', N, Xa) - locs[active]
+                J = np.einsum('mkd,mka->mad', dN, Xa)
+                if self.dim == 2:
+                    b = inv2X2BlockDiagonal(
+                        J[:, 0, 0], J[:, 0, 1], J[:, 1, 0], J[:, 1, 1],
+                        returnMatrix=False
+                    )
+                else:
+                    b = inv3X3BlockDiagonal(
+                        *[J[:, i, j] for i in range(3) for j in range(3)],
+                        returnMatrix=False
+                    )
+                Jinv = np.reshape(np.c_[b], (-1, self.dim, self.dim))
+                step = np.einsum('mda,ma->md', Jinv, r)
+                xi[active] -= step
+                keep = (
+                    np.any(np.abs(step) > 1e-12, axis=1) &
+                    np.all(np.abs(xi[active] - 0.5) < 2, axis=1)
+                )
+                active = active[keep]
+        xi[~np.all(np.isfinite(xi), axis=1)] = np.inf
+        return xi
+
+    def interpmat(self, locs):
+        """Bilinear/trilinear interpolation matrix from the nodes to locs
+
+        Rows of points outside the mesh are empty.
+
+        :param numpy.ndarray locs: points, (npts, dim)
+        :rtype: scipy.sparse.csr_matrix
+        :return: Interpolation matrix, (npts, nN)
+        """
+        cells, xi = self.locate(locs)
+        found = cells >= 0
+        N, _ = self._shape(xi[found])
+        k = N.shape[1]
+        indptr = np.r_[0, np.cumsum(found * k)]
+        return sp.csr_matrix(
+            (N.ravel(), self.corners[cells[found]].ravel(), indptr),
+            shape=(cells.size, self.xyz.shape[0])
+        )
+
+
+def interpmatCurv(locs, xyz, gridSize):
+    """Local interpolation on a curvilinear mesh
+
+    Builds a :class:`CellLocator` and returns its interpolation matrix.
+    Reuse the locator when interpolating to several sets of points.
+
+    :param numpy.ndarray locs: Location of points to interpolate to
+    :param numpy.ndarray xyz: node locations, (nN, dim)
+    :param numpy.ndarray gridSize: size of the nodal grid
+    :rtype: scipy.sparse.csr_matrix
+    :return: Interpolation matrix
+    """
+    return CellLocator(xyz, gridSize).interpmat(locs)
+
+
+def _expandBoxes(lo, hi):
+    """Every integer subscript of a set of inclusive boxes
+
+    :rtype: tuple
+    :return: the box of each subscript and the subscripts, (n, dim)
+    """
+    extent = hi - lo + 1
+    counts = extent.prod(axis=1)
+    boxes = np.repeat(np.arange(lo.shape[0]), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    subs = np.empty((local.size, lo.shape[1]), dtype=lo.dtype)
+    for d in range(lo.shape[1]):
+        e = extent[boxes, d]
+        subs[:, d] = lo[boxes, d] + local % e
+        local //= e
+    return boxes, subs
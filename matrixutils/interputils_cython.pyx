@@ -178,3 +178,33 @@ def _interpmat3D(np.ndarray[np.float64_t, ndim=2] locs,
         vals[8*i+7] = xs.w2*ys.w2*zs.w2
     
     return inds,vals
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def _cellSubs(np.float64_t[:] x, np.float64_t[:] xp):
+    """
+        cell of each coordinate along an axis, with the same search as
+        the interpolation: x[i] <= xp < x[i+1], the last cell also holding
+        x[-1], and -1 for coordinates outside [x[0], x[-1]]
+
+        :param numpy.ndarray x: Tensor vector of the nodes along the axis
+        :param numpy.ndarray xp: coordinates of the points along the axis
+        :rtype: numpy.ndarray
+        :return: cell subscripts, int64
+    """
+    cdef np.int64_t nx = x.shape[0]
+    cdef np.int64_t npts = xp.shape[0]
+    cdef np.int64_t i, ind
+    subs = np.empty(npts, dtype=np.int64)
+    cdef np.int64_t[:] out = subs
+    with nogil:
+        for i in range(npts):
+            if not (x[0] <= xp[i] <= x[nx-1]):
+                out[i] = -1
+                continue
+            ind = _bisect_right(x, xp[i]) - 1
+            if ind == nx-1:
+                ind = nx-2
+            out[i] = ind
+    return subs
@@ -0,0 +1,160 @@
+"""Raw on-disk format for the operators built by matrixutils
+
+The components of a CSR, CSC or BSR matrix (or a dense array) are written
+uncompressed, each aligned to 64 bytes, after a small JSON header::
+
+    saveOperator('P.mxop', interpmat(locs, x, y, z))
+    P = loadOperator('P.mxop')  # memory mapped, read-only
+
+Loading maps the file and wraps the components without copying them, so
+even very large operators open instantly and their pages are shared
+through the OS page cache between all the processes reading them.
+"""
+from __future__ import print_function, division
+import json
+import struct
+
+import numpy as np
+
+_magic = b'MXUTOP01'
+_align = 64
+_components = {
+    'csr': ('data', 'indices', 'indptr'),
+    'csc': ('data', 'indices', 'indptr'),
+    'bsr': ('data', 'indices', 'indptr'),
+    'dense': ('data', ),
+}
+
+
+def saveOperator(fname, A):
+    """Writes a sparse operator or an array to fname
+
+    CSR, CSC and BSR matrices are stored as they are, other sparse formats
+    are converted to CSR first.
+
+    :param str fname: file name
+    :param A: scipy.sparse matrix or numpy.ndarray
+    """
+    header, arrays = _operatorComponents(A)
+    offset = 0
+    for entry, array in zip(header['arrays'], arrays):
+        offset = _aligned(offset)
+        entry['offset'] = offset
+        offset += array.nbytes
+
+    meta = json.dumps(header).encode('utf-8')
+    start = _aligned(len(_magic) + 8 + len(meta))
+    with open(fname, 'wb') as f:
+        f.write(_magic)
+        f.write(struct.pack('<Q', len(meta)))
+        f.write(meta)
+        for entry, array in zip(header['arrays'], arrays):
+            f.write(b'\0' * (start + entry['offset'] - f.tell()))
+            f.write(memoryview(array).cast('B'))
+
+
+def loadOperator(fname, mmap=True):
+    """Reads an operator written by :func:`saveOperator`
+
+    Sparse arrays come back as sparse arrays, except with scipy < 1.8
+    which only has matrices.
+
+    :param str fname: file name
+    :param bool mmap: memory map the file read-only instead of reading it
+    :rtype: scipy.sparse matrix or numpy.ndarray
+    """
+    with open(fname, 'rb') as f:
+        if f.read(len(_magic)) != _magic:
+            raise ValueError(
+                '{0!s} is not a matrixutils operator file'.format(fname)
+            )
+        size, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(size).decode('utf-8'))
+    start = _aligned(len(_magic) + 8 + size)
+
+    if mmap:
+        raw = np.memmap(fname, dtype=np.uint8, mode='r')
+    else:
+        raw = np.fromfile(fname, dtype=np.uint8)
+    arrays = []
+    for entry in header['arrays']:
+        dtype = np.dtype(entry['dtype'])
+        begin = start + entry['offset']
+        end = begin + dtype.itemsize * int(np.prod(entry['shape']))
+        arrays += [np.ndarray(
+            entry['shape'], dtype=dtype, buffer=raw[begin:end]
+        )]
+    return _operatorFromComponents(header, arrays)
+
+
+def _aligned(offset):
+    return -(-offset // _align) * _align
+
+
+def _operatorComponents(A):
+    """Header and contiguous component arrays of a sparse matrix or array
+
+    The header is a JSON-able dict holding the format, shape and a list of
+    {'name', 'dtype', 'shape'} entries matching the arrays.
+    """
+    import scipy.sparse as sp
+    if sp.issparse(A):
+        fmt = A.format if A.format in _components else 'csr'
+        if fmt != A.format:
+            A = A.asformat(fmt)
+        header = {
+            'format': fmt,
+            'shape': list(A.shape),
+            'sparray': not isinstance(A, sp.spmatrix),
+            'canonical': bool(A.has_canonical_format),
+        }
+        if fmt == 'bsr':
+            header['blocksize'] = list(A.blocksize)
+    else:
+        A = np.asarray(A)
+        fmt = 'dense'
+        header = {'format': fmt, 'shape': list(A.shape)}
+        A = {'data': A}
+
+    arrays = []
+    for name in _components[fmt]:
+        array = getattr(A, name) if fmt != 'dense' else A[name]
+        arrays += [np.ascontiguousarray(array)]
+    header['arrays'] = [
+        {'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        for name, array in zip(_components[fmt], arrays)
+    ]
+    return header, arrays
+
+
+def _operatorFromComponents(header, arrays):
+    """Rebuilds the operator from its header and component arrays
+
+    The arrays are wrapped without copies.
+    """
+    fmt = header['format']
+    if fmt == 'dense':
+        return arrays[0]
+
+    import scipy.sparse as sp
+    data, indices, indptr = arrays
+    shape = tuple(header['shape'])
+    # scipy < 1.8 has no sparse arrays, read them as matrices there
+    sparray = header.get('sparray', False) and hasattr(sp, 'csr_array')
+    if fmt == 'bsr':
+        cls = sp.bsr_array if sparray else sp.bsr_matrix
+        A = cls(
+            (data, indices, indptr), shape=shape,
+            blocksize=tuple(header['blocksize']), copy=False
+        )
+    else:
+        cls = {
+            'csr': sp.csr_array if sparray else sp.csr_matrix,
+            'csc': sp.csc_array if sparray else sp.csc_matrix,
+        }[fmt]
+        A = cls((data, indices, indptr), shape=shape, copy=False)
+    # scipy copies int64 indices that fit in int32, keep the mapped ones
+    A.indices, A.indptr = indices, indptr
+    if header.get('canonical', False):
+        A.has_canonical_format = True
+    return A
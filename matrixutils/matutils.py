@@ -1,6 +1,9 @@
 from __future__ import division
 import numpy as np
 import scipy.sparse as sp
+from .codeutils import isTrusted, _scratch
+from .configutils import getConfig, _floatDtype, _indexDtype, _sparseFormat
+from .backendutils import getKernel
 
 
 def mkvc(x, numDims=1):
@@ -39,12 +42,18 @@ def mkvc(x, numDims=1):
         return x.flatten(order='F')[:, np.newaxis, np.newaxis]
 
 
-def sdiag(h):
-    """Sparse diagonal matrix"""
+def sdiag(h, format=None):
+    """Sparse diagonal matrix
+
+    :param str format: sparse format, the configured one by default
+    """
     if isinstance(h, Zero):
         return Zero()
 
-    return sp.spdiags(mkvc(h), 0, h.size, h.size, format="csr")
+    h = mkvc(h)
+    if h.dtype.kind == 'f':
+        h = h.astype(_floatDtype(h.dtype), copy=False)
+    return sp.spdiags(h, 0, h.size, h.size, format=_sparseFormat(format))
 
 
 def sdInv(M):
@@ -52,14 +61,39 @@ def sdInv(M):
     return sdiag(1.0 / M.diagonal())
 
 
-def speye(n):
+def speye(n, format=None):
     """Sparse identity"""
-    return sp.identity(n, format="csr")
+    return sp.identity(n, dtype=_floatDtype(), format=_sparseFormat(format))
+
 
+def kron3(A, B, C, format=None):
+    """Three kron prods
+
+    In DIA format, the product falls back to CSR when its diagonals would
+    hold more than twice its entries, as kron(I, A) does for a non square
+    A: keep such operators in the outer factors, e.g.
+    kron3(ddx(n3), speye(n2), speye(n1)) has 2 diagonals.
+    """
+    format = _sparseFormat(format)
+    if format == 'dia':
+        return _banded(sp.kron(sp.kron(A, B), C, format='coo'))
+    return sp.kron(sp.kron(A, B), C, format=format)
 
-def kron3(A, B, C):
-    """Three kron prods"""
-    return sp.kron(sp.kron(A, B), C, format="csr")
+
+def spmatmul(A, B, format=None):
+    """Product of two sparse matrices, kept banded in DIA format
+
+    Two DIA matrices are multiplied diagonal by diagonal, without going
+    through CSR. Other products are computed by scipy, and converted as
+    :func:`kron3` does.
+
+    :param str format: format of the product, the configured one by default
+    """
+    format = _sparseFormat(format)
+    if format == 'dia' and A.format == 'dia' and B.format == 'dia':
+        return _diaMatmul(A, B)
+    C = A.dot(B)
+    return _banded(C) if format == 'dia' else C.asformat(format)
 
 
 def spzeros(n1, n2):
@@ -67,34 +101,184 @@ def spzeros(n1, n2):
     return sp.dia_matrix((n1, n2))
 
 
-def ddx(n):
+def ddx(n, format=None):
     """Define 1D derivatives, inner, this means we go from n+1 to n"""
     return sp.spdiags(
-        (np.ones((n+1, 1))*[-1, 1]).T, [0, 1], n, n+1,
-        format="csr"
+        (np.ones((n+1, 1))*[-1, 1]).T.astype(_floatDtype()), [0, 1], n, n+1,
+        format=_sparseFormat(format)
     )
 
 
-def av(n):
+def av(n, format=None):
     """Define 1D averaging operator from nodes to cell-centers."""
     return sp.spdiags(
-        (0.5*np.ones((n+1, 1))*[1, 1]).T, [0, 1], n, n+1,
-        format="csr"
+        (0.5*np.ones((n+1, 1))*[1, 1]).T.astype(_floatDtype()), [0, 1], n, n+1,
+        format=_sparseFormat(format)
     )
 
 
-def av_extrap(n):
+def av_extrap(n, format=None):
     """Define 1D averaging operator from cell-centers to nodes."""
-    Av = (
-        sp.spdiags(
-            (0.5 * np.ones((n, 1)) * [1, 1]).T,
-            [-1, 0],
-            n + 1, n,
-            format="csr"
-        ) +
-        sp.csr_matrix(([0.5, 0.5], ([0, n], [0, n-1])), shape=(n+1, n))
-    )
-    return Av
+    # the end nodes take the value of their cell
+    data = (0.5 * np.ones((n, 1)) * [1, 1]).T.astype(_floatDtype())
+    data[0, -1] = data[1, 0] = 1
+    Av = sp.dia_matrix((data, [-1, 0]), shape=(n + 1, n))
+    return Av.asformat(_sparseFormat(format))
+
+
+def applyDdx(f, axis=0, transpose=False, out=None):
+    """Applies :func:`ddx` along an axis of an array, without building it
+
+    Matches the sparse product exactly, e.g. for a field F of shape
+    (n1 + 1, n2, n3)::
+
+        mkvc(applyDdx(F, 0)) == kron3(speye(n3), speye(n2), ddx(n1)) * mkvc(F)
+
+    :param numpy.ndarray f: array of n + 1 entries along axis, or n if
+        transposed
+    :param int axis: axis of the stencil
+    :param bool transpose: apply the transpose of ddx(n) instead
+    :param numpy.ndarray out: result, must not overlap f
+    :rtype: numpy.ndarray
+    :return: array of n entries along axis, or n + 1 if transposed
+    """
+    f, out, at = _stencilArrays(f, axis, -1 if not transpose else +1, out)
+    if not transpose:
+        return np.subtract(at(f, slice(1, None)), at(f, slice(None, -1)),
+                           out=out)
+    np.negative(at(f, _first), out=at(out, _first))
+    np.subtract(at(f, slice(None, -1)), at(f, slice(1, None)),
+                out=at(out, slice(1, -1)))
+    at(out, _last)[...] = at(f, _last)
+    return out
+
+
+def applyAv(f, axis=0, transpose=False, out=None):
+    """Applies :func:`av` along an axis of an array, without building it
+
+    :param numpy.ndarray f: array of n + 1 entries along axis, or n if
+        transposed
+    :param int axis: axis of the stencil
+    :param bool transpose: apply the transpose of av(n) instead
+    :param numpy.ndarray out: result, must not overlap f
+    :rtype: numpy.ndarray
+    :return: array of n entries along axis, or n + 1 if transposed
+    """
+    f, out, at = _stencilArrays(f, axis, -1 if not transpose else +1, out)
+    if not transpose:
+        return _average(at(f, slice(None, -1)), at(f, slice(1, None)), out)
+    np.multiply(0.5, at(f, _first), out=at(out, _first))
+    _average(at(f, slice(None, -1)), at(f, slice(1, None)),
+             at(out, slice(1, -1)))
+    np.multiply(0.5, at(f, _last), out=at(out, _last))
+    return out
+
+
+def applyAvExtrap(f, axis=0, transpose=False, out=None):
+    """Applies :func:`av_extrap` along an axis of an array, without building it
+
+    :param numpy.ndarray f: array of n entries along axis, or n + 1 if
+        transposed
+    :param int axis: axis of the stencil
+    :param bool transpose: apply the transpose of av_extrap(n) instead
+    :param numpy.ndarray out: result, must not overlap f
+    :rtype: numpy.ndarray
+    :return: array of n + 1 entries along axis, or n if transposed
+    """
+    f, out, at = _stencilArrays(f, axis, +1 if not transpose else -1, out)
+    if not transpose:
+        at(out, _first)[...] = at(f, _first)
+        _average(at(f, slice(None, -1)), at(f, slice(1, None)),
+                 at(out, slice(1, -1)))
+        at(out, _last)[...] = at(f, _last)
+        return out
+    _average(at(f, slice(None, -1)), at(f, slice(1, None)), out)
+    if f.shape[axis % f.ndim] == 2:
+        # a single cell, both nodes average to it with weight 1
+        np.add(at(f, _first), at(f, slice(1, 2)), out=at(out, _first))
+        return out
+    np.add(at(f, _first), 0.5 * at(f, slice(1, 2)), out=at(out, _first))
+    np.add(0.5 * at(f, slice(-2, -1)), at(f, _last), out=at(out, _last))
+    return out
+
+
+_first, _last = slice(None, 1), slice(-1, None)
+
+
+def _stencilArrays(f, axis, change, out):
+    """f in the dtype of the sparse product, the result and an indexer
+
+    :param int change: entries added to the axis by the stencil
+    :return: f, out, and at(a, index) indexing a along the axis
+    """
+    f = np.asarray(f)
+    f = f.astype(np.result_type(f.dtype, _floatDtype()), copy=False)
+    axis = axis % f.ndim
+    shape = f.shape[:axis] + (f.shape[axis] + change, ) + f.shape[axis+1:]
+    assert shape[axis] > 0, 'too few entries along axis {0:d}'.format(axis)
+    if out is None:
+        out = np.empty(shape, dtype=f.dtype)
+    assert out.shape == shape, 'out must be of shape {0!s}'.format(shape)
+
+    def at(a, index):
+        return a[(slice(None), ) * axis + (index, )]
+    return f, out, at
+
+
+# most values stored by a DIA matrix per nonzero entry, see _banded
+_diaMaxFill = 2
+
+
+def _banded(M):
+    """M as DIA, or as CSR when DIA would store too many zeros"""
+    M = M.tocoo()
+    offsets = np.unique(M.col.astype(np.int64) - M.row)
+    if offsets.size * M.shape[1] > _diaMaxFill * M.nnz:
+        return M.tocsr()
+    return M.todia()
+
+
+def _diaMatmul(A, B):
+    """Product of two DIA matrices, one diagonal per sum of their offsets"""
+    m, k = A.shape
+    n = B.shape[1]
+    a, b = _diaData(A), _diaData(B)
+    columns = np.arange(n)
+    diagonals = {}
+    for p, ap in zip(A.offsets, a):
+        for q, bq in zip(B.offsets, b):
+            # C[i, j] += A[i, i + p] * B[i + p, j], with j = i + p + q
+            inner = columns - q
+            valid = (inner >= 0) & (inner < k) & (inner >= p) & (inner < m + p)
+            if not valid.any():
+                continue
+            d = np.zeros(n, dtype=np.result_type(a, b))
+            d[valid] = ap[inner[valid]] * bq[valid]
+            if p + q in diagonals:
+                diagonals[p + q] += d
+            else:
+                diagonals[p + q] = d
+    offsets = sorted(diagonals)
+    data = np.array(
+        [diagonals[offset] for offset in offsets],
+        dtype=np.result_type(a, b)
+    ).reshape(len(offsets), n)
+    return sp.dia_matrix((data, offsets), shape=(m, n))
+
+
+def _diaData(M):
+    """Diagonals of a DIA matrix, padded or cut to its number of columns"""
+    data = np.zeros((M.data.shape[0], M.shape[1]), dtype=M.data.dtype)
+    width = min(M.data.shape[1], M.shape[1])
+    data[:, :width] = M.data[:, :width]
+    return data
+
+
+def _average(a, b, out):
+    """0.5*a + 0.5*b, rounded as the sparse averages"""
+    np.multiply(0.5, a, out=out)
+    out += 0.5 * b
+    return out
 
 
 def ndgrid(*args, **kwargs):
@@ -193,6 +377,155 @@ def sub2ind(shape, subs):
     return mkvc(inds)
 
 
+class GridIndexer(object):
+    """
+    Precomputed index conversions for a fixed grid shape.
+
+    :func:`sub2ind` and :func:`ind2sub` validate their input and work out
+    the Fortran-ordered strides of the shape on every call. When the same
+    shape is used over and over, build a GridIndexer once and reuse it::
+
+        G = GridIndexer((5, 2))
+
+        G.sub2ind([[0, 0], [4, 0], [0, 1], [4, 1]])
+            > [0 4 5 9]
+
+        G.ind2sub([0, 4, 5, 9])
+            > (array([0, 4, 0, 4]), array([0, 0, 1, 1]))
+
+    Indices are returned as int32 when every index of the grid fits,
+    and as int64 otherwise. Subscripts can be given as an ``(n, dim)``
+    array (``axis=1``, the :func:`sub2ind` convention) or as a
+    ``(dim, n)`` array (``axis=0``) and are never transposed or copied.
+
+    :param tuple shape: shape of the grid
+    :param bool check: validate the inputs of every conversion. Use
+        ``check=False`` for trusted inputs in tight loops. By default
+        inputs are validated unless the library is in trusted mode.
+    """
+
+    def __init__(self, shape, check=None):
+        shape = tuple(int(s) for s in np.atleast_1d(shape))
+        assert len(shape) > 0, "shape must have at least one dimension"
+        assert all(s > 0 for s in shape), "shape must be positive"
+
+        size = 1
+        strides = []
+        for s in shape:
+            strides += [size]
+            size *= s
+
+        self.shape = shape
+        self.dim = len(shape)
+        self.size = size
+        self.check = check
+        self.dtype = _indexDtype(size - 1)
+        self.strides = np.array(strides, dtype=self.dtype)
+
+    def __repr__(self):
+        return 'GridIndexer(shape={0!r}, dtype={1!s})'.format(
+            self.shape, self.dtype
+        )
+
+    @property
+    def _check(self):
+        if self.check is None:
+            return not isTrusted()
+        return self.check
+
+    def sub2ind(self, subs, axis=1, out=None):
+        """From the subscripts, returns the index into the grid
+
+        :param numpy.ndarray subs: subscripts, ``(n, dim)`` or ``(dim, n)``
+        :param int axis: axis of subs that runs over the dimensions
+        :param numpy.ndarray out: optional output array of length n
+        :rtype: numpy.ndarray
+        :return: indices of length n
+        """
+        subs = np.asarray(subs)
+        if subs.ndim == 1:
+            subs = subs[np.newaxis, :]
+            axis = 1
+        assert axis in (0, 1), "axis must be 0 or 1"
+        check = self._check
+
+        if check:
+            assert subs.ndim == 2 and subs.shape[axis] == self.dim, (
+                'Subscripts must be of shape (n, {0:d}) with axis=1 or '
+                '({0:d}, n) with axis=0'.format(self.dim)
+            )
+            assert subs.dtype.kind in 'iu', 'Subscripts must be integers'
+
+        n = subs.shape[1 - axis]
+        if out is None:
+            out = np.empty(n, dtype=self.dtype)
+        if n == 0:
+            return out
+
+        tmp = None
+        for d in range(self.dim):
+            sub = subs[:, d] if axis == 1 else subs[d]
+            if check and (
+                sub.min() < 0 or sub.max() >= self.shape[d]
+            ):
+                raise ValueError(
+                    'Subscripts out of bounds for dimension {0:d} '
+                    'of size {1:d}'.format(d, self.shape[d])
+                )
+            if d == 0:
+                np.copyto(out, sub, casting='unsafe')
+                continue
+            if tmp is None:
+                tmp = np.empty_like(out)
+            np.multiply(sub, self.strides[d], out=tmp, casting='unsafe')
+            out += tmp
+        return out
+
+    def ind2sub(self, inds, axis=None, out=None):
+        """From the indices, returns the subscripts into the grid
+
+        :param numpy.ndarray inds: indices of length n
+        :param int axis: None returns a tuple of dim arrays (the
+            :func:`ind2sub` convention), 1 an ``(n, dim)`` array and 0 a
+            ``(dim, n)`` array
+        :param numpy.ndarray out: optional output array, requires axis
+        :rtype: tuple or numpy.ndarray
+        :return: subscripts
+        """
+        inds = np.asarray(inds)
+        if self._check:
+            assert inds.ndim == 1, (
+                'Indexing must be done as a 1D row vector, e.g. [3,6,6,...]'
+            )
+            assert inds.dtype.kind in 'iu', 'Indices must be integers'
+            if inds.size and (inds.min() < 0 or inds.max() >= self.size):
+                raise ValueError(
+                    'Indices out of bounds for a grid of size '
+                    '{0:d}'.format(self.size)
+                )
+
+        n = inds.size
+        if out is None:
+            if axis is None or axis == 0:
+                out = np.empty((self.dim, n), dtype=self.dtype)
+            else:
+                out = np.empty((n, self.dim), dtype=self.dtype)
+        else:
+            assert axis is not None, "out requires axis to be 0 or 1"
+
+        subs = [out[d] if axis in (None, 0) else out[:, d]
+                for d in range(self.dim)]
+
+        rem = inds.astype(self.dtype, copy=True)
+        for d in range(self.dim - 1):
+            np.divmod(rem, self.shape[d], out=(rem, subs[d]))
+        np.copyto(subs[-1], rem)
+
+        if axis is None:
+            return tuple(subs)
+        return out
+
+
 def getSubArray(A, ind):
     """subArray"""
     assert type(ind) == list, "ind must be a list of vectors"
@@ -209,7 +542,8 @@ def getSubArray(A, ind):
 
 
 def inv3X3BlockDiagonal(
-    a11, a12, a13, a21, a22, a23, a31, a32, a33, returnMatrix=True
+    a11, a12, a13, a21, a22, a23, a31, a32, a33, returnMatrix=True,
+    workspace=None
 ):
     """ B = inv3X3BlockDiagonal(a11, a12, a13, a21, a22, a23, a31, a32, a33)
 
@@ -218,6 +552,10 @@ def inv3X3BlockDiagonal(
     Input:
      A   - a11, a12, a13, a21, a22, a23, a31, a32, a33
 
+    Options:
+     workspace - Workspace holding the temporaries, and the entries of B
+                 when returnMatrix
+
     Output:
      B   - inverse
     """
@@ -231,27 +569,14 @@ def inv3X3BlockDiagonal(
     a31 = mkvc(a31)
     a32 = mkvc(a32)
     a33 = mkvc(a33)
-
-    detA = (
-        a31*a12*a23 -
-        a31*a13*a22 -
-        a21*a12*a33 +
-        a21*a13*a32 +
-        a11*a22*a33 -
-        a11*a23*a32
+    a11, a12, a13, a21, a22, a23, a31, a32, a33 = _asFloat(
+        a11, a12, a13, a21, a22, a23, a31, a32, a33
     )
 
-    b11 = +(a22*a33 - a23*a32)/detA
-    b12 = -(a12*a33 - a13*a32)/detA
-    b13 = +(a12*a23 - a13*a22)/detA
-
-    b21 = +(a31*a23 - a21*a33)/detA
-    b22 = -(a31*a13 - a11*a33)/detA
-    b23 = +(a21*a13 - a11*a23)/detA
-
-    b31 = -(a31*a22 - a21*a32)/detA
-    b32 = +(a31*a12 - a11*a32)/detA
-    b33 = -(a21*a12 - a11*a22)/detA
+    a = (a11, a12, a13, a21, a22, a23, a31, a32, a33)
+    b11, b12, b13, b21, b22, b23, b31, b32, b33 = getKernel('inv3X3')(
+        *a, out=_inverseOut(workspace, returnMatrix, a), workspace=workspace
+    )
 
     if not returnMatrix:
         return b11, b12, b13, b21, b22, b23, b31, b32, b33
@@ -261,7 +586,8 @@ def inv3X3BlockDiagonal(
                       sp.hstack((sdiag(b31), sdiag(b32),  sdiag(b33)))))
 
 
-def inv2X2BlockDiagonal(a11, a12, a21, a22, returnMatrix=True):
+def inv2X2BlockDiagonal(a11, a12, a21, a22, returnMatrix=True,
+                        workspace=None):
     """ B = inv2X2BlockDiagonal(a11, a12, a21, a22)
 
     Inverts a stack of 2x2 matrices by using the inversion formula
@@ -271,6 +597,10 @@ def inv2X2BlockDiagonal(a11, a12, a21, a22, returnMatrix=True):
     Input:
     A   - a11, a12, a21, a22
 
+    Options:
+    workspace - Workspace holding the temporaries, and the entries of B
+                when returnMatrix
+
     Output:
     B   - inverse
     """
@@ -279,14 +609,12 @@ def inv2X2BlockDiagonal(a11, a12, a21, a22, returnMatrix=True):
     a12 = mkvc(a12)
     a21 = mkvc(a21)
     a22 = mkvc(a22)
+    a11, a12, a21, a22 = _asFloat(a11, a12, a21, a22)
 
-    # compute inverse of the determinant.
-    detAinv = 1./(a11*a22 - a21*a12)
-
-    b11 = +detAinv*a22
-    b12 = -detAinv*a12
-    b21 = -detAinv*a21
-    b22 = +detAinv*a11
+    a = (a11, a12, a21, a22)
+    b11, b12, b21, b22 = getKernel('inv2X2')(
+        *a, out=_inverseOut(workspace, returnMatrix, a), workspace=workspace
+    )
 
     if not returnMatrix:
         return b11, b12, b21, b22
@@ -295,6 +623,136 @@ def inv2X2BlockDiagonal(a11, a12, a21, a22, returnMatrix=True):
                       sp.hstack((sdiag(b21), sdiag(b22)))))
 
 
+def _asFloat(*arrays):
+    """The arrays in the configured float dtype, if one is set
+
+    Complex arrays stay complex, in the complex dtype of matching
+    precision.
+    """
+    dtype = np.result_type(*arrays)
+    if dtype.kind == 'c':
+        if getConfig('floatDtype') is not None:
+            dtype = np.result_type(_floatDtype(), np.complex64)
+    else:
+        dtype = _floatDtype(dtype)
+    return [a.astype(dtype, copy=False) for a in arrays]
+
+
+def _inverseOut(workspace, returnMatrix, a):
+    """Entries of the inverses in the workspace, when only copied from"""
+    if workspace is None or not returnMatrix:
+        return None
+    shape, dtype = np.broadcast(*a).shape, np.result_type(*a)
+    return [
+        workspace.get('inverse.b{0:d}'.format(i), shape, dtype)
+        for i in range(len(a))
+    ]
+
+
+def _inv3X3(a11, a12, a13, a21, a22, a23, a31, a32, a33, out=None,
+            workspace=None):
+    """Entries of the inverses of a stack of 3x3 matrices
+
+    :param list out: arrays receiving the entries, new ones by default
+    :param Workspace workspace: holds the temporaries, if given
+    """
+    if workspace is None and out is None:
+        detA = (
+            a31*a12*a23 -
+            a31*a13*a22 -
+            a21*a12*a33 +
+            a21*a13*a32 +
+            a11*a22*a33 -
+            a11*a23*a32
+        )
+
+        b11 = +(a22*a33 - a23*a32)/detA
+        b12 = -(a12*a33 - a13*a32)/detA
+        b13 = +(a12*a23 - a13*a22)/detA
+
+        b21 = +(a31*a23 - a21*a33)/detA
+        b22 = -(a31*a13 - a11*a33)/detA
+        b23 = +(a21*a13 - a11*a23)/detA
+
+        b31 = -(a31*a22 - a21*a32)/detA
+        b32 = +(a31*a12 - a11*a32)/detA
+        b33 = -(a21*a12 - a11*a22)/detA
+
+        return b11, b12, b13, b21, b22, b23, b31, b32, b33
+
+    # the same operations in the same order, in preallocated arrays
+    a = (a11, a12, a13, a21, a22, a23, a31, a32, a33)
+    shape, dtype = np.broadcast(*a).shape, np.result_type(*a)
+    if out is None:
+        out = [np.empty(shape, dtype=dtype) for _ in range(9)]
+    detA = _scratch(workspace, 'inverse.det', shape, dtype)
+    t = _scratch(workspace, 'inverse.tmp', shape, dtype)
+
+    for i, (x, y, z, sign) in enumerate([
+        (a31, a12, a23, +1), (a31, a13, a22, -1), (a21, a12, a33, -1),
+        (a21, a13, a32, +1), (a11, a22, a33, +1), (a11, a23, a32, -1),
+    ]):
+        p = detA if i == 0 else t
+        np.multiply(x, y, out=p)
+        p *= z
+        if i > 0:
+            (np.add if sign > 0 else np.subtract)(detA, t, out=detA)
+
+    for b, (w, x, y, z, sign) in zip(out, [
+        (a22, a33, a23, a32, +1), (a12, a33, a13, a32, -1),
+        (a12, a23, a13, a22, +1), (a31, a23, a21, a33, +1),
+        (a31, a13, a11, a33, -1), (a21, a13, a11, a23, +1),
+        (a31, a22, a21, a32, -1), (a31, a12, a11, a32, +1),
+        (a21, a12, a11, a22, -1),
+    ]):
+        # b = sign * (w*x - y*z) / detA
+        np.multiply(w, x, out=b)
+        np.multiply(y, z, out=t)
+        b -= t
+        b /= detA
+        if sign < 0:
+            np.negative(b, out=b)
+
+    return tuple(out)
+
+
+def _inv2X2(a11, a12, a21, a22, out=None, workspace=None):
+    """Entries of the inverses of a stack of 2x2 matrices
+
+    :param list out: arrays receiving the entries, new ones by default
+    :param Workspace workspace: holds the temporaries, if given
+    """
+    if workspace is None and out is None:
+        # compute inverse of the determinant.
+        detAinv = 1./(a11*a22 - a21*a12)
+
+        b11 = +detAinv*a22
+        b12 = -detAinv*a12
+        b21 = -detAinv*a21
+        b22 = +detAinv*a11
+
+        return b11, b12, b21, b22
+
+    # the same operations in the same order, in preallocated arrays
+    a = (a11, a12, a21, a22)
+    shape, dtype = np.broadcast(*a).shape, np.result_type(*a)
+    if out is None:
+        out = [np.empty(shape, dtype=dtype) for _ in range(4)]
+    detAinv = _scratch(workspace, 'inverse.det', shape, dtype)
+    t = _scratch(workspace, 'inverse.tmp', shape, dtype)
+
+    np.multiply(a11, a22, out=detAinv)
+    np.multiply(a21, a12, out=t)
+    detAinv -= t
+    np.divide(1., detAinv, out=detAinv)
+    for b, x, sign in zip(out, (a22, a12, a21, a11), (+1, -1, -1, +1)):
+        np.multiply(detAinv, x, out=b)
+        if sign < 0:
+            np.negative(b, out=b)
+
+    return tuple(out)
+
+
 class Zero(object):
     """
     An efficient zero object.
@@ -1,7 +1,7 @@
 import numpy as np
 
 
-def meshTensor(value):
+def meshTensor(value, returnSpec=False):
     """**meshTensor** takes a list of numbers and tuples
     that have the form::
 
@@ -23,24 +23,164 @@ def meshTensor(value):
     refers to the increase factor, if this number
     is negative this section of the tensor is flipped right-to-left.
 
+    With ``returnSpec=True`` the compact :class:`TensorSpec` the
+    tensor was expanded from is returned alongside it.
+
+    """
+    spec = TensorSpec(value)
+    if returnSpec:
+        return spec.h, spec
+    return spec.h
+
+
+class TensorSpec(object):
+    """Run-length description of a tensor, see :func:`meshTensor`
+
+    The segments of the tensor are kept instead of being expanded, so
+    that node positions and the cell containing a location can be
+    computed in closed form from the segments, without materialising
+    or bisecting the expanded axis::
+
+        spec = TensorSpec([(10.0, 5, -1.3), (10.0, 50), (10.0, 5, 1.3)])
+        spec.nC            # 60
+        spec.nodeAt(55)    # position of node 55
+        spec.locate(x)     # index of the cells containing x
+
+    :param list value: list of scalars and tuples, as for meshTensor
+    :param float x0: origin of the tensor
     """
-    if type(value) is not list:
-        raise Exception('meshTensor must be a list of scalars and tuples.')
-
-    proposed = []
-    for v in value:
-        if np.isscalar(v):
-            proposed += [float(v)]
-        elif type(v) is tuple and len(v) == 2:
-            proposed += [float(v[0])]*int(v[1])
-        elif type(v) is tuple and len(v) == 3:
-            start = float(v[0])
-            num = int(v[1])
-            factor = float(v[2])
-            pad = ((np.ones(num)*np.abs(factor))**(np.arange(num)+1))*start
-            if factor < 0: pad = pad[::-1]
-            proposed += pad.tolist()
-        else:
-            raise Exception('meshTensor must contain only scalars and len(2) or len(3) tuples.')
-
-    return np.array(proposed)
+
+    def __init__(self, value, x0=0.):
+        if type(value) is not list:
+            raise Exception('meshTensor must be a list of scalars and tuples.')
+
+        segments = []
+        for v in value:
+            if np.isscalar(v):
+                segments += [(float(v), 1, 1.)]
+            elif type(v) is tuple and len(v) == 2:
+                segments += [(float(v[0]), int(v[1]), 1.)]
+            elif type(v) is tuple and len(v) == 3:
+                segments += [(float(v[0]), int(v[1]), float(v[2]))]
+            else:
+                raise Exception('meshTensor must contain only scalars and len(2) or len(3) tuples.')
+
+        self.segments = segments
+        self.x0 = float(x0)
+
+        h, n, f = np.array(segments, dtype=float).reshape(-1, 3).T
+        self._h = h
+        self._n = n.astype(int)
+        self._a = np.abs(f)
+        self._flip = f < 0
+        self._geometric = self._a != 1
+        self._lengths = self._partial(self._n, np.arange(len(segments)))
+        self._cellStart = np.r_[0, np.cumsum(self._n)]
+        self._nodeStart = self.x0 + np.r_[0., np.cumsum(self._lengths)]
+
+    def __repr__(self):
+        return 'TensorSpec({0!r}, x0={1!r})'.format(
+            [s[:2] if s[2] == 1 else s for s in self.segments], self.x0
+        )
+
+    @property
+    def nC(self):
+        """Number of cells"""
+        return int(self._cellStart[-1])
+
+    @property
+    def length(self):
+        """Length of the tensor"""
+        return self._nodeStart[-1] - self.x0
+
+    @property
+    def h(self):
+        """Cell widths"""
+        h = np.empty(self.nC)
+        for i, (start, num, factor) in enumerate(self.segments):
+            s = slice(self._cellStart[i], self._cellStart[i + 1])
+            if not self._geometric[i]:
+                h[s] = start
+                continue
+            h[s] = ((np.ones(num)*np.abs(factor))**(np.arange(num)+1))*start
+            if factor < 0:
+                h[s] = h[s][::-1]
+        return h
+
+    @property
+    def nodes(self):
+        """Node positions"""
+        return self.nodeAt(np.arange(self.nC + 1))
+
+    @property
+    def centers(self):
+        """Cell centre positions"""
+        nodes = self.nodes
+        return (nodes[:-1] + nodes[1:])/2.
+
+    def nodeAt(self, i):
+        """Position of the nodes i, computed from the segments
+
+        :param numpy.ndarray i: node indices
+        :rtype: numpy.ndarray
+        :return: node positions
+        """
+        i = np.asarray(i)
+        seg = np.clip(
+            np.searchsorted(self._cellStart, i, side='right') - 1,
+            0, len(self.segments) - 1
+        )
+        m = i - self._cellStart[seg]
+        return self._nodeStart[seg] + self._partial(m, seg)
+
+    def locate(self, x):
+        """Index of the cell containing each location
+
+        Cells are closed on the left, the last cell is also closed on
+        the right. Locations outside of the tensor return -1.
+
+        :param numpy.ndarray x: locations
+        :rtype: numpy.ndarray
+        :return: cell indices
+        """
+        x = np.asarray(x, dtype=float)
+        seg = np.clip(
+            np.searchsorted(self._nodeStart, x, side='right') - 1,
+            0, len(self.segments) - 1
+        )
+        h, n, a = self._h[seg], self._n[seg], self._a[seg]
+        flip, geometric = self._flip[seg], self._geometric[seg]
+        d = x - self._nodeStart[seg]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            m = np.floor(d/h)
+            # geometric: a**m = 1 + d (a - 1) / (h a), from the left or,
+            # when flipped, from the right end of the segment
+            dg = np.where(flip, self._lengths[seg] - d, d)
+            q = np.log1p(np.maximum(dg, 0)*(a - 1)/(h*a))/np.log(a)
+            m = np.where(
+                geometric, np.where(flip, n - np.ceil(q), np.floor(q)), m
+            )
+        m = np.clip(np.nan_to_num(m), 0, n - 1).astype(int)
+
+        # guard against round off at the cell boundaries
+        cells = self._cellStart[seg] + m
+        last = self._cellStart[seg + 1] - 1
+        cells -= (self.nodeAt(cells) > x) & (m > 0)
+        cells += (self.nodeAt(cells + 1) <= x) & (cells < last)
+
+        outside = (x < self.x0) | (x > self._nodeStart[-1])
+        cells[outside] = -1
+        return cells
+
+    def _partial(self, m, seg):
+        """Length of the first m cells of the segments seg"""
+        h, n, a = self._h[seg], self._n[seg], self._a[seg]
+        flip, geometric = self._flip[seg], self._geometric[seg]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # sum of h a**(k + 1) for k < m
+            full = h*a*(a**n - 1)/(a - 1)
+            fromLeft = h*a*(a**m - 1)/(a - 1)
+            fromRight = full - h*a*(a**(n - m) - 1)/(a - 1)
+            out = np.where(flip, fromRight, fromLeft)
+        return np.where(geometric, out, m*h)
@@ -0,0 +1,217 @@
+"""Numba implementations of the hot kernels
+
+Registered as the 'numba' backend in :mod:`matrixutils.backendutils`,
+see there for the signatures. Every kernel loops over its items once,
+in parallel, without the temporaries of the NumPy versions. Compiled
+kernels are cached on disk.
+
+The tbb and omp threading layers of numba do not survive a fork: once a
+parallel kernel ran, forked process pools (:func:`matrixutils.interpmat`
+with workers, :class:`matrixutils.SharedOperator`) hang or crash. The
+workqueue layer is selected instead, unless ``NUMBA_THREADING_LAYER`` is
+set, and as it is not threadsafe the kernels are launched one at a time.
+"""
+from __future__ import print_function, division
+import os
+import threading
+
+import numba
+import numpy as np
+
+if 'NUMBA_THREADING_LAYER' not in os.environ:
+    numba.config.THREADING_LAYER = 'workqueue'
+_launch = threading.Lock()
+
+_bits = {1: (0, ), 2: (1, 0), 3: (1, 0, 2)}
+
+
+def _asFloat(*arrays):
+    """The arrays in their common dtype, float64 unless float or complex"""
+    dtype = np.result_type(*arrays)
+    if dtype.kind not in 'fc':
+        dtype = np.dtype(float)
+    return [np.asarray(a, dtype=dtype) for a in arrays]
+
+
+def interpmat(locs, *tensors):
+    dim = len(tensors)
+    npts = locs.shape[0]
+    locs = np.ascontiguousarray(locs.reshape(npts, dim), dtype=float)
+    inds = np.empty((npts * 2**dim, dim), dtype=np.int64)
+    vals = np.empty(npts * 2**dim)
+    bits = np.array(_bits[dim], dtype=np.int64)
+    tensors = tuple(np.ascontiguousarray(t, dtype=float) for t in tensors)
+    with _launch:
+        _interpmat(locs, tensors, bits, inds, vals)
+    if dim == 1:
+        inds = inds[:, 0]
+    return inds, vals
+
+
+@numba.njit(parallel=True, cache=True)
+def _interpmat(locs, tensors, bits, inds, vals):
+    npts, dim = locs.shape
+    k = vals.size // npts
+    for i in numba.prange(npts):
+        for c in range(k):
+            vals[i * k + c] = 1.
+        for d in range(dim):
+            x = tensors[d]
+            xp = locs[i, d]
+            i2 = np.searchsorted(x, xp, side='right')
+            i1 = min(max(i2 - 1, 0), x.size - 1)
+            i2 = min(max(i2, 0), x.size - 1)
+            if i1 == i2:
+                w1 = 0.5
+            else:
+                w1 = (x[i2] - xp) / (x[i2] - x[i1])
+            w2 = 1 - w1
+            for c in range(k):
+                if (c >> bits[d]) & 1:
+                    inds[i * k + c, d] = i2
+                    vals[i * k + c] *= w2
+                else:
+                    inds[i * k + c, d] = i1
+                    vals[i * k + c] *= w1
+
+
+def inv2X2(a11, a12, a21, a22, out=None, workspace=None):
+    a = np.broadcast_arrays(*_asFloat(a11, a12, a21, a22))
+    if out is None:
+        out = [np.empty(a[0].shape, dtype=a[0].dtype) for _ in range(4)]
+    b = list(out)
+    with _launch:
+        _inv2X2(*[v.ravel() for v in list(a) + b])
+    return tuple(b)
+
+
+@numba.njit(parallel=True, cache=True)
+def _inv2X2(a11, a12, a21, a22, b11, b12, b21, b22):
+    for i in numba.prange(a11.size):
+        detAinv = 1./(a11[i]*a22[i] - a21[i]*a12[i])
+        b11[i] = +detAinv*a22[i]
+        b12[i] = -detAinv*a12[i]
+        b21[i] = -detAinv*a21[i]
+        b22[i] = +detAinv*a11[i]
+
+
+def inv3X3(a11, a12, a13, a21, a22, a23, a31, a32, a33, out=None,
+           workspace=None):
+    a = np.broadcast_arrays(*_asFloat(
+        a11, a12, a13, a21, a22, a23, a31, a32, a33
+    ))
+    if out is None:
+        out = [np.empty(a[0].shape, dtype=a[0].dtype) for _ in range(9)]
+    b = list(out)
+    with _launch:
+        _inv3X3(*[v.ravel() for v in list(a) + b])
+    return tuple(b)
+
+
+@numba.njit(parallel=True, cache=True)
+def _inv3X3(a11, a12, a13, a21, a22, a23, a31, a32, a33,
+            b11, b12, b13, b21, b22, b23, b31, b32, b33):
+    for i in numba.prange(a11.size):
+        detA = (
+            a31[i]*a12[i]*a23[i] -
+            a31[i]*a13[i]*a22[i] -
+            a21[i]*a12[i]*a33[i] +
+            a21[i]*a13[i]*a32[i] +
+            a11[i]*a22[i]*a33[i] -
+            a11[i]*a23[i]*a32[i]
+        )
+        b11[i] = +(a22[i]*a33[i] - a23[i]*a32[i])/detA
+        b12[i] = -(a12[i]*a33[i] - a13[i]*a32[i])/detA
+        b13[i] = +(a12[i]*a23[i] - a13[i]*a22[i])/detA
+        b21[i] = +(a31[i]*a23[i] - a21[i]*a33[i])/detA
+        b22[i] = -(a31[i]*a13[i] - a11[i]*a33[i])/detA
+        b23[i] = +(a21[i]*a13[i] - a11[i]*a23[i])/detA
+        b31[i] = -(a31[i]*a22[i] - a21[i]*a32[i])/detA
+        b32[i] = +(a31[i]*a12[i] - a11[i]*a32[i])/detA
+        b33[i] = -(a21[i]*a12[i] - a11[i]*a22[i])/detA
+
+
+def volTetra(AD, BD, CD, workspace=None):
+    AD, BD, CD = np.broadcast_arrays(AD, BD, CD)
+    shape = AD.shape[:-1]
+    V = np.empty(shape, dtype=_asFloat(AD, BD, CD)[0].dtype)
+    with _launch:
+        _volTetra(
+            *[np.ascontiguousarray(X.reshape(-1, 3)) for X in (AD, BD, CD)],
+            V=V.reshape(-1)
+        )
+    return V
+
+
+@numba.njit(parallel=True, cache=True)
+def _volTetra(AD, BD, CD, V):
+    for i in numba.prange(V.size):
+        V[i] = (
+            (BD[i, 0]*CD[i, 1] - BD[i, 1]*CD[i, 0])*AD[i, 2] -
+            (BD[i, 0]*CD[i, 2] - BD[i, 2]*CD[i, 0])*AD[i, 1] +
+            (BD[i, 1]*CD[i, 2] - BD[i, 2]*CD[i, 1])*AD[i, 0]
+        ) / 6
+
+
+def faceGeometry(
+    xyz, corners, average, normalizeNormals, chunkSize, normals, area,
+    edgeLengths, workspace=None
+):
+    # xyz, the indices and the outputs are used in place, so no memory is
+    # needed on top of the outputs and chunkSize has no use
+    N = normals[:, np.newaxis] if average else normals
+    A, B, C, D = [ind.astype(np.result_type(*corners), copy=False)
+                  for ind in corners]
+    with _launch:
+        _faceGeometry(
+            xyz, A, B, C, D, average, normalizeNormals, N, area, edgeLengths
+        )
+
+
+@numba.njit(parallel=True, cache=True)
+def _faceGeometry(xyz, A, B, C, D, average, normalizeNormals, normals, area,
+                  edgeLengths):
+    for f in numba.prange(A.size):
+        corners = (A[f], B[f], C[f], D[f])
+        e = np.empty((4, 3))
+        nc = np.empty((4, 3))
+        for c in range(4):
+            for i in range(3):
+                e[c, i] = (
+                    xyz[corners[(c + 1) % 4], i] - xyz[corners[c], i]
+                )
+            edgeLengths[f, c] = np.sqrt(
+                e[c, 0]*e[c, 0] + e[c, 1]*e[c, 1] + e[c, 2]*e[c, 2]
+            )
+
+        # nA = AB x DA, nB = BC x AB, nC = CD x BC, nD = DA x CD
+        a = 0.
+        for c in range(4):
+            p = (c + 3) % 4
+            for i in range(3):
+                j, k = (i + 1) % 3, (i + 2) % 3
+                nc[c, i] = e[c, j]*e[p, k] - e[c, k]*e[p, j]
+            length = np.sqrt(
+                nc[c, 0]*nc[c, 0] + nc[c, 1]*nc[c, 1] + nc[c, 2]*nc[c, 2]
+            )
+            a += length
+            if not average:
+                for i in range(3):
+                    if normalizeNormals:
+                        normals[f, c, i] = nc[c, i] / length
+                    else:
+                        normals[f, c, i] = nc[c, i]
+        area[f] = a / 4
+
+        if average:
+            for i in range(3):
+                normals[f, 0, i] = (
+                    nc[0, i] + nc[1, i] + nc[2, i] + nc[3, i]
+                ) / 4
+            length = np.sqrt(
+                normals[f, 0, 0]*normals[f, 0, 0] +
+                normals[f, 0, 1]*normals[f, 0, 1] +
+                normals[f, 0, 2]*normals[f, 0, 2]
+            )
+            for i in range(3):
+                normals[f, 0, i] /= length
@@ -0,0 +1,248 @@
+"""Opt-in instrumentation of the public matrixutils functions
+
+When enabled, the public functions exported by matrixutils are wrapped to
+record their number of calls, cumulative and maximum wall time, the size
+of their inputs and the bytes they allocate. When disabled the original
+functions are restored, so there is no overhead at all::
+
+    with matrixutils.profiling():
+        run_inversion()
+    print(matrixutils.profileReport())
+
+Profiling can also be switched on for a whole process with the
+``MATRIXUTILS_PROFILE`` environment variable, set to ``1`` to estimate the
+allocated bytes from the size of the outputs, or to ``tracemalloc`` to
+measure them with :mod:`tracemalloc`.
+
+Only calls made through the ``matrixutils`` namespace or the defining
+submodule are seen, so enable profiling before doing
+``from matrixutils import ...``.
+"""
+from __future__ import print_function, division
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import scipy.sparse as sp
+
+_stats = {}
+_originals = {}
+_lock = threading.Lock()
+_local = threading.local()
+_memory = [None]
+_tracing = [False]  # tracemalloc was started here
+
+
+def enableProfiling(memory='estimate'):
+    """Wraps the public matrixutils functions to record their statistics
+
+    :param str memory: how to measure the allocated bytes, 'estimate'
+        uses the size of the outputs, 'tracemalloc' uses tracemalloc
+        (slower, but sees temporaries) and None skips it
+
+    With 'tracemalloc', tracing is started if it is off, and the peak is
+    reset at every call to measure the peak allocation of the call. A
+    trace started by the caller is left running and its peak untouched,
+    the net allocation of each call is recorded instead.
+    """
+    assert memory in ('estimate', 'tracemalloc', None), (
+        "memory must be 'estimate', 'tracemalloc' or None"
+    )
+    disableProfiling()
+    _memory[0] = memory
+    if memory == 'tracemalloc':
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing[0] = True
+
+    for name, func, modules in _publicFunctions():
+        wrapped = _wrap(name, func)
+        for module in modules:
+            _originals[(module, name)] = func
+            setattr(module, name, wrapped)
+
+
+def disableProfiling():
+    """Restores the original functions, the statistics are kept"""
+    for (module, name), func in _originals.items():
+        setattr(module, name, func)
+    _originals.clear()
+    if _tracing[0]:
+        import tracemalloc
+        tracemalloc.stop()
+        _tracing[0] = False
+    _memory[0] = None
+
+
+def isProfiling():
+    """True if the public functions are currently instrumented"""
+    return len(_originals) > 0
+
+
+@contextmanager
+def profiling(memory='estimate', reset=True):
+    """Context manager enabling profiling within its block
+
+    :param str memory: see :func:`enableProfiling`
+    :param bool reset: clear the statistics on entry
+    """
+    if reset:
+        resetProfile()
+    enableProfiling(memory=memory)
+    try:
+        yield
+    finally:
+        disableProfiling()
+
+
+def resetProfile():
+    """Clears the recorded statistics"""
+    with _lock:
+        _stats.clear()
+
+
+def getProfile():
+    """The recorded statistics
+
+    :rtype: dict
+    :return: {function name: {'calls', 'totalTime', 'maxTime',
+        'inputBytes', 'maxInputBytes', 'allocatedBytes',
+        'maxAllocatedBytes'}}
+    """
+    with _lock:
+        return dict((name, dict(stats)) for name, stats in _stats.items())
+
+
+def profileReport(sort='totalTime'):
+    """Pretty printed table of the recorded statistics
+
+    :param str sort: statistic to sort the functions by
+    :rtype: str
+    """
+    stats = getProfile()
+    rows = sorted(stats.items(), key=lambda item: -item[1][sort])
+    lines = [
+        '{0:<28s} {1:>8s} {2:>11s} {3:>11s} {4:>11s} {5:>11s}'.format(
+            'function', 'calls', 'total (s)', 'max (s)', 'input', 'allocated'
+        )
+    ]
+    lines += ['-' * len(lines[0])]
+    for name, s in rows:
+        lines += [
+            '{0:<28s} {1:>8d} {2:>11.4f} {3:>11.4f} {4:>11s} {5:>11s}'.format(
+                name, s['calls'], s['totalTime'], s['maxTime'],
+                _human(s['inputBytes']), _human(s['allocatedBytes'])
+            )
+        ]
+    return '\n'.join(lines)
+
+
+def _publicFunctions():
+    """(name, function, modules holding it) of the exported functions"""
+    package = sys.modules['matrixutils']
+    names = getattr(package, '__all__', None) or [
+        name for name in dir(package) if not name.startswith('_')
+    ]
+    for name in names:
+        func = getattr(package, name)
+        if not inspect.isfunction(func):
+            continue
+        module = sys.modules.get(func.__module__)
+        if module is None or module.__name__ == __name__:
+            continue
+        modules = [package]
+        if getattr(module, name, None) is func:
+            modules += [module]
+        yield name, func, modules
+
+
+def _wrap(name, func):
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        memory = _memory[0]
+        depth = getattr(_local, 'depth', 0)
+        _local.depth = depth + 1
+        if memory == 'tracemalloc':
+            import tracemalloc
+            # the peak is only reset in a trace started here
+            ownPeak = depth == 0 and _tracing[0] and hasattr(
+                tracemalloc, 'reset_peak'
+            )
+            if ownPeak:
+                tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            out = func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _local.depth = depth
+
+        if memory == 'tracemalloc':
+            current, peak = tracemalloc.get_traced_memory()
+            allocated = (peak if ownPeak else current) - before
+        elif memory == 'estimate':
+            allocated = _nbytes(out)
+        else:
+            allocated = 0
+        inputBytes = sum(_nbytes(a) for a in args)
+        inputBytes += sum(_nbytes(a) for a in kwargs.values())
+        _record(name, elapsed, inputBytes, max(allocated, 0))
+        return out
+
+    return wrapper
+
+
+def _record(name, elapsed, inputBytes, allocated):
+    with _lock:
+        s = _stats.setdefault(name, {
+            'calls': 0, 'totalTime': 0., 'maxTime': 0.,
+            'inputBytes': 0, 'maxInputBytes': 0,
+            'allocatedBytes': 0, 'maxAllocatedBytes': 0,
+        })
+        s['calls'] += 1
+        s['totalTime'] += elapsed
+        s['maxTime'] = max(s['maxTime'], elapsed)
+        s['inputBytes'] += inputBytes
+        s['maxInputBytes'] = max(s['maxInputBytes'], inputBytes)
+        s['allocatedBytes'] += allocated
+        s['maxAllocatedBytes'] = max(s['maxAllocatedBytes'], allocated)
+
+
+def _nbytes(value):
+    """Bytes held by arrays, sparse matrices and tuples or lists of them"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if sp.issparse(value):
+        return sum(
+            getattr(value, name).nbytes for name in
+            ('data', 'indices', 'indptr', 'offsets', 'row', 'col')
+            if hasattr(value, name)
+        )
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+def _human(nbytes):
+    for unit in ['B', 'kB', 'MB', 'GB']:
+        if nbytes < 1024 or unit == 'GB':
+            return '{0:.1f} {1!s}'.format(nbytes, unit)
+        nbytes /= 1024.
+
+
+def _enableFromEnvironment():
+    """Enables profiling when MATRIXUTILS_PROFILE is set"""
+    value = os.environ.get('MATRIXUTILS_PROFILE', '').strip().lower()
+    if value in ('', '0', 'false', 'no', 'off'):
+        return
+    enableProfiling(
+        memory='tracemalloc' if value == 'tracemalloc' else 'estimate'
+    )
@@ -0,0 +1,173 @@
+"""Sharing operators between processes through shared memory
+
+An operator, an array or a tuple of them (e.g. the output of
+faceGeometry) is copied once into a :mod:`multiprocessing.shared_memory`
+segment. The returned handle pickles to a few hundred bytes and
+reattaches zero-copy in the workers::
+
+    with shareOperator(interpmat(locs, x, y, z)) as P:
+        with ProcessPoolExecutor() as pool:
+            pool.map(simulate, [P] * nTasks)
+
+    def simulate(P):
+        P = P.attach()  # read-only view of the shared segment
+        ...
+
+The segment is owned by the publishing process, which unlinks it when the
+handle is closed or its ``with`` block ends.
+"""
+from __future__ import print_function, division
+import sys
+
+import numpy as np
+
+from .ioutils import _aligned, _operatorComponents, _operatorFromComponents
+
+# segments attached in this process, name -> (SharedMemory, operator)
+_attached = {}
+
+
+def shareOperator(A):
+    """Copies an operator into a new shared memory segment
+
+    :param A: scipy.sparse matrix, numpy.ndarray or a tuple of them
+    :rtype: SharedOperator
+    :return: owning handle, close it (or use it in a with block) to free
+        the segment
+    """
+    from multiprocessing import shared_memory
+
+    isTuple = isinstance(A, (tuple, list))
+    operators = A if isTuple else [A]
+    headers, arrays, size = [], [], 0
+    for op in operators:
+        header, components = _operatorComponents(op)
+        for entry, array in zip(header['arrays'], components):
+            size = _aligned(size)
+            entry['offset'] = size
+            size += array.nbytes
+        headers += [header]
+        arrays += [components]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for header, components in zip(headers, arrays):
+        for entry, array in zip(header['arrays'], components):
+            np.ndarray(
+                array.shape, dtype=array.dtype, buffer=shm.buf,
+                offset=entry['offset']
+            )[...] = array
+    return SharedOperator(shm.name, headers, isTuple, shm=shm)
+
+
+class SharedOperator(object):
+    """Handle to an operator published with :func:`shareOperator`
+
+    Only the publishing process owns the segment; unpickled copies of the
+    handle just attach to it.
+    """
+
+    def __init__(self, name, headers, isTuple, shm=None):
+        self.name = name
+        self._headers = headers
+        self._isTuple = isTuple
+        self._shm = shm
+
+    @property
+    def owner(self):
+        """True in the process that published the operator"""
+        return self._shm is not None
+
+    def attach(self):
+        """The operator, wrapping the shared segment without copies
+
+        The components are read-only. Attaching is cached per process, so
+        repeated calls from the tasks of a worker are free.
+        """
+        if self.name in _attached:
+            return _attached[self.name][1]
+        shm = self._shm if self.owner else _open(self.name)
+        operators = []
+        for header in self._headers:
+            arrays = []
+            for entry in header['arrays']:
+                array = np.ndarray(
+                    entry['shape'], dtype=np.dtype(entry['dtype']),
+                    buffer=shm.buf, offset=entry['offset']
+                )
+                array.flags.writeable = False
+                arrays += [array]
+            operators += [_operatorFromComponents(header, arrays)]
+        op = tuple(operators) if self._isTuple else operators[0]
+        _attached[self.name] = (shm, op)
+        return op
+
+    def detach(self):
+        """Drops this process' mapping of the segment
+
+        Operators returned by attach must not be used afterwards.
+        """
+        shm, _ = _attached.pop(self.name, (self._shm, None))
+        if shm is not None and shm is not self._shm:
+            _close(shm)
+
+    def close(self):
+        """Detaches and, in the owning process, unlinks the segment"""
+        self.detach()
+        if self.owner:
+            shm, self._shm = self._shm, None
+            shm.unlink()
+            _close(shm)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        return {
+            'name': self.name, 'headers': self._headers,
+            'isTuple': self._isTuple
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state['name'], state['headers'], state['isTuple'])
+
+    def __repr__(self):
+        return 'SharedOperator({0!r}, owner={1!r})'.format(
+            self.name, self.owner
+        )
+
+
+def _open(name):
+    """Attaches to an existing segment without tracking it
+
+    The resource tracker would otherwise unlink the segment when the first
+    worker exits (or warn about a leak), although it belongs to the
+    publishing process. Registering and unregistering again is not an
+    option either, forked workers share the tracker of the publisher.
+    """
+    from multiprocessing import shared_memory
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+
+    def skip(name, rtype):
+        if rtype != 'shared_memory':
+            register(name, rtype)
+
+    resource_tracker.register = skip
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _close(shm):
+    try:
+        shm.close()
+    except BufferError:
+        # arrays still reference the mapping, it is released with them
+        pass
@@ -0,0 +1,168 @@
+"""Machine-specific tuning of the chunk sizes and worker counts
+
+:func:`autotune` times the chunked and parallel kernels over a grid of
+settings on the current machine and writes the fastest to the tuning
+file (see :func:`matrixutils.configutils.tuningPath`), under a key
+identifying the machine, so one file can hold the profiles of several
+node types. The profile is loaded automatically and used whenever the
+chunk size or workers are neither passed nor set with
+:func:`matrixutils.config`, except by :func:`matrixutils.interpmat`, which
+only runs its tuned workers with workers='auto'::
+
+    python -c "import matrixutils; matrixutils.autotune(verbose=True)"
+"""
+from __future__ import print_function, division
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+
+from .configutils import loadTuning, machine, tuningPath
+
+_chunkSizes = [2**k for k in range(10, 19, 2)]
+
+
+def autotune(path=None, size=2**18, chunkSizes=None, workers=None,
+             kernels=None, repeat=3, verbose=False):
+    """Times the kernels and saves the fastest settings of this machine
+
+    :param str path: tuning file, :func:`tuningPath` by default
+    :param int size: number of items (points, faces or cells) per timing
+    :param list chunkSizes: chunk sizes tried, 2**10 to 2**18 by default
+    :param list workers: worker counts tried, powers of 2 up to the number
+        of cpus by default
+    :param list kernels: kernels to tune, all of them by default
+    :param int repeat: timings per setting, the fastest is kept
+    :param bool verbose: print the timings
+    :rtype: dict
+    :return: {kernel: {'chunkSize': ..., 'workers': ..., 'time': ...}}
+    """
+    if chunkSizes is None:
+        chunkSizes = _chunkSizes
+    if workers is None:
+        cpus = os.cpu_count() or 1
+        workers = [2**k for k in range(cpus.bit_length()) if 2**k <= cpus]
+    if kernels is None:
+        kernels = sorted(_problems)
+
+    results = {}
+    for kernel in kernels:
+        run, tuned = _problems[kernel](size)
+        best = None
+        for values in itertools.product(*[
+            chunkSizes if name == 'chunkSize' else workers for name in tuned
+        ]):
+            settings = dict(zip(tuned, values))
+            elapsed = _time(run, settings, repeat)
+            if verbose:
+                print('{0:<24s} {1!s:<36s} {2:.4f} s'.format(
+                    kernel, settings, elapsed
+                ))
+            if best is None or elapsed < best['time']:
+                best = dict(settings, time=elapsed)
+        results[kernel] = best
+
+    _save(path or tuningPath(), results)
+    loadTuning(path)
+    return results
+
+
+def _time(run, settings, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(**settings)
+        times += [time.perf_counter() - start]
+    return min(times)
+
+
+def _save(path, results):
+    """Updates the profile of this machine in the tuning file"""
+    try:
+        with open(path) as f:
+            profiles = json.load(f)
+    except (IOError, OSError, ValueError):
+        profiles = {}
+    profiles[machine()] = results
+
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmp = '{0!s}.{1:d}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(profiles, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _mesh(size):
+    """Nodes and nodal grid size of a warped 3D mesh of about size cells"""
+    from .matutils import ndgrid
+    n = max(2, int(round(size ** (1. / 3))))
+    x = np.linspace(0, 1, n + 1)
+    xyz = ndgrid(x, x, x)
+    xyz[:, 0] += 0.05 * np.sin(3 * xyz[:, 1])
+    xyz[:, 1] += 0.1 * xyz[:, 0]**2
+    return xyz, np.array([n + 1] * 3)
+
+
+def _faceGeometry(size):
+    from .curvutils import faceGeometry, indexCube
+    xyz, gridSize = _mesh(size // 3)
+    corners = indexCube('ABCD', gridSize)
+
+    def run(chunkSize):
+        faceGeometry(xyz, *corners, chunkSize=chunkSize)
+    return run, ['chunkSize']
+
+
+def _volHex(size):
+    from .curvutils import volHex
+    xyz, gridSize = _mesh(size)
+
+    def run(chunkSize, workers):
+        volHex(xyz, gridSize, chunkSize=chunkSize, workers=workers)
+    return run, ['chunkSize', 'workers']
+
+
+def _rotatePointsFromNormals(size):
+    from .coordutils import rotatePointsFromNormals
+    xyz = np.random.rand(size, 3)
+    n0, n1 = np.r_[1., 0., 0.], np.r_[0., 0.6, 0.8]
+
+    def run(chunkSize):
+        rotatePointsFromNormals(xyz, n0, n1, chunkSize=chunkSize)
+    return run, ['chunkSize']
+
+
+def _cellLocator(size):
+    from .interputils import CellLocator
+    xyz, gridSize = _mesh(size)
+    locator = CellLocator(xyz, gridSize)
+    locs = 0.05 + 0.9 * np.random.rand(size // 4, 3)
+
+    def run(chunkSize):
+        locator.chunkSize = chunkSize
+        locator.locate(locs)
+    return run, ['chunkSize']
+
+
+def _interpmat(size):
+    from .interputils import interpmat
+    x = np.linspace(0, 1, 101)
+    locs = np.random.rand(size, 3)
+
+    def run(workers):
+        interpmat(locs, x, x, x, workers=workers)
+    return run, ['workers']
+
+
+# kernel -> builder of (timed function, names of its tuned settings)
+_problems = {
+    'faceGeometry': _faceGeometry,
+    'volHex': _volHex,
+    'rotatePointsFromNormals': _rotatePointsFromNormals,
+    'CellLocator': _cellLocator,
+    'interpmat': _interpmat,
+}
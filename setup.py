@@ -23,6 +23,8 @@ CLASSIFIERS = [
     'Intended Audience :: Science/Research',
     'License :: OSI Approved :: MIT License',
     'Programming Language :: Python',
+    'Programming Language :: Python :: 3',
+    'Programming Language :: Python :: 3 :: Only',
     'Topic :: Scientific/Engineering',
     'Topic :: Scientific/Engineering :: Mathematics',
     'Topic :: Scientific/Engineering :: Physics',
@@ -61,6 +63,9 @@ setup(
         'matplotlib',
         'properties>=0.3.6b0',
     ],
+    extras_require={
+        'numba': ['numba'],
+    },
     author="Open Geophysics Developers",
     author_email="admin@simpeg.xyz",
     description="Utilities for working with matrices as linear operators",
@@ -70,6 +75,7 @@ setup(
     url="http://simpeg.xyz/",
     download_url="https://github.com/opengeophysics/matrixutils",
     classifiers=CLASSIFIERS,
+    python_requires='>=3.8',
     platforms=["Windows", "Linux", "Solaris", "Mac OS-X", "Unix"],
     use_2to3=False,
     setup_requires=['numpy'],
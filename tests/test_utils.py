@@ -1,13 +1,34 @@
 from __future__ import print_function
+import asyncio
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import tracemalloc
 import unittest
+import warnings
+from concurrent.futures import (
+    CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+)
+from operator import methodcaller
 import numpy as np
 import scipy.sparse as sp
 from matrixutils import (
     sdiag, sub2ind, ndgrid, mkvc,
     inv2X2BlockDiagonal, inv3X3BlockDiagonal,
     indexCube, ind2sub, asArray_N_x_Dim, Zero, Identity,
-    meshTensor
+    meshTensor, GridIndexer, faceInfo, faceGeometry, volTetra, volHex,
+    CurvilinearGeometry, CellLocator, interpmatCurv,
+    rotationMatrixFromNormals, rotationMatricesFromNormals,
+    rotatePointsFromNormals, TensorSpec, trustedMode, isTrusted
 )
+import matrixutils
+from matrixutils import backendutils, configutils, curvutils, interputils
+from matrixutils import profiling, getProfile, profileReport
 
 TOL = 1e-8
 
@@ -76,6 +97,35 @@ class TestSequenceFunctions(unittest.TestCase):
         assert np.allclose(ind2sub(x.shape, [0, 4, 5, 9])[0], [0, 4, 0, 4])
         assert np.allclose(ind2sub(x.shape, [0, 4, 5, 9])[1], [0, 0, 1, 1])
 
+    def test_GridIndexer(self):
+        G = GridIndexer((5, 2))
+        self.assertEqual(G.dtype, np.int32)
+        assert np.all(G.sub2ind([4, 1]) == [9])
+        assert np.all(
+            G.sub2ind([[0, 0], [4, 0], [0, 1], [4, 1]]) == [0, 4, 5, 9]
+        )
+        assert np.all(
+            G.sub2ind([[0, 4, 0, 4], [0, 0, 1, 1]], axis=0) == [0, 4, 5, 9]
+        )
+        assert np.all(G.ind2sub([0, 4, 5, 9])[0] == [0, 4, 0, 4])
+        assert np.all(G.ind2sub([0, 4, 5, 9])[1] == [0, 0, 1, 1])
+
+        shape = (4, 3, 5)
+        G = GridIndexer(shape)
+        subs = np.c_[
+            np.random.randint(0, 4, 50),
+            np.random.randint(0, 3, 50),
+            np.random.randint(0, 5, 50)
+        ]
+        inds = G.sub2ind(subs)
+        assert np.all(inds == sub2ind(shape, subs))
+        assert np.all(G.ind2sub(inds, axis=1) == subs)
+        assert np.all(G.ind2sub(inds, axis=0) == subs.T)
+
+        self.assertRaises(ValueError, lambda: G.sub2ind([[4, 0, 0]]))
+        self.assertRaises(ValueError, lambda: G.ind2sub([60]))
+        self.assertEqual(GridIndexer((2**16, 2**16)).dtype, np.int64)
+
     def test_indexCube_2D(self):
         nN = np.array([3, 3])
         assert np.allclose(indexCube('A', nN), np.array([0, 1, 3, 4]))
@@ -110,6 +160,114 @@ class TestSequenceFunctions(unittest.TestCase):
             indexCube('H', nN), np.array([10, 11, 13, 14, 19, 20, 22, 23])
         )
 
+    def test_indexCube_stacked(self):
+        for nN, nodes in [
+            (np.array([3, 4]), 'ABCD'),
+            (np.array([3, 4, 5]), 'ABCDEFGH'),
+            (np.array([3, 4, 5]), 'HCA'),
+        ]:
+            stacked = indexCube(nodes, nN, stacked=True)
+            self.assertEqual(stacked.shape, (np.prod(nN - 1), len(nodes)))
+            for col, inds in zip(stacked.T, indexCube(nodes, nN)):
+                assert np.all(col == inds)
+            self.assertTrue(indexCube(nodes, nN, stacked=True) is stacked)
+
+        nN = np.array([3, 4, 5])
+        n = np.array([3, 3, 4])
+        stacked = indexCube('AEFB', nN, n, stacked=True)
+        for col, inds in zip(stacked.T, indexCube('AEFB', nN, n)):
+            assert np.all(col == inds)
+
+        # the cached array follows the configured index dtype
+        self.assertEqual(indexCube('AB', nN, stacked=True).dtype, np.int32)
+        with matrixutils.config(indexDtype=np.int64):
+            self.assertEqual(
+                indexCube('AB', nN, stacked=True).dtype, np.int64
+            )
+
+    def test_faceInfo(self):
+        xyz = np.array([
+            [0., 0., 0.], [2., 0., 0.], [2., 1., 0.], [0., 1., 0.],
+            [0., 0., 1.], [0., 3., 1.], [0., 3., 2.], [0., 0., 2.],
+        ])
+        A, B, C, D = np.r_[0, 4], np.r_[1, 5], np.r_[2, 6], np.r_[3, 7]
+
+        N, area, edges = faceInfo(xyz, A, B, C, D, returnEdgeLengths=True)
+        assert np.allclose(np.abs(N), [[0, 0, 1], [1, 0, 0]])
+        assert np.allclose(area, [2, 3])
+        assert np.allclose(edges, [[2, 1, 2, 1], [3, 1, 3, 1]])
+
+        N, area = faceInfo(
+            xyz, A, B, C, D, average=False, normalizeNormals=False
+        )
+        self.assertEqual(len(N), 4)
+        for n in N:
+            assert np.allclose(np.abs(n), [[0, 0, 2], [3, 0, 0]])
+
+        normals = np.empty((2, 4, 3))
+        out = faceGeometry(
+            xyz, A, B, C, D, average=False, chunkSize=1, normals=normals
+        )
+        self.assertTrue(out[0] is normals)
+        assert np.allclose(np.abs(normals[:, 2]), [[0, 0, 1], [1, 0, 0]])
+        assert np.allclose(out[1], area)
+
+    def test_volHex(self):
+        nN = np.array([4, 3, 5])
+        xyz = ndgrid(np.r_[0., 1, 3, 4], np.r_[0., 2, 3], np.r_[0., 1, 2, 4, 5])
+        assert np.allclose(volHex(xyz, nN).sum(), 4 * 3 * 5)
+
+        xyz = xyz + 0.1 * np.random.rand(*xyz.shape)
+        A, B, C, D, E, F, G, H = indexCube('ABCDEFGH', nN)
+        vol = (
+            volTetra(xyz, A, B, D, E) + volTetra(xyz, B, E, F, G) +
+            volTetra(xyz, B, D, E, G) + volTetra(xyz, B, C, D, G) +
+            volTetra(xyz, D, E, G, H) + volTetra(xyz, A, F, B, C) +
+            volTetra(xyz, A, E, F, H) + volTetra(xyz, A, H, F, C) +
+            volTetra(xyz, C, H, D, A) + volTetra(xyz, C, G, H, F)
+        ) / 2
+        assert np.allclose(volHex(xyz, nN), vol)
+        assert np.allclose(volHex(xyz, nN, chunkSize=5, workers=2), vol)
+
+    def test_rotationMatricesFromNormals(self):
+        v0 = np.random.randn(20, 3)
+        v1 = np.random.randn(20, 3)
+        R = rotationMatricesFromNormals(v0, v1)
+        self.assertEqual(R.shape, (20, 3, 3))
+        for i in range(20):
+            assert np.allclose(R[i], rotationMatrixFromNormals(v0[i], v1[i]))
+
+        v0 = np.array([[0., 0., 1.], [0., 0., 1.], [1., 2., 3.]])
+        v1 = np.array([[0., 0., 2.], [0., 0., -1.], [-2., -4., -6.]])
+        out = np.empty((3, 3, 3))
+        R = rotationMatricesFromNormals(v0, v1, out=out)
+        self.assertTrue(R is out)
+        assert np.allclose(R[0], np.eye(3))
+        n0 = v0 / np.linalg.norm(v0, axis=1)[:, np.newaxis]
+        rotated = np.einsum('nij,nj->ni', R, n0)
+        assert np.allclose(rotated, [n0[0], -n0[1], -n0[2]])
+        for r in R:
+            assert np.allclose(r.dot(r.T), np.eye(3))
+            assert np.allclose(np.linalg.det(r), 1)
+
+        R = rotationMatricesFromNormals(np.r_[0., 0., 1.], v1)
+        self.assertEqual(R.shape, (3, 3, 3))
+
+    def test_rotatePointsFromNormals(self):
+        XYZ = np.random.rand(50, 3)
+        n0, n1, x0 = np.r_[0., 0., 1.], np.r_[1., 0., 0.], np.r_[1., 2., 3.]
+        R = rotationMatrixFromNormals(n0, n1)
+        true = (XYZ - x0).dot(R.T) + x0
+
+        assert np.allclose(rotatePointsFromNormals(XYZ, n0, n1, x0), true)
+        assert np.allclose(
+            rotatePointsFromNormals(XYZ, n0, n1, x0, chunkSize=7), true
+        )
+
+        out = rotatePointsFromNormals(XYZ, n0, n1, x0, out=XYZ, chunkSize=8)
+        self.assertTrue(out is XYZ)
+        assert np.allclose(XYZ, true)
+
     def test_invXXXBlockDiagonal(self):
         a = [np.random.rand(5, 1) for i in range(4)]
 
@@ -132,6 +290,23 @@ class TestSequenceFunctions(unittest.TestCase):
 
         self.assertTrue(np.linalg.norm(Z3.todense().ravel(), 2) < TOL)
 
+    def test_invXXXBlockDiagonal_complex(self):
+        a = np.random.rand(9, 5) + 1j * np.random.rand(9, 5)
+        a += 2 * np.eye(3).reshape(9, 1)
+        A = np.linalg.inv(np.stack(a, axis=-1).reshape(-1, 3, 3))
+        for floatDtype, dtype in [(None, np.complex128),
+                                  (np.float32, np.complex64)]:
+            with matrixutils.config(floatDtype=floatDtype):
+                b = inv3X3BlockDiagonal(*a, returnMatrix=False)
+                B = inv2X2BlockDiagonal(*a[[0, 1, 3, 4]],
+                                        workspace=matrixutils.Workspace())
+            self.assertEqual(b[0].dtype, dtype)
+            self.assertEqual(B.dtype, dtype)
+            assert np.allclose(
+                np.stack(b, axis=-1).reshape(-1, 3, 3), A,
+                rtol=1e-5 if dtype == np.complex64 else 1e-12
+            )
+
     def test_asArray_N_x_Dim(self):
 
         true = np.array([[1, 2, 3]])
@@ -154,6 +329,21 @@ class TestSequenceFunctions(unittest.TestCase):
         self.assertTrue(np.all(true == listArray))
         self.assertTrue(true.shape == listArray.shape)
 
+        pts = np.random.rand(5, 3)
+        self.assertTrue(np.shares_memory(asArray_N_x_Dim(pts, 3), pts))
+        self.assertTrue(
+            np.shares_memory(asArray_N_x_Dim(memoryview(pts), 3), pts)
+        )
+        out = asArray_N_x_Dim(pts[:, ::2], 2, dtype=np.float32, contiguous=True)
+        self.assertEqual(out.dtype, np.float32)
+        self.assertTrue(out.flags.c_contiguous)
+
+        self.assertRaises(AssertionError, lambda: asArray_N_x_Dim(pts, 2))
+        with trustedMode():
+            self.assertTrue(isTrusted())
+            self.assertEqual(asArray_N_x_Dim(pts, 2).shape, (5, 3))
+        self.assertFalse(isTrusted())
+
     def test_mesh_tensor(self):
 
         cases = [
@@ -183,6 +373,810 @@ class TestSequenceFunctions(unittest.TestCase):
         with self.assertRaises(ValueError):
             meshTensor([(2, 1), '?', (3, 5)])
 
+    def test_tensor_spec(self):
+        value = [(10., 5, -1.3), (10., 20), 5., (10., 5, 1.3)]
+        h, spec = meshTensor(value, returnSpec=True)
+        assert np.allclose(spec.h, h)
+        self.assertEqual(spec.nC, 31)
+        assert np.allclose(spec.length, h.sum())
+
+        spec = TensorSpec(value, x0=-100.)
+        nodes = -100. + np.r_[0., np.cumsum(h)]
+        assert np.allclose(spec.nodes, nodes)
+        assert np.allclose(spec.centers, nodes[:-1] + h / 2.)
+        assert np.allclose(spec.nodeAt([0, 3, 12, 31]), nodes[[0, 3, 12, 31]])
+
+        x = np.r_[np.random.uniform(nodes[0], nodes[-1], 200), spec.nodes]
+        cells = np.minimum(
+            np.searchsorted(spec.nodes, x, side='right') - 1, spec.nC - 1
+        )
+        assert np.all(spec.locate(x) == cells)
+        assert np.all(spec.locate([nodes[0] - 1., nodes[-1] + 1.]) == -1)
+
+
+class TestStencils(unittest.TestCase):
+
+    def test_stencils(self):
+        shape = (4, 1, 3)
+        for apply, op, change in [
+            (matrixutils.applyDdx, matrixutils.ddx, 1),
+            (matrixutils.applyAv, matrixutils.av, 1),
+            (matrixutils.applyAvExtrap, matrixutils.av_extrap, 0),
+        ]:
+            for axis in range(3):
+                n = shape[axis]
+                ops = [matrixutils.speye(m) for m in shape]
+                ops[axis] = op(n)
+                M = matrixutils.kron3(ops[2], ops[1], ops[0])
+                fShape = list(shape)
+                fShape[axis] += change
+                F = np.random.randn(*fShape)
+                self.assertEqual(
+                    list(mkvc(apply(F, axis))), list(M * mkvc(F))
+                )
+                G = np.random.randn(*apply(F, axis).shape)
+                out = np.empty(F.shape)
+                self.assertTrue(apply(G, axis, transpose=True, out=out) is out)
+                self.assertEqual(list(mkvc(out)), list(M.T * mkvc(G)))
+
+        f = np.arange(5.)
+        assert np.all(matrixutils.applyDdx(f, -1) == 1)
+        self.assertEqual(matrixutils.applyAvExtrap(f.astype(np.float32)).dtype,
+                         np.float64)
+
+    def test_banded(self):
+        n = 5
+        with matrixutils.config(sparseFormat='dia'):
+            ops = [matrixutils.ddx(n), matrixutils.av(n),
+                   matrixutils.av_extrap(n), matrixutils.speye(n),
+                   sdiag(np.random.rand(n))]
+            for A in ops:
+                self.assertEqual(A.format, 'dia')
+            self.assertEqual(
+                abs(ops[2] - matrixutils.av_extrap(n, format='csr')).max(), 0
+            )
+
+            I = matrixutils.speye(3)
+            D = matrixutils.kron3(ops[0], I, I)
+            self.assertEqual(D.format, 'dia')
+            self.assertEqual(list(D.offsets), [0, 9])
+            # kron(I, ddx) has a diagonal per block, stays CSR
+            self.assertEqual(matrixutils.kron3(I, I, ops[0]).format, 'csr')
+
+            for A, B in [(ops[0], ops[2]), (ops[2], ops[0]),
+                         (ops[1].T, ops[4]), (ops[1], ops[2])]:
+                C = matrixutils.spmatmul(A, B)
+                self.assertEqual(C.format, 'dia')
+                assert np.allclose(C.toarray(), A.toarray().dot(B.toarray()))
+        self.assertEqual(matrixutils.ddx(n).format, 'csr')
+        self.assertEqual(
+            matrixutils.spmatmul(ops[0], ops[2]).format, 'csr'
+        )
+        with self.assertRaises(AssertionError):
+            matrixutils.setConfig(sparseFormat='lil')
+
+
+class TestWorkspace(unittest.TestCase):
+
+    def test_workspace(self):
+        workspace = matrixutils.Workspace()
+        a = workspace.get('a', (10, 3))
+        self.assertEqual(a.shape, (10, 3))
+        self.assertEqual(workspace.nbytes, 240)
+        b = workspace.get('a', 5, dtype=np.int32)
+        self.assertEqual(b.dtype, np.int32)
+        assert np.shares_memory(a, b)
+        self.assertEqual(workspace.allocations, 1)
+        workspace.get('a', 100)
+        self.assertEqual(workspace.highWater, 800)
+        workspace.clear()
+        self.assertEqual((workspace.nbytes, workspace.highWater), (0, 800))
+
+    def test_calls(self):
+        x = np.linspace(0, 1, 6)
+        nN = np.array([6, 6, 6])
+        xyz = ndgrid(x, x, x) + 0.01 * np.random.rand(216, 3)
+        A, B, C, D = indexCube('ABCD', nN)
+        a = np.random.rand(9, 50) + 3 * np.eye(3).reshape(9, 1)
+        n0, n1 = np.r_[1., 0., 0.], np.r_[0., 0.6, 0.8]
+
+        def calls(workspace):
+            return (
+                list(faceInfo(xyz, A, B, C, D, returnEdgeLengths=True,
+                              workspace=workspace)) +
+                faceInfo(xyz, A, B, C, D, average=False,
+                         workspace=workspace)[0] +
+                [volTetra(xyz, A, B, C, D, workspace=workspace),
+                 inv3X3BlockDiagonal(*a, workspace=workspace).toarray(),
+                 inv2X2BlockDiagonal(*a[[0, 1, 3, 4]], workspace=workspace,
+                                     returnMatrix=False)[1],
+                 rotatePointsFromNormals(xyz, n0, n1, workspace=workspace)]
+            )
+
+        workspace = matrixutils.Workspace()
+        expected = calls(None)
+        allocations = []
+        for _ in range(2):
+            for r, w in zip(expected, calls(workspace)):
+                assert np.array_equal(r, w)
+            allocations += [workspace.allocations]
+        # nothing allocated by the second round of calls
+        self.assertEqual(allocations[0], allocations[1])
+        self.assertEqual(workspace.highWater, workspace.nbytes)
+
+
+class TestCurvilinearGeometry(unittest.TestCase):
+
+    def setUp(self):
+        self.nN = np.array([4, 3, 5])
+        self.xyz = ndgrid(
+            np.r_[0., 1, 3, 4], np.r_[0., 2, 3], np.r_[0., 1, 2, 4, 5]
+        )
+        self.geom = CurvilinearGeometry(self.xyz, self.nN)
+
+    def test_counts(self):
+        geom = self.geom
+        self.assertEqual(geom.nC, 3 * 2 * 4)
+        self.assertEqual(geom.nF, 4 * 2 * 4 + 3 * 3 * 4 + 3 * 2 * 5)
+        self.assertEqual(geom.nE, 3 * 3 * 5 + 4 * 2 * 5 + 4 * 3 * 4)
+        self.assertEqual(geom.faceIndex.shape, (geom.nF, 4))
+        self.assertEqual(geom.edgeIndex.shape, (geom.nE, 2))
+
+    def test_properties(self):
+        geom = self.geom
+        assert np.allclose(geom.cellVolumes, volHex(self.xyz, self.nN))
+        assert np.allclose(geom.cellVolumes.sum(), 4 * 3 * 5)
+
+        nFx, nFy, nFz = geom.vnF
+        N = geom.faceNormals
+        assert np.allclose(N[:nFx], [1, 0, 0])
+        assert np.allclose(N[nFx:nFx+nFy], [0, 1, 0])
+        assert np.allclose(N[nFx+nFy:], [0, 0, 1])
+        assert np.allclose(geom.faceAreas[:nFx].sum(), 4 * 3 * 5)
+        assert np.allclose(geom.faceAreas[nFx+nFy:].sum(), 5 * 4 * 3)
+
+        nEx, nEy, nEz = geom.vnE
+        assert np.allclose(geom.edgeLengths[:nEx].sum(), 4 * 3 * 5)
+        assert np.allclose(geom.edgeLengths[nEx+nEy:].sum(), 5 * 4 * 3)
+
+    def test_cache(self):
+        geom = self.geom
+        self.assertEqual(geom.nbytes, 0)
+        vol = geom.cellVolumes
+        self.assertTrue(geom.cellVolumes is vol)
+        self.assertEqual(geom.memoryUsage(), {'cellVolumes': vol.nbytes})
+
+        geom.faceAreas
+        self.assertTrue('faceNormals' in geom.memoryUsage())
+        self.assertTrue('faceIndex' in geom.memoryUsage())
+
+        version = geom.version
+        geom.xyz = 2 * self.xyz
+        self.assertEqual(geom.version, version + 1)
+        self.assertEqual(list(geom.memoryUsage()), ['faceIndex'])
+        assert np.allclose(geom.cellVolumes, 8 * vol)
+
+        geom.xyz[:] = self.xyz
+        geom.touch()
+        assert np.allclose(geom.cellVolumes, vol)
+
+        geom.clearCache()
+        self.assertEqual(geom.nbytes, 0)
+
+    def test_indexCache(self):
+        # the geometry does not fill the cache of indexCube
+        matrixutils.clearIndexCubeCache()
+        for name in ['faceIndex', 'edgeIndex', 'cornerIndex']:
+            getattr(self.geom, name)
+        self.assertEqual(curvutils._indexCubeCache, {})
+        indexCube('ABCD', self.nN, stacked=True)
+        self.assertEqual(len(curvutils._indexCubeCache), 1)
+        matrixutils.clearIndexCubeCache()
+        self.assertEqual(curvutils._indexCubeCache, {})
+
+    def test_updateNodes(self):
+        geom = CurvilinearGeometry(self.xyz.copy(), self.nN)
+        vol, area = geom.cellVolumes, geom.faceAreas
+        normals, lengths = geom.faceNormals, geom.edgeLengths
+
+        inds = np.r_[0, 17, 30, 59]
+        moved = self.xyz[inds] + 0.2 * np.random.rand(4, 3)
+        geom.updateNodes(inds, moved)
+
+        self.assertTrue(geom.cellVolumes is vol)
+        self.assertTrue(geom.faceAreas is area)
+        self.assertEqual(geom.nodeCells.shape, (geom.nN, geom.nC))
+        assert np.all(geom.xyz[inds] == moved)
+
+        xyz = self.xyz.copy()
+        xyz[inds] = moved
+        full = CurvilinearGeometry(xyz, self.nN)
+        assert np.allclose(vol, full.cellVolumes)
+        assert np.allclose(area, full.faceAreas)
+        assert np.allclose(normals, full.faceNormals)
+        assert np.allclose(lengths, full.edgeLengths)
+
+
+class TestInterpmat(unittest.TestCase):
+
+    def test_interpmat(self):
+        x = np.linspace(0, 1, 11)
+        for dim in [1, 2, 3]:
+            locs = np.random.rand(200, dim)
+            locs[:5] = x[3]  # on the nodes, where corners repeat
+            Q = matrixutils.interpmat(locs, *[x] * dim)
+            self.assertEqual(Q.shape, (200, 11**dim))
+            assert Q.has_sorted_indices
+            assert np.allclose(Q.sum(axis=1), 1)
+            assert np.allclose((Q * ndgrid(*[x] * dim)).reshape(-1, dim), locs)
+
+            with ThreadPoolExecutor(2) as pool:
+                for P in [
+                    matrixutils.interpmat(locs, *[x] * dim, workers=3),
+                    matrixutils.interpmat(locs, *[x] * dim, executor=pool),
+                ]:
+                    assert np.all(P.indptr == Q.indptr)
+                    assert np.all(P.indices == Q.indices)
+                    assert np.all(P.data == Q.data)
+
+
+class TestCellLocator(unittest.TestCase):
+
+    def warp(self, xyz):
+        out = xyz.copy()
+        out[:, 0] += 0.05 * np.sin(3 * xyz[:, 1])
+        out[:, 1] += 0.1 * xyz[:, 0]**2
+        out[:, -1] += 0.05 * xyz[:, 0] * xyz[:, 1]
+        return out
+
+    def test_locate(self):
+        nN = np.array([5, 4, 6])
+        x, y, z = [np.linspace(0, 1, n) for n in nN]
+        locator = CellLocator(ndgrid(x, y, z), nN)
+        locs = np.array([[0.1, 0.1, 0.1], [0.9, 0.5, 0.3], [1.5, 0.5, 0.5]])
+        cells, xi = locator.locate(locs)
+        assert np.all(cells == [0, 3 + 4 * 1 + 4 * 3 * 1, -1])
+        assert np.allclose(xi[0], [0.4, 0.3, 0.5])
+
+    def test_interpmat(self):
+        for nN in [np.array([6, 5]), np.array([6, 5, 7])]:
+            grid = ndgrid([np.linspace(0, 1, n) for n in nN])
+            xyz = self.warp(grid)
+            locs = self.warp(0.05 + 0.9 * np.random.rand(50, nN.size))
+            Q = interpmatCurv(locs, xyz, nN)
+            self.assertEqual(Q.shape, (50, np.prod(nN)))
+            assert np.all(Q.getnnz(axis=1) == 2**nN.size)
+            assert np.allclose(Q.sum(axis=1), 1)
+            # bilinear/trilinear maps reproduce the node locations
+            assert np.allclose(Q * xyz, locs)
+
+        Q = CellLocator(xyz, nN).interpmat(np.array([[2., 2., 2.]]))
+        self.assertEqual(Q.nnz, 0)
+
+
+class TestTensorBinner(unittest.TestCase):
+
+    def test_bin(self):
+        x, y = np.linspace(0, 1, 6), np.r_[0., 0.1, 0.5, 1.]
+        locs = np.random.rand(2000, 2) * 1.2 - 0.1
+        locs[:4] = [[0, 0], [1, 1], [x[2], y[1]], [np.nan, 0.5]]
+        values = np.c_[np.random.rand(2000), 1e6 + np.random.rand(2000)]
+
+        binner = matrixutils.TensorBinner(x, y, chunkSize=37)
+        for part in np.array_split(np.arange(2000), 3):
+            binner.add(locs[part], values[part])
+
+        cells = binner.cellIndex(locs)
+        self.assertEqual(list(cells[:4]), [0, 14, 7, -1])
+        for backend in backendutils.availableBackends('cellSubs'):
+            subs = backendutils.getKernel('cellSubs', backend)(x, locs[:, 0])
+            assert np.all(subs[cells >= 0] == cells[cells >= 0] % 5)
+            assert np.all((subs < 0) == ~((locs[:, 0] >= 0) & (locs[:, 0] <= 1)))
+
+        self.assertEqual(binner.nOutside, (cells < 0).sum())
+        self.assertEqual(binner.count.sum(), (cells >= 0).sum())
+        mean, std, var = binner.mean, binner.std(), binner.var(ddof=1)
+        for cell in range(binner.nC):
+            v = values[cells == cell]
+            self.assertEqual(binner.count[cell], v.shape[0])
+            assert np.allclose(binner.sum[cell], v.sum(axis=0))
+            assert np.allclose(mean[cell], v.mean(axis=0), rtol=1e-12)
+            assert np.allclose(std[cell], v.std(axis=0))
+            assert np.allclose(var[cell], v.var(axis=0, ddof=1))
+
+        counts = matrixutils.TensorBinner(x)
+        counts.add(locs[:, 0])
+        assert np.all(counts.count == np.histogram(locs[:, 0], x)[0])
+        with self.assertRaises(AssertionError):
+            counts.mean
+
+
+class TestProfiling(unittest.TestCase):
+
+    def test_profiling(self):
+        original = matrixutils.sdiag
+        with profiling():
+            assert matrixutils.sdiag is not original
+            matrixutils.sdiag(np.ones(10))
+            matrixutils.ndgrid(np.ones(3), np.ones(4))
+            one, zero = np.ones(5), np.zeros(5)
+            matrixutils.matutils.inv2X2BlockDiagonal(
+                one, zero, zero, one, returnMatrix=True
+            )
+        assert matrixutils.sdiag is original
+
+        stats = getProfile()
+        self.assertEqual(stats['inv2X2BlockDiagonal']['calls'], 1)
+        # sdiag is also called four times within inv2X2BlockDiagonal
+        self.assertEqual(stats['sdiag']['calls'], 5)
+        self.assertEqual(stats['sdiag']['maxInputBytes'], 80)
+        self.assertEqual(stats['ndgrid']['allocatedBytes'], 12 * 2 * 8)
+        assert stats['ndgrid']['maxTime'] <= stats['ndgrid']['totalTime']
+        assert 'ndgrid' in profileReport()
+
+        with profiling(memory='tracemalloc'):
+            matrixutils.mkvc(np.ones((100, 100)) + 1)
+        assert getProfile()['mkvc']['calls'] == 1
+        assert not tracemalloc.is_tracing()
+
+        # a trace started by the caller survives, with its peak
+        tracemalloc.start()
+        try:
+            big = np.ones(10**6)
+            del big
+            with profiling(memory='tracemalloc'):
+                matrixutils.mkvc(np.ones((100, 100)))
+            assert tracemalloc.is_tracing()
+            assert tracemalloc.get_traced_memory()[1] >= 8 * 10**6
+        finally:
+            tracemalloc.stop()
+
+
+class TestOperatorIO(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_roundtrip(self):
+        fname = os.path.join(self.dir, 'op.mxop')
+        blocks = [np.random.rand(10) + 3 * (i % 4 == 0) for i in range(9)]
+        operators = [
+            sp.random(100, 50, density=0.05, format='csr'),
+            sp.random(100, 50, density=0.05, format='csc'),
+            sp.random(100, 50, density=0.05, format='coo'),
+            sp.csr_matrix(inv3X3BlockDiagonal(*blocks)).tobsr((3, 3)),
+            np.random.rand(4, 5),
+        ]
+        # int64 indices, as in operators with more than 2**31 entries
+        wide = sp.random(100, 50, density=0.05, format='csr')
+        wide.indices = wide.indices.astype(np.int64)
+        wide.indptr = wide.indptr.astype(np.int64)
+        operators += [wide]
+        for A in operators:
+            matrixutils.saveOperator(fname, A)
+            for mmap in [True, False]:
+                B = matrixutils.loadOperator(fname, mmap=mmap)
+                if sp.issparse(A):
+                    self.assertEqual(B.format, A.format if A.format != 'coo'
+                                     else 'csr')
+                    self.assertEqual(B.shape, A.shape)
+                    self.assertEqual(abs(A - B).max(), 0)
+                    if A.format != 'coo':
+                        self.assertEqual(B.indices.dtype, A.indices.dtype)
+                        self.assertEqual(B.indptr.dtype, A.indptr.dtype)
+                    data = B.data
+                    if mmap:
+                        assert not B.indices.flags.writeable
+                        assert not B.indptr.flags.writeable
+                else:
+                    assert np.all(A == B)
+                    data = B
+                if mmap:
+                    # wrapped around the read-only mapping, not copied
+                    assert not data.flags.writeable
+                    assert not data.flags.owndata
+
+        with open(fname, 'wb') as f:
+            f.write(b'not an operator')
+        with self.assertRaises(ValueError):
+            matrixutils.loadOperator(fname)
+
+
+class TestSharedOperator(unittest.TestCase):
+
+    def test_share(self):
+        A = sp.random(200, 100, density=0.05, format='csr')
+        A.indices = A.indices.astype(np.int64)
+        A.indptr = A.indptr.astype(np.int64)
+        normals = np.random.rand(20, 3)
+        with matrixutils.shareOperator((A, normals)) as handle:
+            assert handle.owner
+            B, n = handle.attach()
+            self.assertEqual(abs(A - B).max(), 0)
+            assert np.all(n == normals)
+            assert not B.data.flags.writeable
+            # the int64 indices are not copied into int32 ones
+            self.assertEqual(B.indices.dtype, np.int64)
+            assert not B.indices.flags.writeable
+
+            copy = pickle.loads(pickle.dumps(handle))
+            assert not copy.owner
+            with ProcessPoolExecutor(2) as pool:
+                results = list(pool.map(methodcaller('attach'), [copy] * 3))
+            for B, n in results:
+                self.assertEqual(abs(A - B).max(), 0)
+                assert np.all(n == normals)
+
+        # unlinked by the owner
+        with self.assertRaises(FileNotFoundError):
+            pickle.loads(pickle.dumps(copy)).attach()
+
+
+class TestFutures(unittest.TestCase):
+
+    def test_results(self):
+        x = np.linspace(0, 1, 11)
+        locs = np.random.rand(1000, 3)
+        progress = []
+        future = matrixutils.submitInterpmat(
+            locs, x, x, x, chunkSize=300,
+            callback=lambda done, total: progress.append((done, total))
+        )
+        P = future.result()
+        self.assertEqual(abs(P - matrixutils.interpmat(locs, x, x, x)).max(), 0)
+        self.assertEqual(progress, [(1, 4), (2, 4), (3, 4), (4, 4)])
+        self.assertEqual(future.progress, 1)
+        self.assertEqual((future.doneChunks, future.totalChunks), (4, 4))
+
+        A, B, C = [sp.random(n, n, density=0.3, format='csr') for n in (7, 5, 3)]
+        K = matrixutils.submitKron3(A, B, C, chunkSize=2).result()
+        self.assertEqual(abs(K - matrixutils.kron3(A, B, C)).max(), 0)
+        assert K.has_canonical_format
+        self.assertEqual(K.format, 'csr')
+        # complex and integer operators keep their dtype, even with chunks
+        # of empty rows
+        I = sp.csr_matrix(np.array([[1, 0], [0, 1], [0, 0], [0, 0], [2, 3]]))
+        for F in [(A * (1 + 2j), B, C),
+                  [(M * 10).astype(int) for M in (A, B, C)],
+                  (I, I.T, I)]:
+            K = matrixutils.submitKron3(*F, chunkSize=2).result()
+            self.assertEqual(K.dtype, matrixutils.kron3(*F).dtype)
+            self.assertEqual(abs(K - matrixutils.kron3(*F)).max(), 0)
+
+        # the format follows kron3, banded products stay DIA
+        A, B, C = matrixutils.ddx(4), matrixutils.speye(3), matrixutils.speye(2)
+        with matrixutils.config(sparseFormat='dia'):
+            K = matrixutils.submitKron3(A, B, C, chunkSize=2).result()
+            self.assertEqual(K.format, matrixutils.kron3(A, B, C).format)
+        self.assertEqual(K.format, 'dia')
+        self.assertEqual(abs(K - matrixutils.kron3(A, B, C)).max(), 0)
+        K = matrixutils.submitKron3(A, B, C, format='csc').result()
+        self.assertEqual(K.format, 'csc')
+
+        a = [np.random.rand(100) + 3 * (i in (0, 4, 8)) for i in range(9)]
+        self.assertEqual(abs(
+            matrixutils.submitInv3X3BlockDiagonal(*a, chunkSize=30).result() -
+            inv3X3BlockDiagonal(*a)
+        ).max(), 0)
+        b = matrixutils.submitInv2X2BlockDiagonal(
+            a[0], a[1], a[3], a[4], returnMatrix=False, chunkSize=30
+        ).result()
+        for bi, ci in zip(b, inv2X2BlockDiagonal(a[0], a[1], a[3], a[4],
+                                                 returnMatrix=False)):
+            assert np.all(bi == ci)
+
+    def test_cancel(self):
+        x = np.linspace(0, 1, 11)
+        locs = np.random.rand(100, 3)
+        started, release = threading.Event(), threading.Event()
+
+        def callback(done, total):
+            started.set()
+            release.wait()
+
+        with ThreadPoolExecutor(1) as pool:
+            future = matrixutils.submitInterpmat(
+                locs, x, x, x, chunkSize=10, executor=pool, callback=callback
+            )
+            pending = matrixutils.submitInterpmat(
+                locs, x, x, x, executor=pool
+            )
+            started.wait()
+            assert pending.cancel()
+            assert future.cancel()
+            release.set()
+            with self.assertRaises(CancelledError):
+                future.result()
+        assert future.cancelled() and pending.cancelled()
+        self.assertEqual(future.progress, 0.1)
+
+    def test_async(self):
+        x = np.linspace(0, 1, 11)
+        locs = np.random.rand(100, 2)
+
+        async def build():
+            return await matrixutils.interpmatAsync(locs, x, x, chunkSize=30)
+
+        P = asyncio.run(build())
+        self.assertEqual(abs(P - matrixutils.interpmat(locs, x, x)).max(), 0)
+
+
+class TestConfig(unittest.TestCase):
+
+    def test_config(self):
+        self.assertEqual(matrixutils.getConfig('workers'), None)
+        with matrixutils.config(workers=4, chunkSize=100):
+            self.assertEqual(matrixutils.getConfig('workers'), 4)
+            with matrixutils.config(workers=2, trusted=True):
+                self.assertEqual(matrixutils.getConfig('workers'), 2)
+                self.assertEqual(matrixutils.getConfig('chunkSize'), 100)
+                assert isTrusted()
+            self.assertEqual(matrixutils.getConfig('workers'), 4)
+            assert not isTrusted()
+
+            # other threads do not see the overrides of this context
+            with ThreadPoolExecutor(1) as pool:
+                settings = pool.submit(matrixutils.getConfig).result()
+            self.assertEqual(settings['workers'], None)
+        self.assertEqual(matrixutils.getConfig('chunkSize'), None)
+
+        matrixutils.setConfig(chunkSize=10)
+        try:
+            self.assertEqual(matrixutils.getConfig()['chunkSize'], 10)
+        finally:
+            matrixutils.setConfig(chunkSize=None)
+
+        with self.assertRaises(ValueError):
+            matrixutils.config(threads=2).__enter__()
+        with self.assertRaises(AssertionError):
+            matrixutils.setConfig(floatDtype=int)
+        with self.assertRaises(AssertionError):
+            matrixutils.setConfig(indexDtype=np.int16)
+        with self.assertRaises(AssertionError):
+            matrixutils.setConfig(indexDtype=np.uint32)
+
+        # a configured int32 is widened where the indices do not fit
+        with matrixutils.config(indexDtype=np.int32):
+            self.assertEqual(configutils._indexDtype(2**31 - 1), np.int32)
+            self.assertEqual(configutils._indexDtype(2**31), np.int64)
+            self.assertEqual(GridIndexer((2**16, 2**16)).dtype, np.int64)
+            Q = interputils._stitchCSR([(
+                np.array([0, 1]), np.array([2**32], dtype=np.int64),
+                np.ones(1)
+            )], (1, 2**32 + 1))
+            self.assertEqual(Q.indices.dtype, np.int64)
+            self.assertEqual(Q.indices[0], 2**32)
+
+    def test_lean(self):
+        x = np.linspace(0, 1, 6)
+        nN = np.array([6, 6, 6])
+        xyz = ndgrid(x, x, x)
+        expected = faceGeometry(xyz, *indexCube('ABCD', nN))
+        with matrixutils.config(
+            floatDtype=np.float32, indexDtype=np.int64, chunkSize=7
+        ):
+            for A in [matrixutils.ddx(3), matrixutils.av_extrap(3),
+                      matrixutils.speye(3), sdiag(np.ones(3)),
+                      inv3X3BlockDiagonal(*np.random.rand(9, 5) + 1)]:
+                self.assertEqual(A.dtype, np.float32)
+            Q = matrixutils.interpmat(np.random.rand(20, 3), x, x, x)
+            self.assertEqual(Q.dtype, np.float32)
+            self.assertEqual(Q.indices.dtype, np.int64)
+            self.assertEqual(GridIndexer((3, 4)).dtype, np.int64)
+            self.assertEqual(volHex(xyz, nN).dtype, np.float32)
+            out = faceGeometry(xyz, *indexCube('ABCD', nN))
+            for a, b in zip(out, expected):
+                self.assertEqual(a.dtype, np.float32)
+                assert np.allclose(a, b, atol=1e-6)
+        self.assertEqual(matrixutils.ddx(3).dtype, np.float64)
+
+
+class TestAutotune(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'tuning.json')
+
+    def tearDown(self):
+        configutils._tuning[0] = None
+        shutil.rmtree(self.dir)
+
+    def test_autotune(self):
+        with open(self.path, 'w') as f:
+            json.dump({'other-machine': {'volHex': {'chunkSize': 1}}}, f)
+        results = matrixutils.autotune(
+            path=self.path, size=2**10, chunkSizes=[64, 4096], workers=[1],
+            kernels=['faceGeometry', 'volHex'], repeat=1
+        )
+        self.assertEqual(sorted(results), ['faceGeometry', 'volHex'])
+        self.assertEqual(results['volHex']['workers'], 1)
+        with open(self.path) as f:
+            profiles = json.load(f)
+        assert 'other-machine' in profiles
+        self.assertEqual(profiles[configutils.machine()], results)
+
+        # later calls pick the tuned settings up, explicit ones win
+        chunkSize = results['faceGeometry']['chunkSize']
+        self.assertEqual(configutils._chunkSize('faceGeometry', 7), chunkSize)
+        self.assertEqual(configutils._chunkSize('indexCube', 7), 7)
+        with matrixutils.config(chunkSize=5):
+            self.assertEqual(configutils._chunkSize('faceGeometry', 7), 5)
+
+        matrixutils.loadTuning(os.path.join(self.dir, 'missing.json'))
+        self.assertEqual(configutils._chunkSize('faceGeometry', 7), 7)
+
+    def test_interpmatWorkers(self):
+        # tuned workers only start processes when asked for with 'auto'
+        configutils._tuning[0] = {'interpmat': {'workers': 2}}
+        x = np.linspace(0, 1, 11)
+        locs = np.random.rand(50, 3)
+        pool = interputils.ProcessPoolExecutor
+        started = []
+
+        def recording(max_workers):
+            started.append(max_workers)
+            return pool(max_workers=max_workers)
+
+        interputils.ProcessPoolExecutor = recording
+        try:
+            Q = matrixutils.interpmat(locs, x, x, x)
+            self.assertEqual(started, [])
+            P = matrixutils.interpmat(locs, x, x, x, workers='auto')
+            self.assertEqual(started, [2])
+            with matrixutils.config(workers=3):
+                matrixutils.interpmat(locs, x, x, x)
+                matrixutils.interpmat(locs, x, x, x, workers='auto')
+            self.assertEqual(started, [2, 3])
+        finally:
+            interputils.ProcessPoolExecutor = pool
+        assert np.all(P.indices == Q.indices)
+        assert np.all(P.data == Q.data)
+
+
+class TestBackends(unittest.TestCase):
+
+    def tearDown(self):
+        matrixutils.setBackend()
+
+    def parity(self, kernel, *args):
+        backends = matrixutils.availableBackends(kernel)
+        assert 'numpy' in backends
+        expected = backendutils.getKernel(kernel, 'numpy')(*args)
+        for backend in backends:
+            out = backendutils.getKernel(kernel, backend)(*args)
+            # the backends do the same operations in the same order
+            for a, b in zip(out, expected):
+                self.assertEqual(a.dtype, b.dtype)
+                assert np.array_equal(a, b), backend
+
+    def test_parity(self):
+        x = np.linspace(0, 1, 9)
+        for dim in [1, 2, 3]:
+            locs = np.random.rand(100, dim) * 1.2 - 0.1
+            locs[:3] = x[2]
+            self.parity(
+                'interpmat{0:d}D'.format(dim),
+                locs[:, 0] if dim == 1 else locs, *[x] * dim
+            )
+        a = [np.random.rand(50) + 2 * (i % 4 == 0) for i in range(9)]
+        self.parity('inv2X2', *a[:4])
+        self.parity('inv3X3', *a)
+        # numba rounds complex products and quotients its own way, so
+        # complex entries only agree to rounding
+        a = np.array(a) + 1j * np.random.rand(9, 50)
+        for kernel, ai in [('inv2X2', a[:4]), ('inv3X3', a)]:
+            expected = backendutils.getKernel(kernel, 'numpy')(*ai)
+            for backend in matrixutils.availableBackends(kernel):
+                out = backendutils.getKernel(kernel, backend)(*ai)
+                for bi, ei in zip(out, expected):
+                    self.assertEqual(bi.dtype, np.complex128)
+                    assert np.allclose(bi, ei, rtol=1e-12, atol=0), backend
+            # the entries can be written in the rows of one array
+            for backend in matrixutils.availableBackends(kernel):
+                out = np.empty_like(ai)
+                b = backendutils.getKernel(kernel, backend)(*ai, out=out)
+                assert all(bi.base is out for bi in b), backend
+                assert np.allclose(out, expected, rtol=1e-12, atol=0)
+        self.parity('volTetra', *np.random.rand(3, 5, 7, 3))
+
+        nN = np.array([6, 5, 4])
+        xyz = ndgrid(*[np.linspace(0, 1, n) for n in nN])
+        xyz += 0.05 * np.random.rand(*xyz.shape)
+        A, B, C, D = indexCube('ABCD', nN)
+        expected = [faceGeometry(xyz, A, B, C, D, average=avg)
+                    for avg in [True, False]]
+        for backend in matrixutils.availableBackends('faceGeometry'):
+            matrixutils.setBackend(backend)
+            self.assertEqual(matrixutils.getBackend('faceGeometry'), backend)
+            for avg, out in zip([True, False], expected):
+                for a, b in zip(faceGeometry(xyz, A, B, C, D, average=avg),
+                                out):
+                    assert np.array_equal(a, b), backend
+            # strided outputs are filled in place, mixed index dtypes
+            normals = np.zeros((A.size, 6))[:, ::2]
+            faceGeometry(xyz, A.astype(np.int32), B.astype(np.int64), C, D,
+                         normals=normals)
+            assert np.array_equal(normals, expected[0][0]), backend
+
+    def test_selection(self):
+        # numba is only used when forced
+        self.assertEqual(matrixutils.getBackend('faceGeometry'), 'numpy')
+        matrixutils.setBackend('numpy')
+        self.assertEqual(matrixutils.getBackend('interpmat3D'), 'numpy')
+        with self.assertRaises(ValueError):
+            matrixutils.setBackend('fortran')
+
+        code = (
+            "import matrixutils; "
+            "assert matrixutils.getBackend('inv3X3') == 'numpy'"
+        )
+        env = dict(os.environ, MATRIXUTILS_BACKEND='numpy')
+        subprocess.check_call([sys.executable, '-c', code], env=env)
+
+    def test_fork(self):
+        # forked pools keep working after the parallel numba kernels ran
+        if 'numba' not in matrixutils.availableBackends('inv2X2'):
+            return
+        code = (
+            "import numpy as np, matrixutils; "
+            "matrixutils.setBackend('numba'); "
+            "matrixutils.inv2X2BlockDiagonal(*np.random.rand(4, 50) + 1); "
+            "x = np.linspace(0, 1, 5); "
+            "matrixutils.interpmat(np.random.rand(20, 3), x, x, x, workers=2)"
+        )
+        env = dict(os.environ)
+        env.pop('NUMBA_THREADING_LAYER', None)
+        subprocess.check_call([sys.executable, '-c', code], env=env,
+                              timeout=300)
+
+    def test_missing_cython(self):
+        saved = dict(backendutils._loaded)
+        backendutils._loaded[('interpmat1D', 'cython')] = ImportError('test')
+        matrixutils.setBackend()
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                Q = matrixutils.interpmat(np.r_[0.25], np.arange(4.))
+            self.assertEqual(caught[0].category, RuntimeWarning)
+            self.assertEqual(matrixutils.getBackend('interpmat1D'), 'numpy')
+            assert np.allclose(Q.toarray(), [[0.75, 0.25, 0, 0]])
+
+            # extension compiled before the kernel was added
+            backendutils.registerKernel(
+                'cellSubs', 'cython', 'interputils_cython:_missing'
+            )
+            self.assertEqual(
+                backendutils.availableBackends('cellSubs'), ['numpy']
+            )
+        finally:
+            backendutils.registerKernel(
+                'cellSubs', 'cython', 'interputils_cython:_cellSubs'
+            )
+            backendutils._loaded.clear()
+            backendutils._loaded.update(saved)
+
+
+class TestImport(unittest.TestCase):
+
+    def test_lazy(self):
+        code = (
+            "import sys, matrixutils; "
+            "assert 'scipy.sparse' not in sys.modules; "
+            "assert 'matrixutils.matutils' not in sys.modules; "
+            "matrixutils.sdiag; "
+            "assert 'matrixutils.matutils' in sys.modules; "
+            "assert 'matrixutils.curvutils' not in sys.modules"
+        )
+        subprocess.check_call([sys.executable, '-c', code])
+        for name in matrixutils.__all__:
+            assert name in dir(matrixutils)
+            getattr(matrixutils, name)
+        with self.assertRaises(AttributeError):
+            matrixutils.notAFunction
+
 
 class TestZero(unittest.TestCase):
 